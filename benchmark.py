@@ -0,0 +1,578 @@
+import io
+import os
+import sys
+import copy
+import glob
+import json
+import time
+import base64
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+
+# pip install PyPDF2
+from PyPDF2 import PdfFileReader
+
+# pip install cairosvg
+import cairosvg
+
+# NOTE: Pillow is installed as a dependency of cairosvg
+from PIL import Image
+
+import main
+
+
+# NOTE: Every case varies one axis of the synthetic poster while the others stay at their defaults
+BENCHMARK_DEFAULT_PARAMS = {
+    "pages_x": 4,
+    "pages_y": 4,
+    "element_count": 1000,
+    "nesting_depth": 1,
+    "raster_size": 0,
+}
+BENCHMARK_SUITES = {
+    "quick": {
+        "pages": [(1, 1), (4, 4), (10, 10)],
+        "element_count": [10, 1000, 10000],
+        "nesting_depth": [1, 8],
+        "raster_size": [0, 512],
+        "xml_posters": [{"element_count": 10000}, {"element_count": 100000}],
+    },
+    "full": {
+        "pages": [(1, 1), (2, 2), (4, 4), (10, 10), (20, 20)],
+        "element_count": [10, 100, 1000, 10000, 100000, 1000000],
+        "nesting_depth": [1, 4, 16, 64],
+        "raster_size": [0, 256, 1024, 4096],
+        "xml_posters": [
+            {"element_count": 100000},
+            {"element_count": 1000000},
+            {"element_count": 100000, "nesting_depth": 64},
+            {"raster_size": 4096},
+        ],
+    },
+}
+
+# NOTE: The pipeline stages add up to the time a single job run of process_image takes. The other
+#       stages are measured on their own for a more detailed breakdown and overlap with these.
+BENCHMARK_PIPELINE_STAGES = [
+    "create_page_template",
+    "create_overview",
+    "create_pages",
+    "render",
+    "merge",
+]
+BENCHMARK_DETAIL_STAGES = [
+    "parse",
+    "validate",
+    "scan_references",
+    "draw_grid_and_markers",
+    "render_page_svgs",
+]
+
+# NOTE: Every XML backend that is installed parses, copies and serializes the same inputs, so that
+#       their throughput can be compared directly
+BENCHMARK_XML_STAGES = [
+    "parse",
+    "iterparse",
+    "copy",
+    "serialize",
+]
+BENCHMARK_TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testfiles")
+
+
+def benchmark_get_case_name(params: dict) -> str:
+    return "pages_{}x{}__elements_{}__depth_{}__raster_{}".format(
+        params["pages_x"],
+        params["pages_y"],
+        params["element_count"],
+        params["nesting_depth"],
+        params["raster_size"],
+    )
+
+
+def benchmark_get_cases(suite: dict) -> list[dict]:
+    result = []
+    for pages_x, pages_y in suite["pages"]:
+        result.append(dict(BENCHMARK_DEFAULT_PARAMS, pages_x=pages_x, pages_y=pages_y))
+    for axis in ["element_count", "nesting_depth", "raster_size"]:
+        for value in suite[axis]:
+            result.append(dict(BENCHMARK_DEFAULT_PARAMS, **{axis: value}))
+
+    # NOTE: The axes share their default case, we only want to run it once
+    unique_result = []
+    for params in result:
+        if params not in unique_result:
+            unique_result.append(params)
+    return unique_result
+
+
+def benchmark_write_synthetic_poster(filepath: str, params: dict, seed: int = 0):
+    PAGE_INNER_WIDTH_MM = 180.0
+    PAGE_INNER_HEIGHT_MM = 250.0
+
+    rng = random.Random(seed)
+    image_width = params["pages_x"] * PAGE_INNER_WIDTH_MM
+    image_height = params["pages_y"] * PAGE_INNER_HEIGHT_MM
+
+    with open(filepath, "w", encoding="utf-8") as svg_file:
+        svg_file.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" '
+            'xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'x="0mm" y="0mm" width="{}mm" height="{}mm" viewBox="0 0 {} {}">\n'.format(
+                image_width, image_height, image_width, image_height
+            )
+        )
+
+        if params["raster_size"] > 0:
+            raster_size = params["raster_size"]
+            raster_image = Image.frombytes(
+                "RGB", (raster_size, raster_size), rng.randbytes(raster_size * raster_size * 3)
+            )
+            png_file = io.BytesIO()
+            raster_image.save(png_file, "PNG")
+            svg_file.write(
+                '<image x="0" y="0" width="{}" height="{}" '
+                'preserveAspectRatio="none" xlink:href="data:image/png;base64,{}"/>\n'.format(
+                    image_width,
+                    image_height,
+                    base64.b64encode(png_file.getvalue()).decode("ascii"),
+                )
+            )
+
+        # NOTE: The elements are spread evenly over the groups, every group is nested as deep as
+        #       given and translated to a random position of the poster
+        ELEMENTS_PER_GROUP = 100
+        nesting_depth = params["nesting_depth"]
+        element_count = params["element_count"]
+        for group_start in range(0, element_count, ELEMENTS_PER_GROUP):
+            group_x = rng.uniform(0, image_width - 50)
+            group_y = rng.uniform(0, image_height - 50)
+            svg_file.write('<g transform="translate({:.3f} {:.3f})">'.format(group_x, group_y))
+            svg_file.write("<g>" * (nesting_depth - 1))
+            for _ in range(group_start, min(element_count, group_start + ELEMENTS_PER_GROUP)):
+                svg_file.write(
+                    '<path fill="#{:06x}" stroke="#000" stroke-width="0.5" '
+                    'd="M{:.3f} {:.3f} l{:.3f} {:.3f} q{:.3f} {:.3f} {:.3f} {:.3f} z"/>'.format(
+                        rng.randrange(0x1000000),
+                        rng.uniform(0, 40),
+                        rng.uniform(0, 40),
+                        rng.uniform(-10, 10),
+                        rng.uniform(-10, 10),
+                        rng.uniform(-10, 10),
+                        rng.uniform(-10, 10),
+                        rng.uniform(-10, 10),
+                        rng.uniform(-10, 10),
+                    )
+                )
+            svg_file.write("</g>" * nesting_depth)
+            svg_file.write("\n")
+
+        svg_file.write("</svg>\n")
+
+
+class BenchmarkTimer:
+    stages: dict[str, float]
+
+    def __init__(self):
+        self.stages = {}
+
+    def measure(self, stage: str, function, *args, **kwargs):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start_time
+        return result
+
+
+def benchmark_parse(image_filepath: str):
+    for _ in main.svg_iterparse_root_children(image_filepath):
+        pass
+
+
+def benchmark_validate(image_filepath: str):
+    for svg_root_node, _ in main.svg_iterparse_root_children(image_filepath):
+        return main.svg_validate_and_get_image_dimensions_and_unit(svg_root_node)
+
+
+def benchmark_render(
+    page_template: main.SvgPageTemplate,
+    dimensions: main.PageChoppingDimensions,
+    overview_svg: bytes,
+) -> bytes:
+    output = io.BytesIO()
+    pdf_document_writer = main.PdfDocumentWriter(output)
+    pdf_document_writer.add_page(overview_svg)
+    poster_tree = main.pdf_parse_poster(page_template, dimensions)
+    for page_index_y in range(dimensions.page_count_y):
+        for page_index_x in range(dimensions.page_count_x):
+            pdf_document_writer.add_poster_page(
+                poster_tree, page_template, dimensions, page_index_x, page_index_y
+            )
+    pdf_document_writer.finish()
+    return output.getvalue()
+
+
+# NOTE: Renders every page from its own SVG, as the page cache does, to compare it with rendering
+#       all pages from the poster that is only parsed once
+def benchmark_render_page_svgs(overview_svg: bytes, pages_svgs: list[bytes]) -> bytes:
+    output = io.BytesIO()
+    pdf_document_writer = main.PdfDocumentWriter(output)
+    pdf_document_writer.add_page(overview_svg)
+    for page_svg in pages_svgs:
+        pdf_document_writer.add_page(page_svg)
+    pdf_document_writer.finish()
+    return output.getvalue()
+
+
+def benchmark_merge(overview_and_pages_pdf: bytes, page_count: int, output_dir: str):
+    pdf_reader = PdfFileReader(io.BytesIO(overview_and_pages_pdf))
+    main.pdf_write_page_range(pdf_reader, 0, 1, os.path.join(output_dir, "benchmark__overview.pdf"))
+    main.pdf_write_page_range(
+        pdf_reader, 1, page_count, os.path.join(output_dir, "benchmark__pages.pdf")
+    )
+
+
+def benchmark_run_case(image_filepath: str, output_dir: str, enable_rendering: bool) -> dict:
+    PAGE_INNER_WIDTH_MM = 180.0
+    PAGE_INNER_HEIGHT_MM = 250.0
+    PAGE_BORDER_MM = 0.0
+
+    timer = BenchmarkTimer()
+    timer.measure("parse", benchmark_parse, image_filepath)
+    timer.measure("validate", benchmark_validate, image_filepath)
+    timer.measure("scan_references", main.svg_scan_references_and_stylesheet, image_filepath)
+
+    dimensions, page_template = timer.measure(
+        "create_page_template",
+        main.svg_create_page_template,
+        image_filepath,
+        PAGE_INNER_WIDTH_MM,
+        PAGE_INNER_HEIGHT_MM,
+        PAGE_BORDER_MM,
+    )
+    timer.measure(
+        "draw_grid_and_markers",
+        main.svg_draw_grid_and_markers,
+        main.g_xml_backend.create_element(main.SVG_NAMESPACE_PREFIX + "g"),
+        dimensions,
+        1.0,
+        False,
+    )
+
+    overview_svg = timer.measure("create_overview", main.svg_create_overview, page_template)
+    pages_svgs = timer.measure(
+        "create_pages",
+        lambda: [
+            main.svg_create_page(page_template, dimensions, page_index_x, page_index_y)
+            for page_index_y in range(dimensions.page_count_y)
+            for page_index_x in range(dimensions.page_count_x)
+        ],
+    )
+
+    if enable_rendering:
+        overview_and_pages_pdf = timer.measure(
+            "render", benchmark_render, page_template, dimensions, overview_svg
+        )
+        timer.measure("render_page_svgs", benchmark_render_page_svgs, overview_svg, pages_svgs)
+        timer.measure("merge", benchmark_merge, overview_and_pages_pdf, len(pages_svgs), output_dir)
+
+    result = {
+        "page_count": len(pages_svgs),
+        "top_level_element_count": len(page_template.elements),
+        "culled_element_count": sum(map(len, page_template.page_element_indices.values())),
+        "overview_bytes": len(overview_svg),
+        "pages_bytes": sum(map(len, pages_svgs)),
+        "stages": timer.stages,
+    }
+    if enable_rendering:
+        result["pdf_bytes"] = len(overview_and_pages_pdf)
+    return result
+
+
+def benchmark_run(
+    cases: list[dict], repeat_count: int, enable_rendering: bool, work_dir: str
+) -> list[dict]:
+    result = []
+    for params in cases:
+        case_name = benchmark_get_case_name(params)
+        image_filepath = os.path.join(work_dir, case_name + ".svg")
+        benchmark_write_synthetic_poster(image_filepath, params)
+
+        # NOTE: We keep the fastest run of every stage to filter out noise
+        case_result = None
+        for _ in range(repeat_count):
+            # NOTE: The progress output of the chopping functions would drown our own
+            with open(os.devnull, "w") as devnull:
+                stdout = sys.stdout
+                sys.stdout = devnull
+                try:
+                    run_result = benchmark_run_case(image_filepath, work_dir, enable_rendering)
+                finally:
+                    sys.stdout = stdout
+            if case_result == None:
+                case_result = run_result
+            else:
+                for stage, seconds in run_result["stages"].items():
+                    case_result["stages"][stage] = min(case_result["stages"][stage], seconds)
+
+        stages = case_result["stages"]
+        total_seconds = sum(stages.get(stage, 0.0) for stage in BENCHMARK_PIPELINE_STAGES)
+        case_result["name"] = case_name
+        case_result["params"] = params
+        case_result["input_bytes"] = os.path.getsize(image_filepath)
+        case_result["total_seconds"] = total_seconds
+        case_result["pages_per_second"] = case_result["page_count"] / total_seconds
+        case_result["elements_per_second"] = (
+            params["element_count"] / stages["create_page_template"]
+        )
+        if enable_rendering:
+            case_result["rendered_pages_per_second"] = (case_result["page_count"] + 1) / stages[
+                "render"
+            ]
+        os.remove(image_filepath)
+
+        print(
+            "{:<60} {:>9.3f}s {:>10.1f} pages/s {:>12.0f} elements/s".format(
+                case_name,
+                total_seconds,
+                case_result["pages_per_second"],
+                case_result["elements_per_second"],
+            ),
+            flush=True,
+        )
+        result.append(case_result)
+    return result
+
+
+# NOTE: Fits the factors the plan mode of main.py estimates the PDF sizes with to the rendered PDFs
+#       by least squares: pdf_bytes = svg_bytes * bytes_per_svg_byte + pages * bytes_per_page
+def benchmark_fit_plan_factors(cases_results: list[dict]) -> dict:
+    sum_svg_svg = 0.0
+    sum_svg_pages = 0.0
+    sum_pages_pages = 0.0
+    sum_svg_pdf = 0.0
+    sum_pages_pdf = 0.0
+    for case_result in cases_results:
+        svg_bytes = case_result["overview_bytes"] + case_result["pages_bytes"]
+        page_count = case_result["page_count"] + 1
+        pdf_bytes = case_result["pdf_bytes"]
+        sum_svg_svg += svg_bytes * svg_bytes
+        sum_svg_pages += svg_bytes * page_count
+        sum_pages_pages += page_count * page_count
+        sum_svg_pdf += svg_bytes * pdf_bytes
+        sum_pages_pdf += page_count * pdf_bytes
+    determinant = sum_svg_svg * sum_pages_pages - sum_svg_pages * sum_svg_pages
+    if determinant == 0.0:
+        return None
+    return {
+        "pdf_bytes_per_svg_byte": (sum_svg_pdf * sum_pages_pages - sum_svg_pages * sum_pages_pdf)
+        / determinant,
+        "pdf_bytes_per_page": (sum_svg_svg * sum_pages_pdf - sum_svg_pages * sum_svg_pdf)
+        / determinant,
+    }
+
+
+def benchmark_get_xml_inputs(suite: dict, work_dir: str) -> list[str]:
+    result = sorted(glob.glob(os.path.join(BENCHMARK_TESTFILES_DIR, "*.svg")))
+    for poster_params in suite["xml_posters"]:
+        params = dict(BENCHMARK_DEFAULT_PARAMS, **poster_params)
+        image_filepath = os.path.join(work_dir, benchmark_get_case_name(params) + ".svg")
+        benchmark_write_synthetic_poster(image_filepath, params)
+        result.append(image_filepath)
+    return result
+
+
+def benchmark_run_xml_case(backend_name: str, image_data: bytes) -> dict:
+    backend = main.xml_load_backend(backend_name)
+    timer = BenchmarkTimer()
+    svg_root_node = timer.measure("parse", backend.fromstring, image_data)
+    # NOTE: The streaming parse is what the page template creation actually uses
+    main.xml_select_backend(backend_name)
+    timer.measure("iterparse", benchmark_parse, io.BytesIO(image_data))
+    timer.measure("copy", copy.deepcopy, svg_root_node)
+    timer.measure("serialize", backend.tostring, svg_root_node)
+    return timer.stages
+
+
+def benchmark_run_xml_backends(image_filepaths: list[str], repeat_count: int) -> list[dict]:
+    default_backend_name = main.g_xml_backend.name
+    result = []
+    try:
+        for image_filepath in image_filepaths:
+            with open(image_filepath, "rb") as image_file:
+                image_data = image_file.read()
+            for backend_name in main.xml_get_available_backend_names():
+                stages = None
+                for _ in range(repeat_count):
+                    run_stages = benchmark_run_xml_case(backend_name, image_data)
+                    if stages == None:
+                        stages = run_stages
+                    else:
+                        for stage, seconds in run_stages.items():
+                            stages[stage] = min(stages[stage], seconds)
+
+                megabytes_per_second = {
+                    stage: len(image_data) / 1e6 / max(seconds, 1e-9)
+                    for stage, seconds in stages.items()
+                }
+                result.append(
+                    {
+                        "name": os.path.basename(image_filepath),
+                        "backend": backend_name,
+                        "input_bytes": len(image_data),
+                        "stages": stages,
+                        "megabytes_per_second": megabytes_per_second,
+                    }
+                )
+                print(
+                    "{:<60} {:<7} {}".format(
+                        os.path.basename(image_filepath),
+                        backend_name,
+                        " ".join(
+                            "{}={:.1f}MB/s".format(stage, megabytes_per_second[stage])
+                            for stage in BENCHMARK_XML_STAGES
+                        ),
+                    ),
+                    flush=True,
+                )
+    finally:
+        main.xml_select_backend(default_backend_name)
+    return result
+
+
+def benchmark_get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_print_comparison(results: dict, baseline_results: dict):
+    baseline_cases = {case["name"]: case for case in baseline_results["cases"]}
+    print(
+        "\nCompared to {} (ratio < 1.0 is faster):".format(
+            baseline_results.get("commit") or "baseline"
+        )
+    )
+    for case in results["cases"]:
+        baseline_case = baseline_cases.get(case["name"])
+        if baseline_case == None:
+            continue
+        ratios = []
+        for stage in BENCHMARK_PIPELINE_STAGES + BENCHMARK_DETAIL_STAGES:
+            if stage in case["stages"] and baseline_case["stages"].get(stage, 0.0) > 0.0:
+                ratios.append(
+                    "{}={:.2f}".format(
+                        stage, case["stages"][stage] / baseline_case["stages"][stage]
+                    )
+                )
+        print(
+            "{:<60} total={:.2f} {}".format(
+                case["name"],
+                case["total_seconds"] / baseline_case["total_seconds"],
+                " ".join(ratios),
+            )
+        )
+
+    baseline_xml_cases = {
+        (case["name"], case["backend"]): case for case in baseline_results.get("xml_cases", [])
+    }
+    for case in results["xml_cases"]:
+        baseline_case = baseline_xml_cases.get((case["name"], case["backend"]))
+        if baseline_case == None:
+            continue
+        print(
+            "{:<60} {:<7} {}".format(
+                case["name"],
+                case["backend"],
+                " ".join(
+                    "{}={:.2f}".format(
+                        stage, case["stages"][stage] / max(baseline_case["stages"][stage], 1e-9)
+                    )
+                    for stage in BENCHMARK_XML_STAGES
+                ),
+            )
+        )
+
+
+def benchmark_main():
+    parser = argparse.ArgumentParser(
+        description="Chops synthetic posters and measures every stage of the pipeline"
+    )
+    parser.add_argument("--suite", choices=BENCHMARK_SUITES.keys(), default="quick")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="run every case N times and keep the fastest"
+    )
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="skip the PDF rendering and merging stages",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="file to write the JSON results to",
+    )
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+
+    parser.add_argument(
+        "--no-xml",
+        action="store_true",
+        help="skip comparing the parse, copy and serialize throughput of the XML backends",
+    )
+    args = parser.parse_args()
+
+    cases = benchmark_get_cases(BENCHMARK_SUITES[args.suite])
+    xml_cases_results = []
+    with tempfile.TemporaryDirectory(prefix="tonitonichoppi_benchmark_") as work_dir:
+        cases_results = benchmark_run(cases, args.repeat, not args.no_render, work_dir)
+        if not args.no_xml:
+            print("\nXML backends:")
+            xml_inputs = benchmark_get_xml_inputs(BENCHMARK_SUITES[args.suite], work_dir)
+            xml_cases_results = benchmark_run_xml_backends(xml_inputs, args.repeat)
+
+    plan_factors = None
+    if not args.no_render:
+        plan_factors = benchmark_fit_plan_factors(cases_results)
+    if plan_factors != None:
+        print(
+            "\nPlan PDF size factors: {:.3f} bytes per SVG byte, {:.0f} bytes per page "
+            "(main.py uses {} and {})".format(
+                plan_factors["pdf_bytes_per_svg_byte"],
+                plan_factors["pdf_bytes_per_page"],
+                main.PLAN_PDF_BYTES_PER_SVG_BYTE,
+                main.PLAN_PDF_BYTES_PER_PAGE,
+            )
+        )
+
+    results = {
+        "commit": benchmark_get_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cairosvg": cairosvg.__version__,
+        "xml_backend": main.g_xml_backend.name,
+        "suite": args.suite,
+        "repeat": args.repeat,
+        "cases": cases_results,
+        "xml_cases": xml_cases_results,
+        "plan_factors": plan_factors,
+    }
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print("Results written to '{}'".format(args.output))
+
+    if args.compare != None:
+        with open(args.compare) as baseline_file:
+            benchmark_print_comparison(results, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    benchmark_main()
@@ -1,7 +1,7 @@
 @echo off
 
 pip3 install pyinstaller
-pip3 install cairosvg
+pip3 install cairosvg==2.9.1
 
 if exist shipping_windows rmdir /s /q shipping_windows
 mkdir shipping_windows
@@ -1,16 +1,49 @@
+from __future__ import annotations
+
+import io
 import math
-import copy
 import os
+import re
 import sys
 import shutil
+import string
 import ctypes
+import atexit
+import argparse
+import hashlib
+import html
+import contextlib
+import glob
+import json
+import time
+import threading
+import contextvars
+import tracemalloc
+import multiprocessing
+import queue
+import concurrent.futures
+import http.server
+import itertools
+import collections
+import copy
+import tempfile
+import weakref
+import urllib.parse
 from xml.etree import ElementTree
 
-# pip install PyPDF2
-from PyPDF2 import PdfFileMerger
-
-# pip install cairosvg
-import cairosvg
+# NOTE: The rendering dependencies take long to import with the cairo and cffi stack behind them.
+#       They are only imported by the code paths that render or merge PDFs, see
+#       import_rendering_dependencies, so that planning and validating stay fast.
+cairosvg = None
+cairocffi = None
+PdfFileReader = None
+PdfFileWriter = None
+Image = None
+ImageOps = None
+CairoSvgMultiPagePdfSurface = None
+g_cairosvg_draw_image = None
+g_rendering_dependencies_lock = threading.Lock()
+g_rendering_dependencies_imported = False
 
 
 # Assuming 72dpi
@@ -18,14 +51,185 @@ import cairosvg
 FACTOR_MM_TO_PX = 72.0 / 25.4
 SVG_NAMESPACE = {"svg": "http://www.w3.org/2000/svg"}
 SVG_NAMESPACE_PREFIX = "{http://www.w3.org/2000/svg}"
-g_current_image_filepath = ""
 
+# http://betweenborders.com/wordsmithing/a4-vs-us-letter/
+#           Width    Length
+# A4        210.0mm  297.0mm
+# US-Letter 215.9mm  279.4mm
+PAGE_INNER_WIDTH_MM = 180.0
+PAGE_INNER_HEIGHT_MM = 250.0
+PAGE_BORDER_MM = 0.0  # 14.0
+
+XML_BACKEND_AUTO = "auto"
+XML_BACKEND_LXML = "lxml"
+XML_BACKEND_STDLIB = "stdlib"
+XML_BACKENDS = [XML_BACKEND_AUTO, XML_BACKEND_LXML, XML_BACKEND_STDLIB]
+XML_BACKEND_ENVIRONMENT_VARIABLE = "TONITONICHOPPI_XML_BACKEND"
+XML_LXML_NAMESPACE_MAP = {None: "http://www.w3.org/2000/svg"}
+
+# NOTE: This prevents writing "ns0" on each tag in the output file. It is done on import so that it
+#       also applies to worker processes.
+ElementTree.register_namespace("", "http://www.w3.org/2000/svg")
+ElementTree.register_namespace("xlink", "http://www.w3.org/1999/xlink")
+
+
+# NOTE: Both backends create, parse and serialize nodes with the ElementTree API. Parse errors are
+#       always raised as ElementTree.ParseError, so callers do not need to know the active backend.
+class XmlBackendStdlib:
+    name: str
+
+    def __init__(self):
+        self.name = XML_BACKEND_STDLIB
+
+    def create_element(self, tag: str, attrib: dict = None):
+        return ElementTree.Element(tag, {} if attrib == None else attrib)
+
+    def create_comment(self, text: str):
+        return ElementTree.Comment(text)
+
+    def copy_node_shallow(self, svg_node):
+        # NOTE: ElementTree nodes do not know their parent, so the children can be shared between the
+        #       original node and its copy. Only the copy itself must not be shared as we modify it.
+        result = ElementTree.Element(svg_node.tag, svg_node.attrib)
+        result.text = svg_node.text
+        result.tail = svg_node.tail
+        result.extend(svg_node)
+        return result
+
+    # NOTE: ElementTree.iterparse feeds the parser 16KB at a time. Expat before 2.6 parses a token
+    #       that is not complete yet from its start again on every feed, which is quadratic for the
+    #       base64 attributes of big embedded images. So the chunk size doubles as long as a feed
+    #       does not finish any node, which keeps it linear.
+    def iterparse(self, source, events: tuple[str, ...]):
+        MIN_CHUNK_SIZE = 64 * 1024
+        parser = ElementTree.XMLPullParser(events=events)
+        with contextlib.ExitStack() as exit_stack:
+            if not hasattr(source, "read"):
+                source = exit_stack.enter_context(open(source, "rb"))
+            chunk_size = MIN_CHUNK_SIZE
+            while True:
+                data = source.read(chunk_size)
+                if not data:
+                    break
+                parser.feed(data)
+                chunk_size *= 2
+                for event in parser.read_events():
+                    chunk_size = MIN_CHUNK_SIZE
+                    yield event
+            parser.close()
+            yield from parser.read_events()
+
+    def fromstring(self, data: bytes):
+        return ElementTree.fromstring(data)
+
+    def tostring(self, svg_node) -> bytes:
+        return ElementTree.tostring(svg_node)
+
+
+# NOTE: lxml parses, copies and serializes in C, which is several times faster on large images. Its
+#       nodes know their parent though, so appending a node to another parent moves it there.
+class XmlBackendLxml:
+    name: str
+    etree: object
+
+    def __init__(self, etree):
+        self.name = XML_BACKEND_LXML
+        self.etree = etree
+        self.etree.register_namespace("xlink", "http://www.w3.org/1999/xlink")
+
+    def create_element(self, tag: str, attrib: dict = None):
+        # NOTE: lxml can not register a default namespace, without the map it would write "ns0"
+        return self.etree.Element(
+            tag, {} if attrib == None else dict(attrib), nsmap=XML_LXML_NAMESPACE_MAP
+        )
+
+    def create_comment(self, text: str):
+        return self.etree.Comment(text)
+
+    # NOTE: A node can only have one parent, so the children are copied. This is only used for the
+    #       shapes of clip elements, which rarely have children. The defs node is not copied.
+    def copy_node_shallow(self, svg_node):
+        result = self.create_element(svg_node.tag, svg_node.attrib)
+        result.text = svg_node.text
+        result.tail = svg_node.tail
+        result.extend(copy.deepcopy(child) for child in svg_node)
+        return result
+
+    def iterparse(self, source, events: tuple[str, ...]):
+        # NOTE: The stdlib parser drops comments and processing instructions, so we do the same.
+        #       Without huge_tree lxml refuses text nodes above 10MB, like big embedded images.
+        try:
+            yield from self.etree.iterparse(
+                source, events=events, remove_comments=True, remove_pis=True, huge_tree=True
+            )
+        except self.etree.XMLSyntaxError as error:
+            raise ElementTree.ParseError(str(error)) from error
+
+    def fromstring(self, data: bytes):
+        parser = self.etree.XMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+        try:
+            return self.etree.fromstring(data, parser)
+        except self.etree.XMLSyntaxError as error:
+            raise ElementTree.ParseError(str(error)) from error
+
+    def tostring(self, svg_node) -> bytes:
+        return self.etree.tostring(svg_node)
+
+
+def xml_load_backend(backend_name: str):
+    if backend_name not in XML_BACKENDS:
+        raise ValueError(
+            "Unknown XML backend '{}', expected one of {}".format(backend_name, XML_BACKENDS)
+        )
+    if backend_name != XML_BACKEND_STDLIB:
+        try:
+            import lxml.etree
+
+            return XmlBackendLxml(lxml.etree)
+        except ImportError:
+            if backend_name == XML_BACKEND_LXML:
+                raise
+    return XmlBackendStdlib()
+
+
+def xml_get_available_backend_names() -> list[str]:
+    result = [XML_BACKEND_STDLIB]
+    if xml_load_backend(XML_BACKEND_AUTO).name == XML_BACKEND_LXML:
+        result.insert(0, XML_BACKEND_LXML)
+    return result
 
-def exit_error(message: str):
+
+# NOTE: The backend is chosen on import so that worker processes use the same one as their parent.
+#       lxml is used when it is installed, the environment variable can force either backend.
+g_xml_backend = xml_load_backend(os.environ.get(XML_BACKEND_ENVIRONMENT_VARIABLE, XML_BACKEND_AUTO))
+
+
+def xml_select_backend(backend_name: str):
+    global g_xml_backend
+    g_xml_backend = xml_load_backend(backend_name)
+
+
+class ChoppingError(Exception):
+    pass
+
+
+class InvalidSvgError(ChoppingError):
+    pass
+
+
+class InvalidOptionsError(ChoppingError):
+    pass
+
+
+class RenderError(ChoppingError):
+    pass
+
+
+def exit_error(message: str, image_filepath: str = ""):
     MB_OK = 0x0
     ICON_STOP = 0x10
-    if g_current_image_filepath != "":
-        final_message = "Error processing '{}':\n{}".format(g_current_image_filepath, message)
+    if image_filepath != "":
+        final_message = "Error processing '{}':\n{}".format(image_filepath, message)
     else:
         final_message = "Error:\n{}".format(message)
     MessageBox = ctypes.windll.user32.MessageBoxW
@@ -41,6 +245,476 @@ def exit_success():
     sys.exit()
 
 
+# NOTE: Tracing is enabled by setting a global tracer. All instrumented code calls trace_span, which
+#       does nothing while there is no tracer.
+g_tracer = None
+
+
+# NOTE: The peak resident set size of the whole process up to now. The operating systems only keep
+#       this single peak, so it can not be attributed to the span that is ending. The peak of every
+#       span itself is only known from tracemalloc.
+def get_process_peak_rss_bytes() -> int:
+    if sys.platform == "win32":
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", ctypes.c_ulong),
+                ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return counters.PeakWorkingSetSize
+
+    import resource
+
+    # NOTE: macOS reports bytes, Linux reports kilobytes
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss
+    return peak_rss * 1024
+
+
+class Tracer:
+    events: list[dict]
+    enable_tracemalloc: bool
+    lock: threading.Lock
+    thread_state: threading.local
+    open_span_peaks_traced_by_thread: list[list[int]]
+
+    def __init__(self, enable_tracemalloc: bool = False):
+        self.events = []
+        self.enable_tracemalloc = enable_tracemalloc
+        self.lock = threading.Lock()
+        self.thread_state = threading.local()
+        self.open_span_peaks_traced_by_thread = []
+        if enable_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # NOTE: Spans are nested per thread, so every thread has its own stack of open spans
+    def get_open_span_peaks_traced(self) -> list[int]:
+        if not hasattr(self.thread_state, "open_span_peaks_traced"):
+            self.thread_state.open_span_peaks_traced = []
+            with self.lock:
+                self.open_span_peaks_traced_by_thread.append(
+                    self.thread_state.open_span_peaks_traced
+                )
+        return self.thread_state.open_span_peaks_traced
+
+    # NOTE: tracemalloc only knows a single peak for the whole process, so it is folded into the open
+    #       spans of all threads before it is reset for a new span. Has to be called with the lock.
+    def update_open_span_peaks_traced(self):
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        for open_span_peaks_traced in self.open_span_peaks_traced_by_thread:
+            open_span_peaks_traced[:] = [max(peak, peak_traced) for peak in open_span_peaks_traced]
+
+    @contextlib.contextmanager
+    def span(self, name: str, args: dict):
+        open_span_peaks_traced = self.get_open_span_peaks_traced()
+        with self.lock:
+            if self.enable_tracemalloc:
+                self.update_open_span_peaks_traced()
+                tracemalloc.reset_peak()
+            open_span_peaks_traced.append(0)
+        start_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_time
+            cpu_time = time.process_time() - start_cpu_time
+            with self.lock:
+                if self.enable_tracemalloc:
+                    self.update_open_span_peaks_traced()
+                peak_traced = open_span_peaks_traced.pop()
+
+            event_args = dict(args)
+            event_args["cpu_ms"] = round(cpu_time * 1000.0, 3)
+            event_args["process_peak_rss_mb"] = round(
+                get_process_peak_rss_bytes() / (1024 * 1024), 3
+            )
+            if self.enable_tracemalloc:
+                event_args["peak_traced_mb"] = round(peak_traced / (1024 * 1024), 3)
+
+            # NOTE: This uses the Chrome trace event format, which Perfetto can open as well
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": round(start_time * 1000000.0, 3),
+                    "dur": round(wall_time * 1000000.0, 3),
+                    "pid": os.getpid(),
+                    "tid": threading.get_native_id(),
+                    "args": event_args,
+                }
+            )
+
+    def write(self, filepath: str):
+        process_ids = []
+        for event in self.events:
+            if event["pid"] not in process_ids:
+                process_ids.append(event["pid"])
+        metadata_events = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": process_id,
+                "args": {"name": "main" if process_id == os.getpid() else "worker"},
+            }
+            for process_id in process_ids
+        ]
+        with open(filepath, "w") as trace_file:
+            json.dump(
+                {"traceEvents": metadata_events + self.events, "displayTimeUnit": "ms"}, trace_file
+            )
+
+    def print_summary(self, output: io.IOBase):
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(
+                event["name"],
+                {
+                    "count": 0,
+                    "wall": 0.0,
+                    "wall_max": 0.0,
+                    "cpu": 0.0,
+                    "process_rss": 0.0,
+                    "traced": 0.0,
+                },
+            )
+            stage["count"] += 1
+            stage["wall"] += event["dur"] / 1000.0
+            stage["wall_max"] = max(stage["wall_max"], event["dur"] / 1000.0)
+            stage["cpu"] += event["args"]["cpu_ms"]
+            stage["process_rss"] = max(stage["process_rss"], event["args"]["process_peak_rss_mb"])
+            stage["traced"] = max(stage["traced"], event["args"].get("peak_traced_mb", 0.0))
+
+        print(
+            "{:<24} {:>7} {:>12} {:>12} {:>12} {:>21} {:>16}".format(
+                "Stage",
+                "Count",
+                "Wall ms",
+                "Max wall ms",
+                "CPU ms",
+                "Process peak RSS MB",
+                "Peak traced MB",
+            ),
+            file=output,
+        )
+        for name, stage in stages.items():
+            print(
+                "{:<24} {:>7} {:>12.1f} {:>12.1f} {:>12.1f} {:>21.1f} {:>16}".format(
+                    name,
+                    stage["count"],
+                    stage["wall"],
+                    stage["wall_max"],
+                    stage["cpu"],
+                    stage["process_rss"],
+                    "{:.1f}".format(stage["traced"]) if self.enable_tracemalloc else "-",
+                ),
+                file=output,
+            )
+
+        page_events = [event for event in self.events if event["name"] == "page"]
+        if len(page_events) > 0:
+            print("Slowest pages:", file=output)
+            for event in sorted(page_events, key=lambda event: event["dur"], reverse=True)[:5]:
+                print(
+                    "  page {}x{}: {:.1f} ms".format(
+                        event["args"]["x"],
+                        event["args"]["y"],
+                        event["dur"] / 1000.0,
+                    ),
+                    file=output,
+                )
+
+
+@contextlib.contextmanager
+def trace_span(name: str, **args):
+    if g_tracer == None:
+        yield
+    else:
+        with g_tracer.span(name, args):
+            yield
+
+
+def tracer_finish(trace_filepath: str):
+    # NOTE: stdout is reserved for the machine-readable results in batch mode
+    g_tracer.print_summary(sys.stderr)
+    if trace_filepath != None:
+        g_tracer.write(trace_filepath)
+        print("Trace written to '{}'".format(trace_filepath), file=sys.stderr)
+
+
+def tracer_get_worker_settings() -> dict:
+    if g_tracer == None:
+        return None
+    return {"enable_tracemalloc": g_tracer.enable_tracemalloc}
+
+
+# NOTE: Worker processes trace into their own tracer and send the events back with the result
+def tracer_run_in_worker(tracer_settings: dict, function, *args) -> tuple:
+    global g_tracer
+    if tracer_settings == None:
+        return function(*args), []
+    g_tracer = Tracer(**tracer_settings)
+    try:
+        return function(*args), g_tracer.events
+    finally:
+        g_tracer = None
+
+
+def tracer_unpack_worker_result(worker_result: tuple):
+    result, events = worker_result
+    if g_tracer != None:
+        g_tracer.events += events
+    return result
+
+
+# NOTE: Progress reporting is enabled by setting a progress reporter while an image is processed.
+#       Like with tracing, the instrumented code calls the progress_* functions, which do nothing
+#       while there is no reporter. The reporter is a context variable and not a plain global, so
+#       that images processed concurrently on different threads do not see each other's reporter.
+g_progress_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+PROGRESS_EVENT_STAGE = "stage"
+PROGRESS_EVENT_PAGE_STARTED = "page_started"
+PROGRESS_EVENT_PAGE_FINISHED = "page_finished"
+PROGRESS_EVENT_DONE = "done"
+PROGRESS_EVENT_FAILED = "failed"
+
+PROGRESS_STAGE_CREATE_PAGE_TEMPLATE = "create_page_template"
+PROGRESS_STAGE_CREATE_OVERVIEW = "create_overview"
+PROGRESS_STAGE_IMPOSE_SLIVER_PAGES = "impose_sliver_pages"
+PROGRESS_STAGE_WRITE_INTERMEDIATES = "write_intermediates"
+PROGRESS_STAGE_RENDER = "render"
+PROGRESS_STAGE_WRITE = "write"
+
+PROGRESS_POLL_INTERVAL_SECONDS = 0.1
+
+
+class ProgressReporter:
+    callback: callable
+    image_filepath: str
+    start_time: float
+    render_start_time: float
+    stage: str
+    page_count: int
+    finished_page_count: int
+    bytes_written: int
+    worker_manager: multiprocessing.managers.SyncManager
+    worker_queue: queue.Queue
+
+    def __init__(self, callback: callable, image_filepath: str):
+        self.callback = callback
+        self.image_filepath = image_filepath
+        self.start_time = time.perf_counter()
+        self.render_start_time = None
+        self.stage = None
+        self.page_count = 0
+        self.finished_page_count = 0
+        self.bytes_written = 0
+        self.worker_manager = None
+        self.worker_queue = None
+
+    def emit(self, event: str, **args):
+        now = time.perf_counter()
+        pages_per_second = None
+        eta_seconds = None
+        # NOTE: The throughput is measured from the start of rendering, so that the setup stages do
+        #       not skew the estimate for the remaining pages
+        if self.render_start_time != None and self.finished_page_count > 0:
+            pages_per_second = self.finished_page_count / max(now - self.render_start_time, 1e-9)
+            eta_seconds = (self.page_count - self.finished_page_count) / pages_per_second
+        result = {
+            "event": event,
+            "image": self.image_filepath,
+            "stage": self.stage,
+            "elapsed_seconds": round(now - self.start_time, 3),
+            "pages_done": self.finished_page_count,
+            "page_count": self.page_count,
+            "pages_per_second": None if pages_per_second == None else round(pages_per_second, 3),
+            "eta_seconds": None if eta_seconds == None else round(eta_seconds, 3),
+            "bytes_written": self.bytes_written,
+        }
+        result.update(args)
+        self.callback(result)
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.emit(PROGRESS_EVENT_STAGE)
+
+    def start_rendering(self, page_count: int):
+        self.page_count = page_count
+        self.render_start_time = time.perf_counter()
+        self.set_stage(PROGRESS_STAGE_RENDER)
+
+    def page_started(self, page: str):
+        self.emit(PROGRESS_EVENT_PAGE_STARTED, page=page)
+
+    def page_finished(self, page: str, output_byte_count: int):
+        self.finished_page_count += 1
+        self.bytes_written += output_byte_count
+        self.emit(PROGRESS_EVENT_PAGE_FINISHED, page=page)
+
+    # NOTE: Worker processes send their page events through a queue of a manager process, whose
+    #       puts have arrived once they return. So all events of a finished worker call are
+    #       received by the next poll.
+    def get_worker_queue(self) -> queue.Queue:
+        if self.worker_queue == None:
+            self.worker_manager = multiprocessing.Manager()
+            self.worker_queue = self.worker_manager.Queue()
+        return self.worker_queue
+
+    def poll_worker_queue(self):
+        if self.worker_queue == None:
+            return
+        while True:
+            try:
+                event, page, output_byte_count = self.worker_queue.get_nowait()
+            except queue.Empty:
+                return
+            if event == PROGRESS_EVENT_PAGE_STARTED:
+                self.page_started(page)
+            else:
+                self.page_finished(page, output_byte_count)
+
+    def close(self):
+        if self.worker_manager != None:
+            self.worker_manager.shutdown()
+            self.worker_manager = None
+            self.worker_queue = None
+
+
+class ProgressWorkerReporter:
+    worker_queue: queue.Queue
+
+    def __init__(self, worker_queue: queue.Queue):
+        self.worker_queue = worker_queue
+
+    def page_started(self, page: str):
+        self.worker_queue.put((PROGRESS_EVENT_PAGE_STARTED, page, 0))
+
+    def page_finished(self, page: str, output_byte_count: int):
+        self.worker_queue.put((PROGRESS_EVENT_PAGE_FINISHED, page, output_byte_count))
+
+
+@contextlib.contextmanager
+def progress_reporting(progress_callback: callable, image_filepath: str):
+    if progress_callback == None:
+        yield
+        return
+    progress_reporter = ProgressReporter(progress_callback, image_filepath)
+    token = g_progress_reporter.set(progress_reporter)
+    try:
+        yield
+    except Exception as error:
+        progress_reporter.emit(
+            PROGRESS_EVENT_FAILED, error="{}: {}".format(type(error).__name__, error)
+        )
+        raise
+    finally:
+        progress_reporter.close()
+        g_progress_reporter.reset(token)
+
+
+def progress_stage(stage: str):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter != None:
+        progress_reporter.set_stage(stage)
+
+
+def progress_start_rendering(page_count: int):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter != None:
+        progress_reporter.start_rendering(page_count)
+
+
+def progress_page_started(page: str):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter != None:
+        progress_reporter.page_started(page)
+
+
+# NOTE: The output byte count is what the output grew by since the previous page. cairo buffers its
+#       output and writes shared resources like fonts only when the document is finished, so it is
+#       not the size of the page. The page events therefore only report the running total in
+#       bytes_written, which is approximate until the done event.
+def progress_page_finished(page: str, output_byte_count: int):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter != None:
+        progress_reporter.page_finished(page, output_byte_count)
+
+
+# NOTE: The done event reports the exact size of all written output files
+def progress_done(output_dir: str):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter == None:
+        return
+    progress_reporter.bytes_written = sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for directory, _, filenames in os.walk(output_dir)
+        for filename in filenames
+    )
+    progress_reporter.emit(PROGRESS_EVENT_DONE)
+
+
+def progress_get_page_name(page_index_x: int, page_index_y: int) -> str:
+    return "{}x{}".format(page_index_x, page_index_y)
+
+
+def progress_get_sheet_name(sheet_index: int) -> str:
+    return "sheet_{}".format(sheet_index)
+
+
+def progress_get_worker_queue() -> queue.Queue:
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter == None:
+        return None
+    return progress_reporter.get_worker_queue()
+
+
+def progress_run_in_worker(worker_queue: queue.Queue, function, *args):
+    if worker_queue == None:
+        return function(*args)
+    token = g_progress_reporter.set(ProgressWorkerReporter(worker_queue))
+    try:
+        return function(*args)
+    finally:
+        g_progress_reporter.reset(token)
+
+
+# NOTE: Waits for the futures of worker calls while forwarding their page events
+def progress_wait_for_futures(futures: list[concurrent.futures.Future]):
+    progress_reporter = g_progress_reporter.get()
+    if progress_reporter == None:
+        return
+    not_done = futures
+    while len(not_done) > 0:
+        _, not_done = concurrent.futures.wait(not_done, timeout=PROGRESS_POLL_INTERVAL_SECONDS)
+        progress_reporter.poll_worker_queue()
+
+
+def progress_create_json_printer(output: io.IOBase) -> callable:
+    def print_event(event: dict):
+        print(json.dumps(event), file=output, flush=True)
+
+    return print_event
+
+
 class Rect:
     x: float
     y: float
@@ -108,13 +782,10 @@ class PageChoppingDimensions:
         if self.last_row_height == 0.0:
             self.last_row_height = conversion_factor * page_inner_height_mm
 
-        print("Resulting page count: {}x{}".format(self.page_count_x, self.page_count_y))
-        print("Last column width: {}{}".format(self.last_column_width, image_unit))
-        print("Last row height: {}{}".format(self.last_row_height, image_unit))
         if self.page_count_x <= 0:
-            exit_error("Image has invalid horizontal dimensions")
+            raise InvalidSvgError("Image has invalid horizontal dimensions")
         if self.page_count_y <= 0:
-            exit_error("Image has invalid vertical dimensions")
+            raise InvalidSvgError("Image has invalid vertical dimensions")
 
     def get_clipping_rect_for_page_index(self, page_index_x: int, page_index_y: int):
         assert 0 <= page_index_x and page_index_x < self.page_count_x
@@ -138,70 +809,406 @@ class PageChoppingDimensions:
         )
 
 
+# NOTE: Layout search: Picks the paper, orientation and border that need the fewest printed sheets
+#       for an image before it is rendered. Only the size of the root node is read, unless skipped
+#       blank pages or imposed sliver pages change the sheet count. The printable area of every
+#       paper uses the margins of the default A4 layout above, the border is then taken from the
+#       printable area.
+PAGE_LAYOUT_FIXED = "fixed"
+PAGE_LAYOUT_AUTO = "auto"
+PAGE_LAYOUTS = [PAGE_LAYOUT_FIXED, PAGE_LAYOUT_AUTO]
+LAYOUT_PAPER_SIZES_MM = {"a4": (210.0, 297.0), "letter": (215.9, 279.4)}
+LAYOUT_PAPER_MARGIN_X_MM = 15.0
+LAYOUT_PAPER_MARGIN_Y_MM = 23.5
+LAYOUT_PAGE_BORDERS_MM = [0.0, 7.0, 14.0]
+LAYOUT_ORIENTATION_PORTRAIT = "portrait"
+LAYOUT_ORIENTATION_LANDSCAPE = "landscape"
+LAYOUT_STRIP_COLUMN = "column"
+LAYOUT_STRIP_ROW = "row"
+
+
+class PageLayout:
+    paper: str
+    orientation: str
+    page_inner_width_mm: float
+    page_inner_height_mm: float
+    page_border_mm: float
+    page_count_x: int
+    page_count_y: int
+    page_count: int
+    printed_page_count: int
+    rotated_last_strip: str
+    rotated_last_strip_page_count: int
+
+    def __init__(
+        self,
+        paper: str,
+        orientation: str,
+        page_inner_width_mm: float,
+        page_inner_height_mm: float,
+        page_border_mm: float,
+    ):
+        self.paper = paper
+        self.orientation = orientation
+        self.page_inner_width_mm = page_inner_width_mm
+        self.page_inner_height_mm = page_inner_height_mm
+        self.page_border_mm = page_border_mm
+        self.page_count_x = 0
+        self.page_count_y = 0
+        self.page_count = 0
+        self.printed_page_count = 0
+        self.rotated_last_strip = None
+        self.rotated_last_strip_page_count = 0
+
+    def get_rotated_orientation(self) -> str:
+        if self.orientation == LAYOUT_ORIENTATION_PORTRAIT:
+            return LAYOUT_ORIENTATION_LANDSCAPE
+        return LAYOUT_ORIENTATION_PORTRAIT
+
+
+def layout_read_image_dimensions(image_source) -> tuple[float, float, str]:
+    for svg_root_node, _ in svg_iterparse_root_children(image_source):
+        return svg_validate_and_get_image_dimensions_and_unit(svg_root_node)
+    raise InvalidSvgError("Input file is not a valid SVG image")
+
+
+def layout_get_candidates() -> list[PageLayout]:
+    result = []
+    for paper, (paper_width_mm, paper_height_mm) in LAYOUT_PAPER_SIZES_MM.items():
+        for page_border_mm in LAYOUT_PAGE_BORDERS_MM:
+            page_inner_width_mm = paper_width_mm - 2.0 * (LAYOUT_PAPER_MARGIN_X_MM + page_border_mm)
+            page_inner_height_mm = paper_height_mm - 2.0 * (
+                LAYOUT_PAPER_MARGIN_Y_MM + page_border_mm
+            )
+            result.append(
+                PageLayout(
+                    paper,
+                    LAYOUT_ORIENTATION_PORTRAIT,
+                    page_inner_width_mm,
+                    page_inner_height_mm,
+                    page_border_mm,
+                )
+            )
+            result.append(
+                PageLayout(
+                    paper,
+                    LAYOUT_ORIENTATION_LANDSCAPE,
+                    page_inner_height_mm,
+                    page_inner_width_mm,
+                    page_border_mm,
+                )
+            )
+    return result
+
+
+# NOTE: Uses the same math as PageChoppingDimensions. The rotated last strip is the last column or row
+#       of the page grid printed on pages in the other orientation, if that needs fewer pages. The
+#       chopping functions only cut uniform page grids, so it is reported as a hint and does not
+#       change the printed page count the layouts are compared by.
+def layout_evaluate(
+    layout: PageLayout, image_width_mm: float, image_height_mm: float
+) -> PageLayout:
+    page_width = layout.page_inner_width_mm
+    page_height = layout.page_inner_height_mm
+    layout.page_count_x = math.ceil(image_width_mm / page_width)
+    layout.page_count_y = math.ceil(image_height_mm / page_height)
+    layout.page_count = layout.page_count_x * layout.page_count_y
+    layout.printed_page_count = layout.page_count
+
+    layout.rotated_last_strip = None
+    layout.rotated_last_strip_page_count = layout.page_count
+    if layout.page_count_x > 1:
+        last_column_width = image_width_mm - (layout.page_count_x - 1) * page_width
+        page_count = (layout.page_count_x - 1) * layout.page_count_y + math.ceil(
+            last_column_width / page_height
+        ) * math.ceil(image_height_mm / page_width)
+        if page_count < layout.rotated_last_strip_page_count:
+            layout.rotated_last_strip = LAYOUT_STRIP_COLUMN
+            layout.rotated_last_strip_page_count = page_count
+    if layout.page_count_y > 1:
+        last_row_height = image_height_mm - (layout.page_count_y - 1) * page_height
+        page_count = (layout.page_count_y - 1) * layout.page_count_x + math.ceil(
+            last_row_height / page_width
+        ) * math.ceil(image_width_mm / page_height)
+        if page_count < layout.rotated_last_strip_page_count:
+            layout.rotated_last_strip = LAYOUT_STRIP_ROW
+            layout.rotated_last_strip_page_count = page_count
+    return layout
+
+
+# NOTE: Counts the pages and sheets that are printed with the layout, the same way the chopping
+#       functions pick them. The element bounds of the page template are in image coordinates, so a
+#       template created with any page size can be used for every candidate.
+def layout_count_printed_pages(
+    layout: PageLayout,
+    image_width: float,
+    image_height: float,
+    image_unit: str,
+    page_template: SvgPageTemplate,
+    blank_pages: str,
+    impose_slivers: bool,
+) -> int:
+    dimensions = PageChoppingDimensions(
+        image_width,
+        image_height,
+        image_unit,
+        layout.page_inner_width_mm,
+        layout.page_inner_height_mm,
+        layout.page_border_mm,
+    )
+    page_indices = [
+        (page_index_x, page_index_y)
+        for page_index_y in range(dimensions.page_count_y)
+        for page_index_x in range(dimensions.page_count_x)
+    ]
+    if blank_pages == BLANK_PAGES_SKIP and not page_template.has_visible_head_node:
+        content_element_count = page_template.content_element_count
+        blank_page_indices = svg_find_blank_pages(
+            svg_build_page_element_index(
+                page_template.element_bounds[:content_element_count], dimensions
+            ),
+            content_element_count,
+        )
+        page_indices = [
+            page_index for page_index in page_indices if page_index not in blank_page_indices
+        ]
+    sheets = []
+    if impose_slivers:
+        page_indices, sheets = impose_sliver_pages(dimensions, page_template, page_indices)
+    return len(page_indices) + len(sheets)
+
+
+def layout_find_best(
+    image_width: float,
+    image_height: float,
+    image_unit: str,
+    page_template: SvgPageTemplate,
+    blank_pages: str,
+    impose_slivers: bool,
+) -> PageLayout:
+    image_width_mm = image_width
+    image_height_mm = image_height
+    if image_unit == "px":
+        image_width_mm /= FACTOR_MM_TO_PX
+        image_height_mm /= FACTOR_MM_TO_PX
+    if image_width_mm <= 0.0 or image_height_mm <= 0.0:
+        raise InvalidSvgError("Image has invalid dimensions")
+
+    # NOTE: On the same sheet count we prefer the larger border, as it leaves more room for gluing,
+    #       and then the earlier candidate, which puts A4 and portrait first
+    best_layout = None
+    for layout in layout_get_candidates():
+        layout_evaluate(layout, image_width_mm, image_height_mm)
+        if page_template != None:
+            layout.printed_page_count = layout_count_printed_pages(
+                layout,
+                image_width,
+                image_height,
+                image_unit,
+                page_template,
+                blank_pages,
+                impose_slivers,
+            )
+        if (
+            best_layout == None
+            or layout.printed_page_count < best_layout.printed_page_count
+            or (
+                layout.printed_page_count == best_layout.printed_page_count
+                and layout.page_border_mm > best_layout.page_border_mm
+            )
+        ):
+            best_layout = layout
+    return best_layout
+
+
+# NOTE: Returns None for the fixed layout. Skipped blank pages and imposed sliver pages depend on
+#       the element bounds, so in that case the image is parsed once more with the given page size
+#       before the chosen layout is parsed again for chopping.
+def layout_resolve(
+    image_source,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    page_layout: str,
+    blank_pages: str,
+    impose_slivers: bool,
+) -> PageLayout:
+    if page_layout == PAGE_LAYOUT_FIXED:
+        return None
+
+    image_width, image_height, image_unit = layout_read_image_dimensions(image_source)
+    if hasattr(image_source, "seek"):
+        image_source.seek(0)
+    page_template = None
+    if blank_pages == BLANK_PAGES_SKIP or impose_slivers:
+        with trace_span("create_layout_page_template"):
+            _, page_template = svg_create_page_template(
+                image_source, page_inner_width_mm, page_inner_height_mm, page_border_mm
+            )
+        if hasattr(image_source, "seek"):
+            image_source.seek(0)
+    return layout_find_best(
+        image_width, image_height, image_unit, page_template, blank_pages, impose_slivers
+    )
+
+
+def layout_print(layout: PageLayout):
+    print(
+        "Chosen layout: {} {}, border {}mm, {} pages".format(
+            layout.paper, layout.orientation, layout.page_border_mm, layout.printed_page_count
+        )
+    )
+    if layout.rotated_last_strip != None:
+        print(
+            "Note: Printing the last {} in {} would need {} instead of {} pages of the full grid, "
+            "which is not supported yet".format(
+                layout.rotated_last_strip,
+                layout.get_rotated_orientation(),
+                layout.rotated_last_strip_page_count,
+                layout.page_count,
+            )
+        )
+
+
+# NOTE: All numbers we write into the SVGs are rounded to this many decimals. The shortest round-trip
+#       representation of a float has up to 17 significant digits, which cairosvg has to parse again
+#       on every page, while a ten thousandth of a pixel is far below any print resolution.
+SVG_NUMBER_PRECISION_DEFAULT = 4
+# NOTE: The page sizes, view boxes and clipping rects are rounded as well, and neighbouring pages
+#       round their shared edge independently. Below a hundredth of a unit the rounding leaves
+#       visible gaps or overlaps between the pages.
+SVG_NUMBER_PRECISION_MIN = 2
+
+
+def svg_format_number(value: float, number_precision: int) -> str:
+    result = "%.*f" % (number_precision, value)
+    if "." in result:
+        result = result.rstrip("0").rstrip(".")
+    if result == "-0":
+        return "0"
+    return result
+
+
+SVG_MARKER_SIZE = 7.0
+SVG_MARKER_ID_HORIZONTAL = "tonitonichoppi_marker_horizontal"
+SVG_MARKER_ID_VERTICAL = "tonitonichoppi_marker_vertical"
+
+
+# NOTE: The diamonds of the markers are defined once and then placed with <use>. Plain paths are
+#       used instead of <symbol>, as a symbol would clip the diamond to the viewport of the <use>.
+def svg_draw_marker_definitions(svg_parent_node: ElementTree.Element, number_precision: int):
+    def format_diamond(points: list[tuple[float, float]]) -> str:
+        return " L".join(
+            "{} {}".format(
+                svg_format_number(x, number_precision), svg_format_number(y, number_precision)
+            )
+            for x, y in points
+        )
+
+    diamond_horizontal = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "path")
+    diamond_horizontal.set("id", SVG_MARKER_ID_HORIZONTAL)
+    diamond_horizontal.set(
+        "d",
+        "M"
+        + format_diamond(
+            [
+                (-SVG_MARKER_SIZE, 0.0),
+                (0.0, SVG_MARKER_SIZE / 2.0),
+                (SVG_MARKER_SIZE, 0.0),
+                (0.0, -SVG_MARKER_SIZE / 2.0),
+                (-SVG_MARKER_SIZE, 0.0),
+            ]
+        ),
+    )
+    diamond_horizontal.set("stroke-width", "0.5")
+
+    diamond_vertical = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "path")
+    diamond_vertical.set("id", SVG_MARKER_ID_VERTICAL)
+    diamond_vertical.set(
+        "d",
+        "M"
+        + format_diamond(
+            [
+                (0.0, -SVG_MARKER_SIZE),
+                (SVG_MARKER_SIZE / 2.0, 0.0),
+                (0.0, SVG_MARKER_SIZE),
+                (-SVG_MARKER_SIZE / 2.0, 0.0),
+                (0.0, -SVG_MARKER_SIZE),
+            ]
+        ),
+    )
+    diamond_vertical.set("stroke-width", "0.5")
+
+    defs = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "defs")
+    defs.append(diamond_horizontal)
+    defs.append(diamond_vertical)
+    svg_parent_node.append(defs)
+
+
+# NOTE: The labels and the diamond inherit all their common attributes from the group
+def svg_create_marker_group(
+    marker_id: str,
+    pos_x: float,
+    pos_y: float,
+    color: str,
+    fill_diamonds: bool,
+    opacity: float,
+    number_precision: int,
+) -> ElementTree.Element:
+    group = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
+    group.set("opacity", svg_format_number(opacity, number_precision))
+    group.set("font-family", "sans-serif")
+    group.set("font-size", "10")
+    group.set("dominant-baseline", "middle")
+    group.set("stroke-width", "0")
+    group.set("stroke", color)
+    group.set("fill", color)
+
+    diamond = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "use")
+    diamond.set("href", "#" + marker_id)
+    diamond.set("x", svg_format_number(pos_x, number_precision))
+    diamond.set("y", svg_format_number(pos_y, number_precision))
+    if not fill_diamonds:
+        diamond.set("fill", "none")
+    group.append(diamond)
+
+    return group
+
+
+def svg_create_marker_label(
+    text: str, pos_x: float, pos_y: float, text_anchor: str, number_precision: int
+) -> ElementTree.Element:
+    label = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "text")
+    label.set("x", svg_format_number(pos_x, number_precision))
+    label.set("y", svg_format_number(pos_y, number_precision))
+    label.set("text-anchor", text_anchor)
+    label.text = text
+    return label
+
+
 def svg_draw_marker_horizontal(
     svg_parent_node: ElementTree.Element,
     text: str,
     pos_x: float,
     pos_y: float,
+    number_precision: int,
     color: str = "#555",
     fill_diamonds: bool = True,
     opacity: float = 0.7,
-    marker_size: float = 7.0,
 ):
-    text_left = ElementTree.Element(SVG_NAMESPACE_PREFIX + "text")
-    text_left.set("x", str(pos_x - (marker_size + 2.0)))
-    text_left.set("y", str(pos_y))
-    text_left.set("font-family", "sans-serif")
-    text_left.set("font-size", "10")
-    text_left.set("dominant-baseline", "middle")
-    text_left.set("text-anchor", "end")
-    text_left.set("stroke-width", "0")
-    text_left.set("stroke", color)
-    text_left.set("fill", color)
-    text_left.text = text
-
-    text_right = ElementTree.Element(SVG_NAMESPACE_PREFIX + "text")
-    text_right.set("x", str(pos_x + (marker_size + 2.0)))
-    text_right.set("y", str(pos_y))
-    text_right.set("font-family", "sans-serif")
-    text_right.set("font-size", "10")
-    text_right.set("dominant-baseline", "middle")
-    text_right.set("text-anchor", "start")
-    text_right.set("stroke-width", "0")
-    text_right.set("stroke", color)
-    text_right.set("fill", color)
-    text_right.text = text
-
-    diamond = ElementTree.Element(SVG_NAMESPACE_PREFIX + "path")
-    diamond.set(
-        "d",
-        "M{} {} L{} {} L{} {} L{} {} L{} {}".format(
-            pos_x - marker_size,
-            pos_y,
-            pos_x,
-            pos_y + marker_size / 2.0,
-            pos_x + marker_size,
-            pos_y,
-            pos_x,
-            pos_y - marker_size / 2.0,
-            pos_x - marker_size,
-            pos_y,
-        ),
+    group = svg_create_marker_group(
+        SVG_MARKER_ID_HORIZONTAL, pos_x, pos_y, color, fill_diamonds, opacity, number_precision
+    )
+    group.append(
+        svg_create_marker_label(
+            text, pos_x - (SVG_MARKER_SIZE + 2.0), pos_y, "end", number_precision
+        )
+    )
+    group.append(
+        svg_create_marker_label(
+            text, pos_x + (SVG_MARKER_SIZE + 2.0), pos_y, "start", number_precision
+        )
     )
-    diamond.set("stroke-width", "0.5")
-    diamond.set("stroke", color)
-    if fill_diamonds:
-        diamond.set("fill", color)
-    else:
-        diamond.set("fill", "none")
-    diamond.text = text
-
-    group = ElementTree.Element(SVG_NAMESPACE_PREFIX + "g")
-    group.set("opacity", str(opacity))
-    group.append(text_left)
-    group.append(text_right)
-    group.append(diamond)
-
     svg_parent_node.append(group)
 
 
@@ -210,132 +1217,94 @@ def svg_draw_marker_vertical(
     text: str,
     pos_x: float,
     pos_y: float,
+    number_precision: int,
     color: str = "#555",
     fill_diamonds: bool = True,
     opacity: float = 0.7,
-    marker_size: float = 7.0,
 ):
-    text_top = ElementTree.Element(SVG_NAMESPACE_PREFIX + "text")
-    text_top.set("x", str(pos_x))
-    text_top.set("y", str(pos_y - (marker_size + 5.0)))
-    text_top.set("font-family", "sans-serif")
-    text_top.set("font-size", "10")
-    text_top.set("dominant-baseline", "middle")
-    text_top.set("text-anchor", "middle")
-    text_top.set("stroke-width", "0")
-    text_top.set("stroke", color)
-    text_top.set("fill", color)
-    text_top.text = text
-
-    text_bottom = ElementTree.Element(SVG_NAMESPACE_PREFIX + "text")
-    text_bottom.set("x", str(pos_x))
-    text_bottom.set("y", str(pos_y + (marker_size + 7.0)))
-    text_bottom.set("font-family", "sans-serif")
-    text_bottom.set("font-size", "10")
-    text_bottom.set("dominant-baseline", "middle")
-    text_bottom.set("text-anchor", "middle")
-    text_bottom.set("stroke-width", "0")
-    text_bottom.set("stroke", color)
-    text_bottom.set("fill", color)
-    text_bottom.text = text
-
-    diamond = ElementTree.Element(SVG_NAMESPACE_PREFIX + "path")
-    diamond.set(
-        "d",
-        "M{} {} L{} {} L{} {} L{} {} L{} {}".format(
-            pos_x,
-            pos_y - marker_size,
-            pos_x + marker_size / 2.0,
-            pos_y,
-            pos_x,
-            pos_y + marker_size,
-            pos_x - marker_size / 2.0,
-            pos_y,
-            pos_x,
-            pos_y - marker_size,
-        ),
+    group = svg_create_marker_group(
+        SVG_MARKER_ID_VERTICAL, pos_x, pos_y, color, fill_diamonds, opacity, number_precision
     )
-    diamond.set("stroke-width", "0.5")
-    diamond.set("stroke", color)
-    if fill_diamonds:
-        diamond.set("fill", color)
-    else:
-        diamond.set("fill", "none")
-    diamond.text = text
+    group.append(
+        svg_create_marker_label(
+            text, pos_x, pos_y - (SVG_MARKER_SIZE + 5.0), "middle", number_precision
+        )
+    )
+    group.append(
+        svg_create_marker_label(
+            text, pos_x, pos_y + (SVG_MARKER_SIZE + 7.0), "middle", number_precision
+        )
+    )
+    svg_parent_node.append(group)
 
-    group = ElementTree.Element(SVG_NAMESPACE_PREFIX + "g")
-    group.set("opacity", str(opacity))
-    group.append(text_top)
-    group.append(text_bottom)
-    group.append(diamond)
 
-    svg_parent_node.append(group)
+# NOTE: Columns are labeled a-z, A-Z, then aa, ab, ... like spreadsheet columns, so there is a label
+#       for any number of columns
+def get_column_label(column_index: int) -> str:
+    COLUMN_LABEL_LETTERS = string.ascii_lowercase + string.ascii_uppercase
+    result = ""
+    column_number = column_index + 1
+    while column_number > 0:
+        column_number, letter_index = divmod(column_number - 1, len(COLUMN_LABEL_LETTERS))
+        result = COLUMN_LABEL_LETTERS[letter_index] + result
+    return result
+
+
+# NOTE: Pages are labeled like spreadsheet cells with the column first, so that a page label can not
+#       be mistaken for the label of a marker
+def get_page_label(page_index_x: int, page_index_y: int) -> str:
+    return get_column_label(page_index_x) + str(page_index_y + 1)
 
 
 def svg_validate_and_get_image_dimensions_and_unit(svg_node) -> tuple[float, float, str]:
     if not svg_node.tag.endswith("svg"):
-        exit_error("Input file is not a valid SVG image")
+        raise InvalidSvgError("Input file is not a valid SVG image")
 
     if svg_node.get("x") != None:
         if svg_node.get("x").endswith("mm"):
             if float(svg_node.get("x").removesuffix("mm")) != 0.0:
-                exit_error("Input image x must be zero")
+                raise InvalidSvgError("Input image x must be zero")
         elif svg_node.get("x").endswith("px"):
             if float(svg_node.get("x").removesuffix("px")) != 0.0:
-                exit_error("Input image x must be zero")
+                raise InvalidSvgError("Input image x must be zero")
         else:
-            exit_error("Input image x is not given in any unit ('mm' or 'px')")
+            raise InvalidSvgError("Input image x is not given in any unit ('mm' or 'px')")
     if svg_node.get("y") != None:
         if svg_node.get("y").endswith("mm"):
             if float(svg_node.get("y").removesuffix("mm")) != 0.0:
-                exit_error("Input image y must be zero")
+                raise InvalidSvgError("Input image y must be zero")
         elif svg_node.get("y").endswith("px"):
             if float(svg_node.get("y").removesuffix("px")) != 0.0:
-                exit_error("Input image y must be zero")
+                raise InvalidSvgError("Input image y must be zero")
         else:
-            exit_error("Input image y is not given in any unit ('mm' or 'px')")
+            raise InvalidSvgError("Input image y is not given in any unit ('mm' or 'px')")
 
+    if svg_node.get("width") == None or svg_node.get("height") == None:
+        raise InvalidSvgError("Input image is missing its width or height")
     unit_suffix = False
     if svg_node.get("width").endswith("mm"):
         unit_suffix = "mm"
     elif svg_node.get("width").endswith("px"):
         unit_suffix = "px"
     else:
-        exit_error("Input image width is not given in any unit ('mm' or 'px')")
+        raise InvalidSvgError("Input image width is not given in any unit ('mm' or 'px')")
 
     image_width = float(svg_node.get("width").removesuffix(unit_suffix))
     image_height = float(svg_node.get("height").removesuffix(unit_suffix))
-    print(
-        "SVG image dimensions: {}{} x {}{} ".format(
-            image_width, unit_suffix, image_height, unit_suffix
-        )
-    )
 
     if svg_node.get("viewBox") == None:
-        exit_error("SVG image is missing a 'viewBox' attribute")
+        raise InvalidSvgError("SVG image is missing a 'viewBox' attribute")
     viewbox_x, viewbox_y, viewbox_width, viewbox_height = map(
         float, svg_node.get("viewBox").split(" ")
     )
-    print(
-        "SVG view box dimensions: {}{} x {}{} {}{} x {}{}".format(
-            viewbox_x,
-            unit_suffix,
-            viewbox_y,
-            unit_suffix,
-            viewbox_width,
-            unit_suffix,
-            viewbox_height,
-            unit_suffix,
-        )
-    )
     if viewbox_x != 0:
-        exit_error("SVG image viewBox.x must be zero")
+        raise InvalidSvgError("SVG image viewBox.x must be zero")
     if viewbox_y != 0:
-        exit_error("SVG image viewBox.y must be zero")
+        raise InvalidSvgError("SVG image viewBox.y must be zero")
     if viewbox_width != image_width:
-        exit_error("SVG image viewBox.width must be the same as the image width")
+        raise InvalidSvgError("SVG image viewBox.width must be the same as the image width")
     if viewbox_height != image_height:
-        exit_error("SVG image viewBox.height must be the same as the image height")
+        raise InvalidSvgError("SVG image viewBox.height must be the same as the image height")
 
     return image_width, image_height, unit_suffix
 
@@ -345,101 +1314,54 @@ def svg_draw_grid_and_markers(
     dimensions: PageChoppingDimensions,
     grid_line_thickness: float,
     use_half_grid_thickness: bool,
+    number_precision: int,
 ):
-    ALPHABET_LETTERS = [
-        "a",
-        "b",
-        "c",
-        "d",
-        "e",
-        "f",
-        "g",
-        "h",
-        "i",
-        "j",
-        "k",
-        "l",
-        "m",
-        "n",
-        "o",
-        "p",
-        "q",
-        "r",
-        "s",
-        "t",
-        "u",
-        "v",
-        "w",
-        "x",
-        "y",
-        "z",
-        "A",
-        "B",
-        "C",
-        "D",
-        "E",
-        "F",
-        "G",
-        "H",
-        "I",
-        "J",
-        "K",
-        "L",
-        "M",
-        "N",
-        "O",
-        "P",
-        "Q",
-        "R",
-        "S",
-        "T",
-        "U",
-        "V",
-        "W",
-        "X",
-        "Y",
-        "Z",
-    ]
+    def format_number(value: float) -> str:
+        return svg_format_number(value, number_precision)
+
+    svg_draw_marker_definitions(svg_node, number_precision)
 
     # DRAW GRID
-    rect_line = ElementTree.Element(SVG_NAMESPACE_PREFIX + "rect")
+    rect_line = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "rect")
     rect_line.set("stroke", "#000")
     rect_line.set("fill", "none")
-    rect_line.set("stroke-width", str(grid_line_thickness))
+    rect_line.set("stroke-width", format_number(grid_line_thickness))
     rect_line.set("x", "0")
     rect_line.set("y", "0")
-    rect_line.set("width", str(dimensions.image_width))
-    rect_line.set("height", str(dimensions.image_height))
+    rect_line.set("width", format_number(dimensions.image_width))
+    rect_line.set("height", format_number(dimensions.image_height))
     svg_node.append(rect_line)
+    # NOTE: All inner grid lines are drawn as a single path
+    grid_lines = []
     for page_index_x in range(1, dimensions.page_count_x):
-        vertical_line = ElementTree.Element(SVG_NAMESPACE_PREFIX + "path")
-        vertical_line.set("stroke", "#000")
-        if use_half_grid_thickness:
-            vertical_line.set("stroke-width", str(grid_line_thickness / 2.0))
-        else:
-            vertical_line.set("stroke-width", str(grid_line_thickness))
-        vertical_line.set(
-            "d",
-            "M{} 0 V{}".format(page_index_x * dimensions.page_inner_width, dimensions.image_height),
+        grid_lines.append(
+            "M{} 0 V{}".format(
+                format_number(page_index_x * dimensions.page_inner_width),
+                format_number(dimensions.image_height),
+            )
         )
-        svg_node.append(vertical_line)
     for page_index_y in range(1, dimensions.page_count_y):
-        horizontal_line = ElementTree.Element(SVG_NAMESPACE_PREFIX + "path")
-        horizontal_line.set("stroke", "#000")
+        grid_lines.append(
+            "M0 {} H{}".format(
+                format_number(page_index_y * dimensions.page_inner_height),
+                format_number(dimensions.image_width),
+            )
+        )
+    if len(grid_lines) > 0:
+        grid_path = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "path")
+        grid_path.set("fill", "none")
+        grid_path.set("stroke", "#000")
         if use_half_grid_thickness:
-            horizontal_line.set("stroke-width", str(grid_line_thickness / 2.0))
+            grid_path.set("stroke-width", format_number(grid_line_thickness / 2.0))
         else:
-            horizontal_line.set("stroke-width", str(grid_line_thickness))
-        horizontal_line.set(
-            "d",
-            "M0 {} H{}".format(page_index_y * dimensions.page_inner_height, dimensions.image_width),
-        )
-        svg_node.append(horizontal_line)
+            grid_path.set("stroke-width", format_number(grid_line_thickness))
+        grid_path.set("d", " ".join(grid_lines))
+        svg_node.append(grid_path)
 
     # HORIZONTAL MARKERS
     for page_index_y in range(0, dimensions.page_count_y):
         for page_index_x in range(0, dimensions.page_count_x - 1):
-            col_index = ALPHABET_LETTERS[page_index_x]
+            col_index = get_column_label(page_index_x)
             row_index = str(1 + 2 * page_index_y)
             text = row_index + col_index
             pos_x = (page_index_x + 1) * dimensions.page_inner_width
@@ -453,13 +1375,20 @@ def svg_draw_grid_and_markers(
                     page_index_y * dimensions.page_inner_height + 0.5 * dimensions.page_inner_height
                 )
             svg_draw_marker_horizontal(
-                svg_node, text, pos_x, pos_y, color="#000", opacity=0.30, fill_diamonds=True
+                svg_node,
+                text,
+                pos_x,
+                pos_y,
+                number_precision,
+                color="#000",
+                opacity=0.30,
+                fill_diamonds=True,
             )
 
     # VERTICAL MARKERS
     for page_index_y in range(0, dimensions.page_count_y - 1):
         for page_index_x in range(0, dimensions.page_count_x):
-            col_index = ALPHABET_LETTERS[page_index_x]
+            col_index = get_column_label(page_index_x)
             row_index = str(2 * (page_index_y + 1))
             text = row_index + col_index
             if page_index_x == dimensions.page_count_x - 1:
@@ -473,201 +1402,4691 @@ def svg_draw_grid_and_markers(
                 )
             pos_y = (page_index_y + 1) * dimensions.page_inner_height
             svg_draw_marker_vertical(
-                svg_node, text, pos_x, pos_y, color="#000", opacity=0.30, fill_diamonds=True
+                svg_node,
+                text,
+                pos_x,
+                pos_y,
+                number_precision,
+                color="#000",
+                opacity=0.30,
+                fill_diamonds=True,
             )
 
 
-def svg_create_page(
-    svg_tree_readonly: ElementTree,
+# Bounds are given as (min_x, min_y, max_x, max_y) tuples in the coordinate system of the root node
+BOUNDS_EMPTY = (math.inf, math.inf, -math.inf, -math.inf)
+BOUNDS_UNKNOWN = (-math.inf, -math.inf, math.inf, math.inf)
+XLINK_HREF_ATTRIBUTE = "{http://www.w3.org/1999/xlink}href"
+# NOTE: cairosvg converts absolute units into user units at its default resolution of 96 DPI
+SVG_LENGTH_UNITS_TO_USER = {
+    "px": 1.0,
+    "mm": 96.0 / 25.4,
+    "cm": 96.0 / 2.54,
+    "in": 96.0,
+    "pt": 96.0 / 72.0,
+    "pc": 16.0,
+}
+SVG_NUMBER_REGEX = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+SVG_SEPARATOR_REGEX = re.compile(r"[\s,]*")
+SVG_TRANSFORM_REGEX = re.compile(
+    r"\s*(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)[\s,]*"
+)
+SVG_TRANSFORM_ARGUMENT_UNIT_REGEX = re.compile(r"(?<=\d)(px|deg)\b")
+SVG_REFERENCE_REGEX = re.compile(r"#([^\s\"'()#;,]+)")
+SVG_PATH_ARGUMENT_COUNTS = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "A": 7}
+
+# NOTE: Children of these nodes are never drawn directly, so they do not contribute to the bounds
+SVG_NON_RENDERING_TAGS = [
+    SVG_NAMESPACE_PREFIX + "defs",
+    SVG_NAMESPACE_PREFIX + "clipPath",
+    SVG_NAMESPACE_PREFIX + "mask",
+    SVG_NAMESPACE_PREFIX + "marker",
+    SVG_NAMESPACE_PREFIX + "pattern",
+    SVG_NAMESPACE_PREFIX + "symbol",
+    SVG_NAMESPACE_PREFIX + "linearGradient",
+    SVG_NAMESPACE_PREFIX + "radialGradient",
+    SVG_NAMESPACE_PREFIX + "filter",
+    SVG_NAMESPACE_PREFIX + "style",
+    SVG_NAMESPACE_PREFIX + "title",
+    SVG_NAMESPACE_PREFIX + "desc",
+    SVG_NAMESPACE_PREFIX + "metadata",
+]
+SVG_CONTAINER_TAGS = [
+    SVG_NAMESPACE_PREFIX + "g",
+    SVG_NAMESPACE_PREFIX + "a",
+    SVG_NAMESPACE_PREFIX + "switch",
+]
+
+
+def svg_count_references(svg_node: ElementTree.Element) -> dict[str, int]:
+    result = {}
+    for node in svg_node.iter():
+        values = list(node.attrib.values())
+        if node.tag == SVG_NAMESPACE_PREFIX + "style" and node.text != None:
+            values.append(node.text)
+        for value in values:
+            if "#" in value:
+                for referenced_id in SVG_REFERENCE_REGEX.findall(value):
+                    result[referenced_id] = result.get(referenced_id, 0) + 1
+    return result
+
+
+class SvgBoundsContext:
+    nodes_by_id: dict[str, ElementTree.Element]
+    reference_counts: dict[str, int]
+    stylesheet_stroke_width: float
+    stylesheet_miter_limit: float
+    stylesheet_has_unbounded_effects: bool
+    stylesheet_has_paint: bool
+    stylesheet_has_bounding_box_references: bool
+
+    def __init__(self, reference_counts: dict[str, int], stylesheet: str):
+        self.nodes_by_id = {}
+        self.reference_counts = reference_counts
+
+        # NOTE: We do not match CSS selectors against the nodes. Instead every node is assumed to
+        #       get the widest stroke that appears anywhere in the stylesheet. A transform in the
+        #       stylesheet could move any node, so like filters and markers it leaves all bounds
+        #       unknown, as does a stroke width in relative units.
+        self.stylesheet_has_unbounded_effects = (
+            re.search(r"(filter|marker[\w-]*|(?<![\w-])transform)\s*:", stylesheet) != None
+        )
+        self.stylesheet_stroke_width = 0.0
+        for value in re.findall(r"stroke-width\s*:\s*([^;}!]+)", stylesheet):
+            try:
+                self.stylesheet_stroke_width = max(
+                    self.stylesheet_stroke_width, svg_parse_user_length(value)
+                )
+            except ValueError:
+                self.stylesheet_has_unbounded_effects = True
+        self.stylesheet_miter_limit = max(
+            map(float, re.findall(r"stroke-miterlimit\s*:\s*(\d*\.?\d+)", stylesheet)), default=0.0
+        )
+        self.stylesheet_has_paint = re.search(r"(fill|stroke)\s*:", stylesheet) != None
+        self.stylesheet_has_bounding_box_references = (
+            re.search(r"(fill|stroke|mask|clip-path|filter)\s*:\s*url\(", stylesheet) != None
+        )
+
+    # NOTE: Only nodes that are referenced somewhere are kept alive, all other nodes can be freed
+    #       once their top level element is serialized
+    def add_referenced_nodes(self, svg_node: ElementTree.Element):
+        for node in svg_node.iter():
+            node_id = node.get("id")
+            if node_id != None and node_id in self.reference_counts:
+                self.nodes_by_id[node_id] = node
+
+
+def svg_get_style_property(svg_node: ElementTree.Element, name: str):
+    style = svg_node.get("style")
+    if style != None:
+        for declaration in style.split(";"):
+            key, separator, value = declaration.partition(":")
+            if separator != "" and key.strip() == name:
+                return value.strip()
+    return svg_node.get(name)
+
+
+def svg_parse_user_length(value: str) -> float:
+    value = value.strip()
+    for unit, factor in SVG_LENGTH_UNITS_TO_USER.items():
+        if value.endswith(unit):
+            return float(value[: -len(unit)]) * factor
+    # NOTE: This raises a ValueError for relative units which we cannot resolve here
+    return float(value)
+
+
+# NOTE: Returns the transform of the node itself. cairosvg merges the style attribute into the
+#       attributes, so a transform in the style takes precedence. A transform origin is not
+#       supported, so it raises a ValueError like any other transform we do not understand.
+def svg_parse_node_transform(svg_node: ElementTree.Element) -> tuple:
+    value = svg_get_style_property(svg_node, "transform")
+    if value == None or value.strip() in ("", "none"):
+        return (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+    if svg_get_style_property(svg_node, "transform-origin") != None:
+        raise ValueError("Unsupported transform origin")
+    return svg_parse_transform(value)
+
+
+def svg_parse_transform(value: str) -> tuple[float, float, float, float, float, float]:
+    result = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+    position = 0
+    while position < len(value):
+        match = SVG_TRANSFORM_REGEX.match(value, position)
+        if match == None:
+            if value[position:].strip() == "":
+                break
+            raise ValueError("Invalid transform '{}'".format(value))
+        position = match.end()
+        name = match.group(1)
+        # NOTE: CSS transforms give their arguments in px and deg, other units are not resolved
+        args_value = SVG_TRANSFORM_ARGUMENT_UNIT_REGEX.sub("", match.group(2))
+        if re.search(r"[a-df-zA-DF-Z%]", args_value) != None:
+            raise ValueError("Invalid transform '{}'".format(value))
+        args = list(map(float, SVG_NUMBER_REGEX.findall(args_value)))
+        if name == "matrix" and len(args) == 6:
+            matrix = tuple(args)
+        elif name == "translate" and len(args) in (1, 2):
+            matrix = (1.0, 0.0, 0.0, 1.0, args[0], args[1] if len(args) == 2 else 0.0)
+        elif name == "scale" and len(args) in (1, 2):
+            matrix = (args[0], 0.0, 0.0, args[1] if len(args) == 2 else args[0], 0.0, 0.0)
+        elif name == "rotate" and len(args) in (1, 3):
+            cos = math.cos(math.radians(args[0]))
+            sin = math.sin(math.radians(args[0]))
+            matrix = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(args) == 3:
+                matrix = transform_multiply(
+                    transform_multiply((1.0, 0.0, 0.0, 1.0, args[1], args[2]), matrix),
+                    (1.0, 0.0, 0.0, 1.0, -args[1], -args[2]),
+                )
+        elif name == "skewX" and len(args) == 1:
+            matrix = (1.0, 0.0, math.tan(math.radians(args[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and len(args) == 1:
+            matrix = (1.0, math.tan(math.radians(args[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            raise ValueError("Invalid transform '{}'".format(value))
+        result = transform_multiply(result, matrix)
+    return result
+
+
+def transform_multiply(left: tuple, right: tuple) -> tuple:
+    a1, b1, c1, d1, e1, f1 = left
+    a2, b2, c2, d2, e2, f2 = right
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def bounds_union(left: tuple, right: tuple) -> tuple:
+    return (
+        min(left[0], right[0]),
+        min(left[1], right[1]),
+        max(left[2], right[2]),
+        max(left[3], right[3]),
+    )
+
+
+def bounds_from_points(points_x: list[float], points_y: list[float]) -> tuple:
+    if len(points_x) == 0:
+        return BOUNDS_EMPTY
+    return (min(points_x), min(points_y), max(points_x), max(points_y))
+
+
+def bounds_transform(bounds: tuple, transform: tuple, margin: float = 0.0) -> tuple:
+    if bounds == BOUNDS_EMPTY or bounds == BOUNDS_UNKNOWN:
+        return bounds
+    min_x, min_y, max_x, max_y = bounds
+    min_x, min_y, max_x, max_y = min_x - margin, min_y - margin, max_x + margin, max_y + margin
+    a, b, c, d, e, f = transform
+    corners = [(min_x, min_y), (max_x, min_y), (min_x, max_y), (max_x, max_y)]
+    return bounds_from_points(
+        [a * x + c * y + e for x, y in corners],
+        [b * x + d * y + f for x, y in corners],
+    )
+
+
+# NOTE: Yields every command of the path data with its arguments. Repeated commands are yielded
+#       one by one with their implicit command letter.
+def svg_iterate_path_commands(path_data: str):
+    command = None
+    position = 0
+    while True:
+        position = SVG_SEPARATOR_REGEX.match(path_data, position).end()
+        if position >= len(path_data):
+            break
+        if path_data[position].isalpha():
+            command = path_data[position]
+            position += 1
+            if command in "zZ":
+                yield command, []
+                continue
+            if command.upper() not in SVG_PATH_ARGUMENT_COUNTS:
+                raise ValueError("Invalid path command '{}'".format(command))
+        elif command == None or command in "zZ":
+            raise ValueError("Invalid path data '{}'".format(path_data))
+
+        args = []
+        for arg_index in range(SVG_PATH_ARGUMENT_COUNTS[command.upper()]):
+            position = SVG_SEPARATOR_REGEX.match(path_data, position).end()
+            if command in "aA" and arg_index in (3, 4):
+                # NOTE: Arc flags are single digits which may be written without separators
+                if position >= len(path_data) or path_data[position] not in "01":
+                    raise ValueError("Invalid arc flag in path data '{}'".format(path_data))
+                args.append(float(path_data[position]))
+                position += 1
+                continue
+            match = SVG_NUMBER_REGEX.match(path_data, position)
+            if match == None:
+                raise ValueError("Invalid path data '{}'".format(path_data))
+            args.append(float(match.group(0)))
+            position = match.end()
+
+        yield command, args
+        if command in "mM":
+            command = "l" if command == "m" else "L"
+
+
+def svg_path_bounds(path_data: str) -> tuple:
+    # NOTE: Curves always lie within the convex hull of their control points, so including the
+    #       control points gives us conservative bounds without having to solve for the extrema
+    points_x = []
+    points_y = []
+    current_x, current_y = 0.0, 0.0
+    start_x, start_y = 0.0, 0.0
+    for command, args in svg_iterate_path_commands(path_data):
+        if command in "zZ":
+            current_x, current_y = start_x, start_y
+            continue
+
+        offset_x, offset_y = (current_x, current_y) if command.islower() else (0.0, 0.0)
+        upper_command = command.upper()
+        if upper_command == "H":
+            current_x = args[0] + offset_x
+        elif upper_command == "V":
+            current_y = args[0] + offset_y
+        elif upper_command == "A":
+            end_x, end_y = args[5] + offset_x, args[6] + offset_y
+            # NOTE: Radii which are too small get scaled up until the arc spans both endpoints
+            radius_x, radius_y = abs(args[0]), abs(args[1])
+            half_distance = 0.5 * math.hypot(end_x - current_x, end_y - current_y)
+            radius = max(radius_x, radius_y, half_distance)
+            if min(radius_x, radius_y) > 0.0 and half_distance > min(radius_x, radius_y):
+                radius *= half_distance / min(radius_x, radius_y)
+            points_x += [current_x - 2.0 * radius, current_x + 2.0 * radius]
+            points_y += [current_y - 2.0 * radius, current_y + 2.0 * radius]
+            current_x, current_y = end_x, end_y
+        else:
+            for arg_index in range(0, len(args), 2):
+                points_x.append(args[arg_index] + offset_x)
+                points_y.append(args[arg_index + 1] + offset_y)
+            current_x, current_y = points_x[-1], points_y[-1]
+
+        points_x.append(current_x)
+        points_y.append(current_y)
+        if upper_command == "M":
+            start_x, start_y = current_x, current_y
+
+    return bounds_from_points(points_x, points_y)
+
+
+def svg_text_content_length(svg_node: ElementTree.Element) -> int:
+    result = 0
+    for node in svg_node.iter():
+        result += len(node.text or "")
+        if node is not svg_node:
+            result += len(node.tail or "")
+    return result
+
+
+def svg_compute_node_bounds(
+    svg_node: ElementTree.Element,
+    context: SvgBoundsContext,
+    transform: tuple = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0),
+    stroke_width: float = 1.0,
+    miter_limit: float = 4.0,
+    font_size: float = 16.0,
+    depth: int = 0,
+) -> tuple:
+    tag = svg_node.tag
+    if tag in SVG_NON_RENDERING_TAGS:
+        return BOUNDS_EMPTY
+    if not isinstance(tag, str) or depth > 32:
+        return BOUNDS_UNKNOWN
+
+    try:
+        transform = transform_multiply(transform, svg_parse_node_transform(svg_node))
+        if svg_get_style_property(svg_node, "stroke-width") != None:
+            stroke_width = svg_parse_user_length(svg_get_style_property(svg_node, "stroke-width"))
+        if svg_get_style_property(svg_node, "stroke-miterlimit") != None:
+            miter_limit = float(svg_get_style_property(svg_node, "stroke-miterlimit"))
+        if svg_get_style_property(svg_node, "font-size") != None:
+            font_size = svg_parse_user_length(svg_get_style_property(svg_node, "font-size"))
+    except ValueError:
+        return BOUNDS_UNKNOWN
+
+    # NOTE: Filters and markers can paint arbitrarily far outside the geometry of the node
+    for name in ["filter", "marker", "marker-start", "marker-mid", "marker-end"]:
+        value = svg_get_style_property(svg_node, name)
+        if value != None and value != "none":
+            return BOUNDS_UNKNOWN
+
+    # NOTE: A miter join can stick out up to half the stroke width times the miter limit
+    stroke_margin = (
+        0.5
+        * max(stroke_width, context.stylesheet_stroke_width)
+        * max(miter_limit, context.stylesheet_miter_limit, 1.0)
+    )
+
+    def attribute(name: str) -> float:
+        return svg_parse_user_length(svg_node.get(name, "0"))
+
+    try:
+        if tag in SVG_CONTAINER_TAGS:
+            result = BOUNDS_EMPTY
+            for child in svg_node:
+                child_bounds = svg_compute_node_bounds(
+                    child, context, transform, stroke_width, miter_limit, font_size, depth + 1
+                )
+                if child_bounds == BOUNDS_UNKNOWN:
+                    return BOUNDS_UNKNOWN
+                result = bounds_union(result, child_bounds)
+            return result
+
+        if tag == SVG_NAMESPACE_PREFIX + "use":
+            href = svg_node.get(XLINK_HREF_ATTRIBUTE, svg_node.get("href", ""))
+            referenced_node = context.nodes_by_id.get(href.removeprefix("#"))
+            if not href.startswith("#") or referenced_node == None:
+                return BOUNDS_UNKNOWN
+            use_transform = transform_multiply(
+                transform, (1.0, 0.0, 0.0, 1.0, attribute("x"), attribute("y"))
+            )
+            if referenced_node.tag == SVG_NAMESPACE_PREFIX + "symbol":
+                if referenced_node.get("viewBox") != None:
+                    return BOUNDS_UNKNOWN
+                result = BOUNDS_EMPTY
+                for child in referenced_node:
+                    result = bounds_union(
+                        result,
+                        svg_compute_node_bounds(
+                            child,
+                            context,
+                            use_transform,
+                            stroke_width,
+                            miter_limit,
+                            font_size,
+                            depth + 1,
+                        ),
+                    )
+                return result
+            return svg_compute_node_bounds(
+                referenced_node,
+                context,
+                use_transform,
+                stroke_width,
+                miter_limit,
+                font_size,
+                depth + 1,
+            )
+
+        if tag == SVG_NAMESPACE_PREFIX + "path":
+            bounds = svg_path_bounds(svg_node.get("d", ""))
+        elif tag in [SVG_NAMESPACE_PREFIX + "polyline", SVG_NAMESPACE_PREFIX + "polygon"]:
+            coordinates = list(map(float, SVG_NUMBER_REGEX.findall(svg_node.get("points", ""))))
+            bounds = bounds_from_points(coordinates[0:-1:2], coordinates[1::2])
+        elif tag == SVG_NAMESPACE_PREFIX + "line":
+            bounds = bounds_from_points(
+                [attribute("x1"), attribute("x2")], [attribute("y1"), attribute("y2")]
+            )
+        elif tag in [SVG_NAMESPACE_PREFIX + "rect", SVG_NAMESPACE_PREFIX + "image"]:
+            x, y = attribute("x"), attribute("y")
+            bounds = (x, y, x + attribute("width"), y + attribute("height"))
+        elif tag == SVG_NAMESPACE_PREFIX + "circle":
+            cx, cy, r = attribute("cx"), attribute("cy"), attribute("r")
+            bounds = (cx - r, cy - r, cx + r, cy + r)
+        elif tag == SVG_NAMESPACE_PREFIX + "ellipse":
+            cx, cy, rx, ry = attribute("cx"), attribute("cy"), attribute("rx"), attribute("ry")
+            bounds = (cx - rx, cy - ry, cx + rx, cy + ry)
+        elif tag == SVG_NAMESPACE_PREFIX + "text":
+            # NOTE: We do not know the font metrics here, so we assume that no glyph is wider than
+            #       the largest font size. Every glyph then lies within the length of the whole text
+            #       around one of the explicitly given glyph positions, whatever the text anchor is.
+            anchors_x = list(map(float, SVG_NUMBER_REGEX.findall(svg_node.get("x", "0"))))
+            anchors_y = list(map(float, SVG_NUMBER_REGEX.findall(svg_node.get("y", "0"))))
+            offset = 0.0
+            for child in svg_node.iter():
+                if child.tag == SVG_NAMESPACE_PREFIX + "textPath" or (
+                    child is not svg_node and svg_get_style_property(child, "transform") != None
+                ):
+                    return BOUNDS_UNKNOWN
+                if svg_get_style_property(child, "font-size") != None:
+                    font_size = max(
+                        font_size,
+                        svg_parse_user_length(svg_get_style_property(child, "font-size")),
+                    )
+                if child is not svg_node:
+                    anchors_x += map(float, SVG_NUMBER_REGEX.findall(child.get("x", "")))
+                    anchors_y += map(float, SVG_NUMBER_REGEX.findall(child.get("y", "")))
+                for name in ["dx", "dy"]:
+                    offset += sum(
+                        map(abs, map(float, SVG_NUMBER_REGEX.findall(child.get(name, ""))))
+                    )
+            extent = font_size * max(svg_text_content_length(svg_node), 1) + offset
+            min_x, min_y, max_x, max_y = bounds_from_points(anchors_x, anchors_y)
+            bounds = (
+                min_x - extent,
+                min_y - 2.0 * font_size - offset,
+                max_x + extent,
+                max_y + 2.0 * font_size + offset,
+            )
+        else:
+            return BOUNDS_UNKNOWN
+    except (ValueError, AttributeError):
+        return BOUNDS_UNKNOWN
+
+    return bounds_transform(bounds, transform, stroke_margin)
+
+
+def svg_compute_element_bounds(svg_node: ElementTree.Element, context: SvgBoundsContext) -> tuple:
+    if context.stylesheet_has_unbounded_effects:
+        return BOUNDS_UNKNOWN
+    # NOTE: Elements that are referenced from outside of the element must be present on every page
+    reference_counts_inside = None
+    for node in svg_node.iter():
+        node_id = node.get("id")
+        if node_id != None and node_id in context.reference_counts:
+            if reference_counts_inside == None:
+                reference_counts_inside = svg_count_references(svg_node)
+            if reference_counts_inside.get(node_id, 0) < context.reference_counts[node_id]:
+                return BOUNDS_UNKNOWN
+    return svg_compute_node_bounds(svg_node, context)
+
+
+def svg_build_page_element_index(
+    element_bounds: list[tuple],
     dimensions: PageChoppingDimensions,
-    page_index_x: int,
-    page_index_y: int,
-    enable_debug_color: bool = False,
-):
-    svg_tree = copy.deepcopy(svg_tree_readonly)
-    svg_root_node = svg_tree.getroot()
-    clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+) -> dict[tuple[int, int], list[int]]:
+    result = {}
+    for page_index_y in range(dimensions.page_count_y):
+        for page_index_x in range(dimensions.page_count_x):
+            result[(page_index_x, page_index_y)] = []
+
+    for element_index, bounds in enumerate(element_bounds):
+        if bounds == BOUNDS_EMPTY:
+            continue
+        if not all(map(math.isfinite, bounds)):
+            for page_element_indices in result.values():
+                page_element_indices.append(element_index)
+            continue
+        min_x, min_y, max_x, max_y = bounds
+        first_page_index_x = max(0, math.floor(min_x / dimensions.page_inner_width))
+        first_page_index_y = max(0, math.floor(min_y / dimensions.page_inner_height))
+        last_page_index_x = min(
+            dimensions.page_count_x - 1, math.floor(max_x / dimensions.page_inner_width)
+        )
+        last_page_index_y = min(
+            dimensions.page_count_y - 1, math.floor(max_y / dimensions.page_inner_height)
+        )
+        for page_index_y in range(first_page_index_y, last_page_index_y + 1):
+            for page_index_x in range(first_page_index_x, last_page_index_x + 1):
+                result[(page_index_x, page_index_y)].append(element_index)
+
+    return result
+
+
+# NOTE: These are written into the page template in place of the values that differ between
+#       pages. They are cut out of the serialized template and replaced for each page.
+SVG_PAGE_PLACEHOLDER_WIDTH = "__tonitonichoppi_page_width__"
+SVG_PAGE_PLACEHOLDER_HEIGHT = "__tonitonichoppi_page_height__"
+SVG_PAGE_PLACEHOLDER_VIEWBOX = "__tonitonichoppi_page_viewbox__"
+SVG_PAGE_PLACEHOLDER_CLIP_X = "__tonitonichoppi_page_clip_x__"
+SVG_PAGE_PLACEHOLDER_CLIP_Y = "__tonitonichoppi_page_clip_y__"
+SVG_PAGE_PLACEHOLDER_CLIP_WIDTH = "__tonitonichoppi_page_clip_width__"
+SVG_PAGE_PLACEHOLDER_CLIP_HEIGHT = "__tonitonichoppi_page_clip_height__"
+SVG_PAGE_PLACEHOLDER_DEBUG_X = "__tonitonichoppi_page_debug_x__"
+SVG_PAGE_PLACEHOLDER_DEBUG_Y = "__tonitonichoppi_page_debug_y__"
+# NOTE: These are written as comments in place of the elements that come before the clipping group
+#       and of the elements inside of the clipping group
+SVG_PAGE_PLACEHOLDER_HEAD = "__tonitonichoppi_page_head__"
+SVG_PAGE_PLACEHOLDER_ELEMENTS = "__tonitonichoppi_page_elements__"
+
+
+# NOTE: Geometric clipping: Paths, polylines, polygons and rects that span several pages are cut
+#       down to the part that lies within the clipping rect of a page plus the bleed, so that every
+#       page only carries its own share of the geometry. The clipping group stays in place and still
+#       clips exactly at the page edge. The cut edges run along the clipping rect expanded by the
+#       bleed and the reach of the stroke, so neither the stroke of the cut edges nor its joins can
+#       show on the page. Curves that cross the expanded rect are flattened, all others are kept.
+CLIP_BLEED_MM_DEFAULT = 1.0
+CLIP_FLATTEN_TOLERANCE_MM = 0.01
+CLIP_TAGS = [
+    SVG_NAMESPACE_PREFIX + "path",
+    SVG_NAMESPACE_PREFIX + "polyline",
+    SVG_NAMESPACE_PREFIX + "polygon",
+    SVG_NAMESPACE_PREFIX + "rect",
+]
+CLIP_SEGMENT_COMMANDS = {1: "L", 2: "Q", 3: "C"}
+
+
+# NOTE: Subpaths are given as (start point, segments, closed). A segment is the tuple of its points
+#       after the current point, so lines have one point, quadratic curves two and cubic curves three.
+class SvgClipElement:
+    node: ElementTree.Element
+    transform: tuple[float, float, float, float]
+    margin: float
+    tolerance: float
+    subpaths: list[tuple[tuple, list[tuple], bool]]
+
+    def __init__(
+        self,
+        node: ElementTree.Element,
+        transform: tuple[float, float, float, float],
+        margin: float,
+        tolerance: float,
+        subpaths: list[tuple[tuple, list[tuple], bool]],
+    ):
+        self.node = node
+        self.transform = transform
+        self.margin = margin
+        self.tolerance = tolerance
+        self.subpaths = subpaths
+
+    # NOTE: The page template is sent to the render workers, but lxml nodes can not be pickled. So
+    #       the node is sent serialized, its tail separately as it is not part of the document.
+    def __getstate__(self) -> dict:
+        node = svg_copy_node_shallow(self.node)
+        node.tail = None
+        state = dict(self.__dict__)
+        state["node"] = (g_xml_backend.tostring(node), self.node.tail)
+        return state
+
+    def __setstate__(self, state: dict):
+        node_serialized, node_tail = state["node"]
+        self.__dict__.update(state)
+        self.node = g_xml_backend.fromstring(node_serialized)
+        self.node.tail = node_tail
+
+
+def svg_path_parse_subpaths(path_data: str) -> list[tuple[tuple, list[tuple], bool]]:
+    result = []
+    current = (0.0, 0.0)
+    start = (0.0, 0.0)
+    segments = None
+    previous_upper_command = None
+    for command, args in svg_iterate_path_commands(path_data):
+        upper_command = command.upper()
+        if upper_command == "Z":
+            if segments != None:
+                result.append((start, segments, True))
+                segments = None
+            current = start
+            previous_upper_command = upper_command
+            continue
+        if upper_command == "A":
+            raise ValueError("Arcs are not clipped")
+
+        offset_x, offset_y = current if command.islower() else (0.0, 0.0)
+        if upper_command == "M":
+            if segments != None:
+                result.append((start, segments, False))
+            current = (args[0] + offset_x, args[1] + offset_y)
+            start = current
+            segments = []
+            previous_upper_command = upper_command
+            continue
+        if segments == None:
+            # NOTE: Drawing on after a closepath starts a new subpath at the start of the closed one
+            segments = []
+
+        if upper_command == "H":
+            points = [(args[0] + offset_x, current[1])]
+        elif upper_command == "V":
+            points = [(current[0], args[0] + offset_y)]
+        else:
+            points = [
+                (args[arg_index] + offset_x, args[arg_index + 1] + offset_y)
+                for arg_index in range(0, len(args), 2)
+            ]
+        # NOTE: Smooth curves start with the reflection of the previous control point
+        if upper_command in "ST":
+            control = current
+            if (upper_command == "S" and previous_upper_command in ["C", "S"]) or (
+                upper_command == "T" and previous_upper_command in ["Q", "T"]
+            ):
+                control = (
+                    2.0 * current[0] - segments[-1][-2][0],
+                    2.0 * current[1] - segments[-1][-2][1],
+                )
+            points.insert(0, control)
+        segments.append(tuple(points))
+        current = points[-1]
+        previous_upper_command = upper_command
+    if segments != None:
+        result.append((start, segments, False))
+    return result
+
+
+# NOTE: Returns None if the element cannot be clipped. We only clip what we fully understand: no
+#       arcs, rounded corners, dashes, markers or non-scaling strokes and only transforms that keep
+#       the axes, so that the clipping rect stays a rect in the coordinates of the element. Open
+#       subpaths are only clipped if they are either not filled or not stroked, as the fill closes
+#       them but the stroke does not. Gradients, patterns, masks, clip paths and filters are laid
+#       out relative to the bounding box of the element by default, which shrinks when the element
+#       is cut down, so elements that reference any of them are not clipped either.
+def svg_create_clip_element(
+    svg_node: ElementTree.Element, context: SvgBoundsContext, tolerance: float
+) -> SvgClipElement:
+    for name in [
+        "marker",
+        "marker-start",
+        "marker-mid",
+        "marker-end",
+        "stroke-dasharray",
+        "vector-effect",
+        "mask",
+        "clip-path",
+        "filter",
+    ]:
+        value = svg_get_style_property(svg_node, name)
+        if value != None and value != "none":
+            return None
+    for name in ["fill", "stroke"]:
+        value = svg_get_style_property(svg_node, name)
+        if value != None and value.startswith("url("):
+            return None
+    if context.stylesheet_has_bounding_box_references:
+        return None
+
+    try:
+        transform = svg_parse_node_transform(svg_node)
+        stroke_width = 1.0
+        if svg_get_style_property(svg_node, "stroke-width") != None:
+            stroke_width = svg_parse_user_length(svg_get_style_property(svg_node, "stroke-width"))
+        miter_limit = 4.0
+        if svg_get_style_property(svg_node, "stroke-miterlimit") != None:
+            miter_limit = float(svg_get_style_property(svg_node, "stroke-miterlimit"))
+
+        if svg_node.tag == SVG_NAMESPACE_PREFIX + "rect":
+            if svg_node.get("rx") != None or svg_node.get("ry") != None:
+                return None
+            x = svg_parse_user_length(svg_node.get("x", "0"))
+            y = svg_parse_user_length(svg_node.get("y", "0"))
+            width = svg_parse_user_length(svg_node.get("width", "0"))
+            height = svg_parse_user_length(svg_node.get("height", "0"))
+            subpaths = [
+                ((x, y), [((x + width, y),), ((x + width, y + height),), ((x, y + height),)], True)
+            ]
+        elif svg_node.tag == SVG_NAMESPACE_PREFIX + "path":
+            subpaths = svg_path_parse_subpaths(svg_node.get("d", ""))
+        else:
+            coordinates = list(map(float, SVG_NUMBER_REGEX.findall(svg_node.get("points", ""))))
+            points = list(zip(coordinates[0:-1:2], coordinates[1::2]))
+            subpaths = []
+            if len(points) > 0:
+                subpaths.append(
+                    (
+                        points[0],
+                        [(point,) for point in points[1:]],
+                        svg_node.tag == SVG_NAMESPACE_PREFIX + "polygon",
+                    )
+                )
+    except ValueError:
+        return None
+
+    a, b, c, d, e, f = transform
+    if b != 0.0 or c != 0.0 or a == 0.0 or d == 0.0:
+        return None
+
+    if not all(closed for _, _, closed in subpaths):
+        if context.stylesheet_has_paint:
+            return None
+        if svg_get_style_property(svg_node, "fill") != "none":
+            if svg_get_style_property(svg_node, "stroke") != "none":
+                return None
+            subpaths = [(start, segments, True) for start, segments, _ in subpaths]
+
+    # NOTE: Like in the bounds, a miter join can stick out up to half the stroke width times the
+    #       miter limit. A miter limit of at least two also covers square line caps.
+    margin = (
+        0.5
+        * max(stroke_width, context.stylesheet_stroke_width)
+        * max(miter_limit, context.stylesheet_miter_limit, 2.0)
+    )
+    return SvgClipElement(svg_node, (a, d, e, f), margin, tolerance / min(abs(a), abs(d)), subpaths)
+
+
+def clip_flatten_curve(start: tuple, segment: tuple, tolerance: float) -> list[tuple]:
+    points = (start,) + segment
+    # NOTE: Wang's formula gives the number of lines that stay within the tolerance of the curve
+    degree = len(points) - 1
+    max_second_difference = max(
+        math.hypot(
+            points[index][0] - 2.0 * points[index + 1][0] + points[index + 2][0],
+            points[index][1] - 2.0 * points[index + 1][1] + points[index + 2][1],
+        )
+        for index in range(degree - 1)
+    )
+    line_count = max(
+        1,
+        math.ceil(math.sqrt(degree * (degree - 1) / 8.0 * max_second_difference / tolerance)),
+    )
+    result = []
+    for line_index in range(1, line_count):
+        t = line_index / line_count
+        if degree == 2:
+            weights = [(1.0 - t) ** 2, 2.0 * t * (1.0 - t), t**2]
+        else:
+            weights = [(1.0 - t) ** 3, 3.0 * t * (1.0 - t) ** 2, 3.0 * t**2 * (1.0 - t), t**3]
+        result.append(
+            (
+                (
+                    sum(weight * point[0] for weight, point in zip(weights, points)),
+                    sum(weight * point[1] for weight, point in zip(weights, points)),
+                ),
+            )
+        )
+    result.append((segment[-1],))
+    return result
+
+
+# NOTE: Curves that lie within the clipping bounds are kept. Curves that lie completely outside are
+#       replaced by a line to their end point, which only changes the shape within the convex hull of
+#       the curve and so outside of the bounds. The remaining curves are flattened.
+def clip_prepare_segments(
+    start: tuple, segments: list[tuple], clip_bounds: tuple, tolerance: float
+) -> list[tuple]:
+    min_x, min_y, max_x, max_y = clip_bounds
+    result = []
+    current = start
+    for segment in segments:
+        if len(segment) == 1:
+            result.append(segment)
+        else:
+            points = (current,) + segment
+            bounds = bounds_from_points(
+                [point[0] for point in points], [point[1] for point in points]
+            )
+            if (
+                min_x <= bounds[0]
+                and min_y <= bounds[1]
+                and bounds[2] <= max_x
+                and bounds[3] <= max_y
+            ):
+                result.append(segment)
+            elif bounds[2] < min_x or bounds[3] < min_y or max_x < bounds[0] or max_y < bounds[1]:
+                result.append((segment[-1],))
+            else:
+                result += clip_flatten_curve(current, segment, tolerance)
+        current = segment[-1]
+    return result
+
+
+# NOTE: One Sutherland-Hodgman step against the half plane where the coordinate on the given axis is
+#       on the side of the bound given by the sign. Parts that lie outside are replaced by a line
+#       along the bound, which is outside of the page. This keeps the winding of every point inside,
+#       so the fill rule still works. Curves are always inside, see clip_prepare_segments.
+def clip_half_plane(
+    start: tuple, segments: list[tuple], axis: int, bound: float, sign: float
+) -> tuple[tuple, list[tuple]]:
+    def is_inside(point: tuple) -> bool:
+        return sign * (point[axis] - bound) >= 0.0
+
+    def intersect(point_from: tuple, point_to: tuple) -> tuple:
+        t = (bound - point_from[axis]) / (point_to[axis] - point_from[axis])
+        result = [
+            point_from[0] + t * (point_to[0] - point_from[0]),
+            point_from[1] + t * (point_to[1] - point_from[1]),
+        ]
+        result[axis] = bound
+        return tuple(result)
+
+    result_start = None
+    result_segments = []
+
+    def add_point(point: tuple):
+        nonlocal result_start
+        if result_start == None:
+            result_start = point
+        else:
+            result_segments.append((point,))
+
+    previous = start
+    previous_is_inside = is_inside(start)
+    if previous_is_inside:
+        add_point(start)
+    for segment in segments:
+        end = segment[-1]
+        end_is_inside = is_inside(end)
+        if len(segment) > 1:
+            result_segments.append(segment)
+        elif previous_is_inside and end_is_inside:
+            add_point(end)
+        elif previous_is_inside:
+            add_point(intersect(previous, end))
+        elif end_is_inside:
+            add_point(intersect(previous, end))
+            add_point(end)
+        previous = end
+        previous_is_inside = end_is_inside
+    return result_start, result_segments
 
+
+def svg_clip_element(
+    clip_element: SvgClipElement, clip_rect: Rect, bleed: float, number_precision: int
+) -> bytes:
+    def format_number(value: float) -> str:
+        return svg_format_number(value, number_precision)
+
+    # NOTE: The clipping rect is moved into the coordinates of the element
+    a, d, e, f = clip_element.transform
+    corner_x = sorted(
+        [(clip_rect.x - bleed - e) / a, (clip_rect.x + clip_rect.width + bleed - e) / a]
+    )
+    corner_y = sorted(
+        [(clip_rect.y - bleed - f) / d, (clip_rect.y + clip_rect.height + bleed - f) / d]
+    )
+    clip_bounds = (
+        corner_x[0] - clip_element.margin,
+        corner_y[0] - clip_element.margin,
+        corner_x[1] + clip_element.margin,
+        corner_y[1] + clip_element.margin,
+    )
+
+    subpaths = []
+    for start, segments, closed in clip_element.subpaths:
+        segments = clip_prepare_segments(start, segments, clip_bounds, clip_element.tolerance)
+        for axis, bound, sign in [
+            (0, clip_bounds[0], 1.0),
+            (1, clip_bounds[1], 1.0),
+            (0, clip_bounds[2], -1.0),
+            (1, clip_bounds[3], -1.0),
+        ]:
+            # NOTE: The closing line of a closed subpath has to be clipped as well
+            if closed and len(segments) > 0 and segments[-1][-1] != start:
+                segments.append((start,))
+            start, segments = clip_half_plane(start, segments, axis, bound, sign)
+            if start == None:
+                break
+        if start != None and len(segments) > 0:
+            subpaths.append((start, segments, closed))
+
+    result = svg_copy_node_shallow(clip_element.node)
+    if result.tag == SVG_NAMESPACE_PREFIX + "rect":
+        if len(subpaths) == 0:
+            result.set("width", "0")
+            result.set("height", "0")
+        else:
+            points = [subpaths[0][0]] + [segment[-1] for segment in subpaths[0][1]]
+            min_x, min_y, max_x, max_y = bounds_from_points(
+                [point[0] for point in points], [point[1] for point in points]
+            )
+            result.set("x", format_number(min_x))
+            result.set("y", format_number(min_y))
+            result.set("width", format_number(max_x - min_x))
+            result.set("height", format_number(max_y - min_y))
+    elif result.tag == SVG_NAMESPACE_PREFIX + "path":
+        path_data = []
+        for start, segments, closed in subpaths:
+            path_data.append("M{} {}".format(format_number(start[0]), format_number(start[1])))
+            previous_command = None
+            for segment in segments:
+                command = CLIP_SEGMENT_COMMANDS[len(segment)]
+                coordinates = " ".join(
+                    "{} {}".format(format_number(point[0]), format_number(point[1]))
+                    for point in segment
+                )
+                # NOTE: Repeated commands can leave out their command letter
+                if command == previous_command:
+                    path_data.append(" " + coordinates)
+                else:
+                    path_data.append(command + coordinates)
+                previous_command = command
+            if closed:
+                path_data.append("Z")
+        result.set("d", "".join(path_data))
+    else:
+        points = []
+        for start, segments, closed in subpaths:
+            points = [start] + [segment[-1] for segment in segments]
+            # NOTE: A polygon closes itself, so the closing line added by the clipping is left out
+            if closed and len(points) > 1 and points[-1] == start:
+                points.pop()
+        result.set(
+            "points",
+            " ".join(
+                "{},{}".format(format_number(point[0]), format_number(point[1])) for point in points
+            ),
+        )
+    return svg_serialize_root_child(result)
+
+
+# NOTE: The serialized elements of a page template are spilled into a temporary file and read back
+#       by their offsets, so that the memory of a template is bounded by its largest element instead
+#       of the whole image. Forked and unpickled copies in the worker processes open the file on
+#       their own, only the process that created the file deletes it.
+class SvgElementStore:
+    filepath: str
+    offsets: list[int]
+    sizes: list[int]
+    end_offset: int
+    owner_pid: int
+    file: io.BufferedRandom
+    file_pid: int
+    file_lock: threading.Lock
+
+    def __init__(self):
+        file_descriptor, self.filepath = tempfile.mkstemp(prefix="tonitonichoppi_", suffix=".svg")
+        self.offsets = []
+        self.sizes = []
+        self.end_offset = 0
+        self.owner_pid = os.getpid()
+        self.file = os.fdopen(file_descriptor, "w+b")
+        self.file_pid = self.owner_pid
+        self.file_lock = threading.Lock()
+        weakref.finalize(
+            self, svg_element_store_remove_file, self.file, self.filepath, self.owner_pid
+        )
+
+    def __getstate__(self) -> dict:
+        self.flush()
+        state = dict(vars(self))
+        state["file"] = None
+        state["file_pid"] = None
+        state["file_lock"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        vars(self).update(state)
+        self.file_lock = threading.Lock()
+
+    def get_file(self) -> io.IOBase:
+        if self.file_pid != os.getpid():
+            self.file = open(self.filepath, "rb")
+            self.file_pid = os.getpid()
+        return self.file
+
+    def append(self, element: bytes):
+        with self.file_lock:
+            file = self.get_file()
+            file.seek(self.end_offset)
+            file.write(element)
+        self.offsets.append(self.end_offset)
+        self.sizes.append(len(element))
+        self.end_offset += len(element)
+
+    # NOTE: Has to be called before worker processes are forked, so that they can read everything
+    def flush(self):
+        if self.file_pid == os.getpid():
+            with self.file_lock:
+                self.file.flush()
+
+    def get_size(self, index: int) -> int:
+        return self.sizes[index]
+
+    def get_total_size(self) -> int:
+        return self.end_offset
+
+    def __getitem__(self, index: int) -> bytes:
+        with self.file_lock:
+            file = self.get_file()
+            file.seek(self.offsets[index])
+            return file.read(self.sizes[index])
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def svg_element_store_remove_file(file: io.IOBase, filepath: str, owner_pid: int):
+    if os.getpid() != owner_pid:
+        return
+    file.close()
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+
+class SvgPageTemplate:
+    parts: list[bytes]
+    elements: SvgElementStore
+    element_bounds: list[tuple]
+    page_element_indices: dict[tuple[int, int], list[int]]
+    enable_debug_color: bool
+    overview_parts: list
+    blank_page_indices: set[tuple[int, int]]
+    blank_page: bytes
+    clip_elements: dict[int, SvgClipElement]
+    clip_bleed: float
+    number_precision: int
+    has_visible_head_node: bool
+    content_element_count: int
+
+    def __init__(
+        self,
+        parts: list[bytes],
+        elements: SvgElementStore,
+        element_bounds: list[tuple],
+        page_element_indices: dict[tuple[int, int], list[int]],
+        enable_debug_color: bool,
+        overview_parts: list,
+        blank_page_indices: set[tuple[int, int]],
+        blank_page: bytes,
+        clip_elements: dict[int, SvgClipElement],
+        clip_bleed: float,
+        number_precision: int,
+        has_visible_head_node: bool,
+        content_element_count: int,
+    ):
+        self.parts = parts
+        self.elements = elements
+        self.element_bounds = element_bounds
+        self.page_element_indices = page_element_indices
+        self.enable_debug_color = enable_debug_color
+        self.overview_parts = overview_parts
+        self.blank_page_indices = blank_page_indices
+        self.blank_page = blank_page
+        self.clip_elements = clip_elements
+        self.clip_bleed = clip_bleed
+        self.number_precision = number_precision
+        self.has_visible_head_node = has_visible_head_node
+        self.content_element_count = content_element_count
+
+
+# NOTE: What to do with pages that show nothing but the grid and the markers
+BLANK_PAGES_KEEP = "keep"
+BLANK_PAGES_SKIP = "skip"
+BLANK_PAGES_SHARED = "shared"
+BLANK_PAGES_MODES = [BLANK_PAGES_KEEP, BLANK_PAGES_SKIP, BLANK_PAGES_SHARED]
+
+
+# NOTE: A page is blank if all elements that intersect its clipping rect belong to the grid or the
+#       markers. Elements in front of the clipping group are drawn on every page, so if any of them
+#       is visible no page is blank.
+def svg_find_blank_pages(
+    page_element_indices: dict[tuple[int, int], list[int]],
+    content_element_count: int,
+) -> set[tuple[int, int]]:
+    result = set()
+    for page_index, element_indices in page_element_indices.items():
+        if all(element_index >= content_element_count for element_index in element_indices):
+            result.add(page_index)
+    return result
+
+
+def svg_create_blank_page(dimensions: PageChoppingDimensions, number_precision: int) -> bytes:
+    svg_root_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "svg")
     svg_root_node.set("x", "0mm")
     svg_root_node.set("y", "0mm")
-    svg_root_node.set("width", str(dimensions.page_outer_width / FACTOR_MM_TO_PX) + "mm")
-    svg_root_node.set("height", str(dimensions.page_outer_height / FACTOR_MM_TO_PX) + "mm")
+    svg_root_node.set(
+        "width",
+        svg_format_number(dimensions.page_outer_width / FACTOR_MM_TO_PX, number_precision) + "mm",
+    )
+    svg_root_node.set(
+        "height",
+        svg_format_number(dimensions.page_outer_height / FACTOR_MM_TO_PX, number_precision) + "mm",
+    )
     svg_root_node.set(
         "viewBox",
-        "{} {} {} {}".format(
-            clip_rect.x - dimensions.page_border,
-            clip_rect.y - dimensions.page_border,
-            dimensions.page_outer_width,
-            dimensions.page_outer_height,
+        "0 0 {} {}".format(
+            svg_format_number(dimensions.page_outer_width, number_precision),
+            svg_format_number(dimensions.page_outer_height, number_precision),
         ),
     )
+    return g_xml_backend.tostring(svg_root_node)
+
+
+def svg_draw_blank_page_labels(
+    svg_node: ElementTree.Element,
+    dimensions: PageChoppingDimensions,
+    blank_page_indices: set[tuple[int, int]],
+    number_precision: int,
+):
+    for page_index_x, page_index_y in sorted(blank_page_indices):
+        clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+        label = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "text")
+        label.set("x", svg_format_number(clip_rect.x + 0.5 * clip_rect.width, number_precision))
+        label.set("y", svg_format_number(clip_rect.y + 0.5 * clip_rect.height, number_precision))
+        label.set("font-family", "sans-serif")
+        label.set("font-size", "20")
+        label.set("dominant-baseline", "middle")
+        label.set("text-anchor", "middle")
+        label.set("fill", "#000")
+        label.set("opacity", "0.3")
+        label.text = "blank"
+        svg_node.append(label)
+
+
+def svg_copy_node_shallow(svg_node: ElementTree.Element) -> ElementTree.Element:
+    return g_xml_backend.copy_node_shallow(svg_node)
+
+
+# NOTE: Yields the root node on its start tag with a child of None. Afterwards yields every child of
+#       the root node once it is parsed completely and then removes it from the root, so that the
+#       top level elements can be freed one after another.
+def svg_iterparse_root_children(image_source):
+    svg_root_node = None
+    depth = 0
+    for event, node in g_xml_backend.iterparse(image_source, ("start", "end")):
+        if event == "start":
+            if depth == 0:
+                svg_root_node = node
+                yield svg_root_node, None
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                yield svg_root_node, node
+                svg_root_node.remove(node)
+
+
+def svg_scan_references_and_stylesheet(image_source) -> tuple[dict[str, int], str]:
+    reference_counts = {}
+    stylesheet = ""
+    for svg_root_node, child in svg_iterparse_root_children(image_source):
+        if child == None:
+            # NOTE: The parser works in chunks, so the root might already have children here
+            node = g_xml_backend.create_element(svg_root_node.tag, svg_root_node.attrib)
+        else:
+            node = child
+            for style_node in child.iter(SVG_NAMESPACE_PREFIX + "style"):
+                if style_node.text != None:
+                    stylesheet += style_node.text
+        for referenced_id, count in svg_count_references(node).items():
+            reference_counts[referenced_id] = reference_counts.get(referenced_id, 0) + count
+    return reference_counts, stylesheet
+
+
+# NOTE: The root nodes of the pages and the overview declare these namespaces, so the children do
+#       not need to repeat them
+SVG_DEFAULT_NAMESPACE_DECLARATION = b' xmlns="http://www.w3.org/2000/svg"'
+SVG_ROOT_NAMESPACE_DECLARATIONS = [
+    SVG_DEFAULT_NAMESPACE_DECLARATION,
+    b' xmlns:xlink="http://www.w3.org/1999/xlink"',
+]
+SVG_NAMESPACE_DECLARATION_PATTERN = re.compile(rb' xmlns:([\w.-]+)="[^"]*"')
+
+
+# NOTE: Adds the namespace declarations the children of a serialized root node rely on
+def svg_declare_root_namespaces(svg_root_serialized: bytes) -> bytes:
+    start_tag_end = svg_root_serialized.find(b">")
+    start_tag = svg_root_serialized[:start_tag_end]
+    assert SVG_DEFAULT_NAMESPACE_DECLARATION in start_tag
+    for declaration in SVG_ROOT_NAMESPACE_DECLARATIONS:
+        if declaration not in start_tag:
+            start_tag = start_tag.replace(
+                SVG_DEFAULT_NAMESPACE_DECLARATION,
+                SVG_DEFAULT_NAMESPACE_DECLARATION + declaration,
+                1,
+            )
+    return start_tag + svg_root_serialized[start_tag_end:]
+
+
+# NOTE: Serializes a child of the root node. lxml declares every namespace of the original root node
+#       on each child, so the declarations of prefixes the child does not use are dropped as well.
+def svg_serialize_root_child(svg_node: ElementTree.Element) -> bytes:
+    result = g_xml_backend.tostring(svg_node)
+    start_tag_end = result.find(b">")
+    start_tag = result[:start_tag_end]
+    for declaration in SVG_ROOT_NAMESPACE_DECLARATIONS:
+        start_tag = start_tag.replace(declaration, b"", 1)
+    result = start_tag + result[start_tag_end:]
+    declarations = list(SVG_NAMESPACE_DECLARATION_PATTERN.finditer(start_tag))
+    if len(declarations) > 0:
+        result_without_declarations = SVG_NAMESPACE_DECLARATION_PATTERN.sub(b"", result)
+        for declaration in declarations:
+            if declaration.group(1) + b":" not in result_without_declarations:
+                result = result.replace(declaration.group(0), b"", 1)
+    return result
+
+
+# NOTE: Serializes the start and end tag of a node around the given placeholder comment
+def svg_serialize_node_around_placeholder(
+    svg_node: ElementTree.Element, placeholder: str
+) -> tuple[bytes, bytes]:
+    svg_node.append(g_xml_backend.create_comment(placeholder))
+    start_tag, separator, end_tag = g_xml_backend.tostring(svg_node).partition(
+        "<!--{}-->".format(placeholder).encode()
+    )
+    assert separator != b""
+    return svg_declare_root_namespaces(start_tag), end_tag
+
+
+# NOTE: The input is streamed with iterparse instead of being parsed into one tree. Every top level
+#       element is serialized on its own, spilled into the element store of the template and freed
+#       right away, so the memory is bounded by the head elements plus the largest top level element.
+#       This needs two passes over the input, as the culling needs to know all references and styles
+#       upfront.
+def svg_create_page_template(
+    image_source,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    enable_debug_color: bool = False,
+    enable_culling: bool = True,
+    blank_pages: str = BLANK_PAGES_KEEP,
+    clip_bleed_mm: float = None,
+    number_precision: int = SVG_NUMBER_PRECISION_DEFAULT,
+) -> tuple[PageChoppingDimensions, SvgPageTemplate]:
+    if enable_culling:
+        with trace_span("scan_references"):
+            bounds_context = SvgBoundsContext(*svg_scan_references_and_stylesheet(image_source))
+        if hasattr(image_source, "seek"):
+            image_source.seek(0)
 
-    clip_rect_node = ElementTree.Element(SVG_NAMESPACE_PREFIX + "rect")
-    clip_rect_node.set("x", str(clip_rect.x))
-    clip_rect_node.set("y", str(clip_rect.y))
-    clip_rect_node.set("width", str(clip_rect.width))
-    clip_rect_node.set("height", str(clip_rect.height))
+    clip_rect_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "rect")
+    clip_rect_node.set("x", SVG_PAGE_PLACEHOLDER_CLIP_X)
+    clip_rect_node.set("y", SVG_PAGE_PLACEHOLDER_CLIP_Y)
+    clip_rect_node.set("width", SVG_PAGE_PLACEHOLDER_CLIP_WIDTH)
+    clip_rect_node.set("height", SVG_PAGE_PLACEHOLDER_CLIP_HEIGHT)
     clip_rect_node.set("stroke_width", "0")
     clip_rect_node.set("fill", "#000")
 
-    clip_path_node_page = ElementTree.Element(SVG_NAMESPACE_PREFIX + "clipPath")
+    clip_path_node_page = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "clipPath")
     clip_path_node_page.set("id", "page_clipping_rect")
     clip_path_node_page.append(clip_rect_node)
 
-    defs_node = svg_root_node.find("svg:defs", SVG_NAMESPACE)
-    if defs_node == None:
-        defs_node = ElementTree.Element(SVG_NAMESPACE_PREFIX + "defs")
-        svg_root_node.append(defs_node)
-    defs_node.append(clip_path_node_page)
-
     tags_to_reparent = [
         SVG_NAMESPACE_PREFIX + "text",
         SVG_NAMESPACE_PREFIX + "ellipse",
         SVG_NAMESPACE_PREFIX + "image",
         SVG_NAMESPACE_PREFIX + "line",
-        SVG_NAMESPACE_PREFIX + "polyon",
+        SVG_NAMESPACE_PREFIX + "polygon",
         SVG_NAMESPACE_PREFIX + "polyline",
         SVG_NAMESPACE_PREFIX + "rect",
         SVG_NAMESPACE_PREFIX + "circle",
         SVG_NAMESPACE_PREFIX + "g",
         SVG_NAMESPACE_PREFIX + "path",
     ]
-    elements_to_reparent = []
-    for child in svg_root_node:
-        if child.tag in tags_to_reparent:
-            elements_to_reparent.append(child)
 
-    clipping_group_node = ElementTree.Element(SVG_NAMESPACE_PREFIX + "g")
+    # NOTE: The elements that are not reparented stay in front of the clipping group in the page
+    #       template. The overview contains all elements in their original order.
+    head_nodes = []
+    elements = SvgElementStore()
+    element_bounds = []
+    overview_nodes = []
+    has_defs_node = False
+    has_visible_head_node = False
+    clip_elements = {}
+    clip_bleed = 0.0
+    clip_tolerance = 0.0
+
+    # NOTE: Returns the serialized node, or the index of the element for reparented elements
+    def add_node(svg_node: ElementTree.Element):
+        nonlocal has_defs_node
+        nonlocal has_visible_head_node
+        node_serialized = svg_serialize_root_child(svg_node)
+        if enable_culling:
+            bounds_context.add_referenced_nodes(svg_node)
+        if svg_node.tag == SVG_NAMESPACE_PREFIX + "defs" and not has_defs_node:
+            has_defs_node = True
+            # NOTE: The node is freed after this anyway, so the clipping path is added to it
+            #       temporarily instead of copying it with all its definitions
+            svg_node.append(clip_path_node_page)
+            head_nodes.append(svg_serialize_root_child(svg_node))
+            svg_node.remove(clip_path_node_page)
+        elif svg_node.tag in tags_to_reparent:
+            elements.append(node_serialized)
+            if enable_culling:
+                element_bounds.append(svg_compute_element_bounds(svg_node, bounds_context))
+            else:
+                element_bounds.append(BOUNDS_UNKNOWN)
+            # NOTE: Only elements that span more than one page can get smaller by clipping
+            bounds = element_bounds[-1]
+            if (
+                clip_bleed_mm != None
+                and svg_node.tag in CLIP_TAGS
+                and all(map(math.isfinite, bounds))
+                and (
+                    math.floor(bounds[0] / dimensions.page_inner_width)
+                    != math.floor(bounds[2] / dimensions.page_inner_width)
+                    or math.floor(bounds[1] / dimensions.page_inner_height)
+                    != math.floor(bounds[3] / dimensions.page_inner_height)
+                )
+            ):
+                clip_element = svg_create_clip_element(svg_node, bounds_context, clip_tolerance)
+                if clip_element != None:
+                    clip_elements[len(elements) - 1] = clip_element
+            return len(elements) - 1
+        else:
+            head_nodes.append(node_serialized)
+            if (
+                svg_node.tag.startswith(SVG_NAMESPACE_PREFIX)
+                and svg_node.tag not in SVG_NON_RENDERING_TAGS
+            ):
+                has_visible_head_node = True
+        return node_serialized
+
+    for svg_root_node_readonly, child in svg_iterparse_root_children(image_source):
+        if child == None:
+            image_width, image_height, image_unit = svg_validate_and_get_image_dimensions_and_unit(
+                svg_root_node_readonly
+            )
+            dimensions = PageChoppingDimensions(
+                image_width,
+                image_height,
+                image_unit,
+                page_inner_width_mm,
+                page_inner_height_mm,
+                page_border_mm,
+            )
+            if clip_bleed_mm != None:
+                conversion_factor = FACTOR_MM_TO_PX if image_unit == "px" else 1.0
+                clip_bleed = conversion_factor * clip_bleed_mm
+                clip_tolerance = conversion_factor * CLIP_FLATTEN_TOLERANCE_MM
+            svg_root_node_overview = g_xml_backend.create_element(
+                svg_root_node_readonly.tag, svg_root_node_readonly.attrib
+            )
+            svg_root_node = g_xml_backend.create_element(
+                svg_root_node_readonly.tag, svg_root_node_readonly.attrib
+            )
+        else:
+            overview_nodes.append(add_node(child))
+
+    svg_grid_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
+    svg_draw_grid_and_markers(svg_grid_node, dimensions, 1.0, False, number_precision)
+    if enable_culling:
+        # NOTE: The markers reference their diamonds, which the first pass could not know about
+        for referenced_id, count in svg_count_references(svg_grid_node).items():
+            bounds_context.reference_counts[referenced_id] = (
+                bounds_context.reference_counts.get(referenced_id, 0) + count
+            )
+    content_element_count = len(elements)
+    for child in svg_grid_node:
+        add_node(child)
+    page_element_indices = svg_build_page_element_index(element_bounds, dimensions)
+
+    blank_page_indices = set()
+    blank_page = None
+    if blank_pages != BLANK_PAGES_KEEP and enable_culling and not has_visible_head_node:
+        blank_page_indices = svg_find_blank_pages(page_element_indices, content_element_count)
+        if blank_pages == BLANK_PAGES_SHARED:
+            blank_page = svg_create_blank_page(dimensions, number_precision)
+
+    # NOTE: The overview gets a thinner grid than the pages
+    svg_grid_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
+    svg_draw_grid_and_markers(svg_grid_node, dimensions, 1.0, True, number_precision)
+    svg_draw_blank_page_labels(svg_grid_node, dimensions, blank_page_indices, number_precision)
+    overview_nodes += [svg_serialize_root_child(child) for child in svg_grid_node]
+
+    if not has_defs_node:
+        defs_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "defs")
+        defs_node.append(clip_path_node_page)
+        head_nodes.append(svg_serialize_root_child(defs_node))
+
+    overview_start_tag, overview_end_tag = svg_serialize_node_around_placeholder(
+        svg_root_node_overview, SVG_PAGE_PLACEHOLDER_ELEMENTS
+    )
+    # NOTE: The overview refers to the reparented elements by their indices
+    overview_parts = [overview_start_tag] + overview_nodes + [overview_end_tag]
+    elements.flush()
+
+    # NOTE: The size attributes are removed first so that their placeholders are always serialized
+    #       in the order listed below, regardless of the attribute order of the original image
+    for attribute in ["width", "height", "viewBox"]:
+        svg_root_node.attrib.pop(attribute, None)
+    svg_root_node.set("x", "0mm")
+    svg_root_node.set("y", "0mm")
+    svg_root_node.set("width", SVG_PAGE_PLACEHOLDER_WIDTH)
+    svg_root_node.set("height", SVG_PAGE_PLACEHOLDER_HEIGHT)
+    svg_root_node.set("viewBox", SVG_PAGE_PLACEHOLDER_VIEWBOX)
+    svg_root_node.append(g_xml_backend.create_comment(SVG_PAGE_PLACEHOLDER_HEAD))
+
+    # NOTE: The reparented elements are serialized separately so that each page only needs to
+    #       receive the elements which intersect its clipping rect
+    clipping_group_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
     clipping_group_node.set("clip-path", "url(#page_clipping_rect)")
+    clipping_group_node.append(g_xml_backend.create_comment(SVG_PAGE_PLACEHOLDER_ELEMENTS))
     svg_root_node.append(clipping_group_node)
 
-    for element in elements_to_reparent:
-        svg_root_node.remove(element)
-        clipping_group_node.append(element)
+    placeholders = [
+        SVG_PAGE_PLACEHOLDER_WIDTH,
+        SVG_PAGE_PLACEHOLDER_HEIGHT,
+        SVG_PAGE_PLACEHOLDER_VIEWBOX,
+        SVG_PAGE_PLACEHOLDER_CLIP_X,
+        SVG_PAGE_PLACEHOLDER_CLIP_Y,
+        SVG_PAGE_PLACEHOLDER_CLIP_WIDTH,
+        SVG_PAGE_PLACEHOLDER_CLIP_HEIGHT,
+        "<!--{}-->".format(SVG_PAGE_PLACEHOLDER_ELEMENTS),
+    ]
 
     ###
     if enable_debug_color:
-        back_rect = ElementTree.Element(SVG_NAMESPACE_PREFIX + "rect")
-        back_rect.set("x", str(clip_rect.x - dimensions.page_border))
-        back_rect.set("y", str(clip_rect.y - dimensions.page_border))
-        back_rect.set("width", str(dimensions.page_outer_width))
-        back_rect.set("height", str(dimensions.page_outer_height))
+        back_rect = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "rect")
+        back_rect.set("x", SVG_PAGE_PLACEHOLDER_DEBUG_X)
+        back_rect.set("y", SVG_PAGE_PLACEHOLDER_DEBUG_Y)
+        back_rect.set("width", svg_format_number(dimensions.page_outer_width, number_precision))
+        back_rect.set("height", svg_format_number(dimensions.page_outer_height, number_precision))
         back_rect.set("stroke_width", "0")
         back_rect.set("fill", "#ff00ff")
         back_rect.set("opacity", "0.2")
         svg_root_node.append(back_rect)
+        placeholders += [SVG_PAGE_PLACEHOLDER_DEBUG_X, SVG_PAGE_PLACEHOLDER_DEBUG_Y]
     ###
 
-    return svg_tree
+    # NOTE: The placeholders appear in the same order in the serialized template as they were
+    #       listed above, so we can cut the template into parts front to back. The head elements
+    #       contain the clipping rect, so they are put in place first.
+    template_rest = svg_declare_root_namespaces(g_xml_backend.tostring(svg_root_node)).replace(
+        "<!--{}-->".format(SVG_PAGE_PLACEHOLDER_HEAD).encode(), b"".join(head_nodes)
+    )
+    parts = []
+    for placeholder in placeholders:
+        part, separator, template_rest = template_rest.partition(placeholder.encode())
+        assert separator != b""
+        parts.append(part)
+    parts.append(template_rest)
 
+    page_template = SvgPageTemplate(
+        parts,
+        elements,
+        element_bounds,
+        page_element_indices,
+        enable_debug_color,
+        overview_parts,
+        blank_page_indices,
+        blank_page,
+        clip_elements,
+        clip_bleed,
+        number_precision,
+        has_visible_head_node,
+        content_element_count,
+    )
+    return dimensions, page_template
 
-def process_image(
-    image_filepath: str,
-    page_inner_width_mm: float,
-    page_inner_height_mm: float,
-    page_border_mm: float,
-):
-    global g_current_image_filepath
-    g_current_image_filepath = image_filepath
-    print("==============\nProcessing image file: '{}'".format(image_filepath))
-    svg_tree = ElementTree.parse(image_filepath)
-    svg_root_node = svg_tree.getroot()
-    image_width, image_height, image_unit = svg_validate_and_get_image_dimensions_and_unit(
-        svg_root_node
+
+def svg_create_overview(page_template: SvgPageTemplate) -> bytes:
+    return b"".join(
+        page_template.elements[part] if isinstance(part, int) else part
+        for part in page_template.overview_parts
     )
-    dimensions = PageChoppingDimensions(
-        image_width,
-        image_height,
-        image_unit,
-        page_inner_width_mm,
-        page_inner_height_mm,
-        page_border_mm,
+
+
+def svg_get_overview_size(page_template: SvgPageTemplate) -> int:
+    return sum(
+        page_template.elements.get_size(part) if isinstance(part, int) else len(part)
+        for part in page_template.overview_parts
     )
 
-    svg_tree_overview = copy.deepcopy(svg_tree)
-    svg_root_node_overview = svg_tree_overview.getroot()
-    svg_draw_grid_and_markers(svg_root_node_overview, dimensions, 1.0, True)
 
-    svg_tree_page = svg_tree
-    svg_root_node_page = svg_tree_page.getroot()
-    svg_draw_grid_and_markers(svg_root_node_page, dimensions, 1.0, False)
+def svg_get_page_elements(
+    page_template: SvgPageTemplate, clip_rect: Rect, element_indices: list[int]
+) -> list[bytes]:
+    if len(page_template.clip_elements) == 0:
+        return [page_template.elements[element_index] for element_index in element_indices]
+    result = []
+    for element_index in element_indices:
+        clip_element = page_template.clip_elements.get(element_index)
+        if clip_element == None:
+            result.append(page_template.elements[element_index])
+        else:
+            result.append(
+                svg_clip_element(
+                    clip_element,
+                    clip_rect,
+                    page_template.clip_bleed,
+                    page_template.number_precision,
+                )
+            )
+    return result
 
-    svg_trees_pages = {}
-    for page_index_y in range(dimensions.page_count_y):
-        for page_index_x in range(dimensions.page_count_x):
-            svg_trees_pages[(page_index_x, page_index_y)] = svg_create_page(
-                svg_tree_page, dimensions, page_index_x, page_index_y, enable_debug_color=False
-            )
-
-    image_filename = os.path.splitext(os.path.basename(image_filepath))[0]
-    output_dir = image_filename
-    intermediate_dir = os.path.join(output_dir, "intermediates")
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.mkdir(output_dir)
-    os.mkdir(intermediate_dir)
-
-    filepath_overview_svg = os.path.join(intermediate_dir, image_filename + "__overview.svg")
-    filepath_overview_pdf = os.path.join(output_dir, image_filename + "__overview.pdf")
-    svg_tree_overview.write(filepath_overview_svg)
-    cairosvg.svg2pdf(
-        file_obj=open(filepath_overview_svg, "rb"),
-        write_to=filepath_overview_pdf,
-    )
-
-    filepath_list_pages_pdf = []
-    for (page_index_x, page_index_y), svg_tree_page in svg_trees_pages.items():
-        filepath_svg = os.path.join(
-            intermediate_dir,
-            "{}__{}x{}.svg".format(image_filename, page_index_x, page_index_y),
-        )
-        filepath_pdf = os.path.join(
-            intermediate_dir,
-            "{}__{}x{}.pdf".format(image_filename, page_index_x, page_index_y),
-        )
-        svg_tree_page.write(filepath_svg)
-        cairosvg.svg2pdf(file_obj=open(filepath_svg, "rb"), write_to=filepath_pdf)
-        filepath_list_pages_pdf.append(filepath_pdf)
-
-    filepath_pages_pdf = os.path.join(output_dir, image_filename + "__pages.pdf")
-    merger = PdfFileMerger()
-    for pdf in filepath_list_pages_pdf:
-        merger.append(pdf)
-    merger.write(filepath_pages_pdf)
-    merger.close()
 
-    filepath_overview_and_pages_pdf = os.path.join(
-        output_dir, image_filename + "__overview_and_pages.pdf"
+def svg_fill_page_template(
+    page_template: SvgPageTemplate,
+    view_rect: Rect,
+    clip_rect: Rect,
+    element_indices: list[int],
+) -> bytes:
+    return svg_fill_page_template_with_elements(
+        page_template,
+        view_rect,
+        clip_rect,
+        svg_get_page_elements(page_template, clip_rect, element_indices),
     )
-    merger = PdfFileMerger()
-    for pdf in [filepath_overview_pdf, filepath_pages_pdf]:
-        merger.append(pdf)
-    merger.write(filepath_overview_and_pages_pdf)
-    merger.close()
 
 
-def main():
-    # http://betweenborders.com/wordsmithing/a4-vs-us-letter/
-    #           Width    Length
-    # A4        210.0mm  297.0mm
-    # US-Letter 215.9mm  279.4mm
-    PAGE_INNER_WIDTH_MM = 180.0
-    PAGE_INNER_HEIGHT_MM = 250.0
-    PAGE_BORDER_MM = 0.0  # 14.0
+def svg_fill_page_template_with_elements(
+    page_template: SvgPageTemplate,
+    view_rect: Rect,
+    clip_rect: Rect,
+    elements: list[bytes],
+) -> bytes:
+    (
+        page_width_mm,
+        page_height_mm,
+        view_x,
+        view_y,
+        view_width,
+        view_height,
+        clip_x,
+        clip_y,
+        clip_width,
+        clip_height,
+    ) = [
+        svg_format_number(value, page_template.number_precision)
+        for value in [
+            view_rect.width / FACTOR_MM_TO_PX,
+            view_rect.height / FACTOR_MM_TO_PX,
+            view_rect.x,
+            view_rect.y,
+            view_rect.width,
+            view_rect.height,
+            clip_rect.x,
+            clip_rect.y,
+            clip_rect.width,
+            clip_rect.height,
+        ]
+    ]
+    values = [
+        page_width_mm + "mm",
+        page_height_mm + "mm",
+        "{} {} {} {}".format(view_x, view_y, view_width, view_height),
+        clip_x,
+        clip_y,
+        clip_width,
+        clip_height,
+    ]
+    values = [value.encode() for value in values]
+    values.append(b"".join(elements))
+    if page_template.enable_debug_color:
+        values += [view_x.encode(), view_y.encode()]
 
-    # NOTE: This prevents writing "ns0" on each tag in the output file
-    ElementTree.register_namespace("", "http://www.w3.org/2000/svg")
+    result = [page_template.parts[0]]
+    for value, part in zip(values, page_template.parts[1:]):
+        result.append(value)
+        result.append(part)
+    return b"".join(result)
 
-    image_filepaths = [each for each in os.listdir("./") if each.endswith(".svg")]
-    if len(image_filepaths) == 0:
-        exit_error(
-            "Directory does not contain any SVG images. Please put at least one SVG image in the directory beside ToniToniChoppi.exe"
-        )
 
+def svg_create_page(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    page_index_x: int,
+    page_index_y: int,
+) -> bytes:
+    # NOTE: All blank pages share the same empty page, if there is one
+    if page_template.blank_page != None:
+        if (page_index_x, page_index_y) in page_template.blank_page_indices:
+            return page_template.blank_page
+
+    clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+    view_rect = Rect(
+        clip_rect.x - dimensions.page_border,
+        clip_rect.y - dimensions.page_border,
+        dimensions.page_outer_width,
+        dimensions.page_outer_height,
+    )
+    return svg_fill_page_template(
+        page_template,
+        view_rect,
+        clip_rect,
+        page_template.page_element_indices[(page_index_x, page_index_y)],
+    )
+
+
+def svg_get_band_rect(
+    dimensions: PageChoppingDimensions,
+    page_index_y: int,
+    page_index_x_start: int,
+    page_index_x_end: int,
+) -> Rect:
+    start_rect = dimensions.get_clipping_rect_for_page_index(page_index_x_start, page_index_y)
+    end_rect = dimensions.get_clipping_rect_for_page_index(page_index_x_end - 1, page_index_y)
+    return Rect(
+        start_rect.x, start_rect.y, end_rect.x + end_rect.width - start_rect.x, start_rect.height
+    )
+
+
+# NOTE: A band spans the columns from page_index_x_start up to page_index_x_end of one page row
+#       without borders
+def svg_create_band(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    page_index_y: int,
+    page_index_x_start: int,
+    page_index_x_end: int,
+) -> bytes:
+    band_rect = svg_get_band_rect(dimensions, page_index_y, page_index_x_start, page_index_x_end)
+    element_indices = set()
+    for page_index_x in range(page_index_x_start, page_index_x_end):
+        element_indices.update(page_template.page_element_indices[(page_index_x, page_index_y)])
+    return svg_fill_page_template(page_template, band_rect, band_rect, sorted(element_indices))
+
+
+# NOTE: Imposition: The last column and the last row of the grid are often just slivers of a page,
+#       which would each be printed on their own mostly empty sheet. Instead several slivers are
+#       packed onto one sheet. Every sliver is clipped to the clipping rect of its page, so it shows
+#       the same content and markers as the page would, and gets a cut line and its page label.
+#       Like the markers, the sizes are given in image units.
+IMPOSITION_SLIVER_FRACTION = 0.5
+IMPOSITION_GAP = 10.0
+IMPOSITION_LABEL_SIZE = 14.0
+IMPOSITION_EPSILON = 1e-6
+
+
+class ImpositionPlacement:
+    page_index: tuple[int, int]
+    x: float
+    y: float
+    label_beside: bool
+
+    def __init__(self, page_index: tuple[int, int], x: float, y: float, label_beside: bool):
+        self.page_index = page_index
+        self.x = x
+        self.y = y
+        self.label_beside = label_beside
+
+
+class ImpositionSheet:
+    placements: list[ImpositionPlacement]
+
+    def __init__(self, placements: list[ImpositionPlacement]):
+        self.placements = placements
+
+
+# NOTE: First fit decreasing height shelf packing: The rects are sorted by their height and put next
+#       to each other onto shelves. A rect goes onto the first shelf of any sheet that still has
+#       room for it, otherwise onto a new shelf below the last one or onto a new sheet. Returns the
+#       (rect index, x, y) placements of every sheet.
+def impose_pack_rects(
+    sizes: list[tuple[float, float]], area_width: float, area_height: float, gap: float
+) -> list[list[tuple[int, float, float]]]:
+    result = []
+    sheets_shelves = []
+    rect_indices = sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0]))
+    for rect_index in rect_indices:
+        width, height = sizes[rect_index]
+        placement = None
+        for sheet_index, shelves in enumerate(sheets_shelves):
+            for shelf in shelves:
+                shelf_y, shelf_height, shelf_next_x = shelf
+                if (
+                    height <= shelf_height + IMPOSITION_EPSILON
+                    and shelf_next_x + width <= area_width + IMPOSITION_EPSILON
+                ):
+                    placement = (sheet_index, shelf_next_x, shelf_y)
+                    shelf[2] = shelf_next_x + width + gap
+                    break
+            if placement == None:
+                shelf_y = shelves[-1][0] + shelves[-1][1] + gap
+                if shelf_y + height <= area_height + IMPOSITION_EPSILON:
+                    shelves.append([shelf_y, height, width + gap])
+                    placement = (sheet_index, 0.0, shelf_y)
+            if placement != None:
+                break
+        if placement == None:
+            sheets_shelves.append([[0.0, height, width + gap]])
+            result.append([])
+            placement = (len(result) - 1, 0.0, 0.0)
+        sheet_index, x, y = placement
+        result[sheet_index].append((rect_index, x, y))
+    return result
+
+
+# NOTE: Returns the page indices that are still printed as pages and the sheets the other pages are
+#       imposed onto. Elements in front of the clipping group are drawn in the coordinates of the
+#       sheet instead of a page, so we only impose if none of them is visible.
+def impose_sliver_pages(
+    dimensions: PageChoppingDimensions,
+    page_template: SvgPageTemplate,
+    page_indices: list[tuple[int, int]],
+) -> tuple[list[tuple[int, int]], list[ImpositionSheet]]:
+    if page_template.has_visible_head_node:
+        return page_indices, []
+
+    sliver_page_indices = []
+    sliver_sizes = []
+    sliver_labels_beside = []
+    for page_index_x, page_index_y in page_indices:
+        clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+        if (
+            clip_rect.width > IMPOSITION_SLIVER_FRACTION * dimensions.page_inner_width
+            and clip_rect.height > IMPOSITION_SLIVER_FRACTION * dimensions.page_inner_height
+        ):
+            continue
+        # NOTE: The label goes above the sliver, or beside it if the sliver is as high as a page
+        if clip_rect.height + IMPOSITION_LABEL_SIZE <= dimensions.page_inner_height:
+            sliver_sizes.append((clip_rect.width, IMPOSITION_LABEL_SIZE + clip_rect.height))
+            sliver_labels_beside.append(False)
+        elif clip_rect.width + IMPOSITION_LABEL_SIZE <= dimensions.page_inner_width:
+            sliver_sizes.append((IMPOSITION_LABEL_SIZE + clip_rect.width, clip_rect.height))
+            sliver_labels_beside.append(True)
+        else:
+            continue
+        sliver_page_indices.append((page_index_x, page_index_y))
+
+    sheets = []
+    imposed_page_indices = set()
+    for sheet_rects in impose_pack_rects(
+        sliver_sizes, dimensions.page_inner_width, dimensions.page_inner_height, IMPOSITION_GAP
+    ):
+        # NOTE: A sheet with a single sliver would not save anything, so it stays a page
+        if len(sheet_rects) < 2:
+            continue
+        placements = []
+        for rect_index, x, y in sheet_rects:
+            label_beside = sliver_labels_beside[rect_index]
+            placements.append(
+                ImpositionPlacement(
+                    sliver_page_indices[rect_index],
+                    dimensions.page_border + x + (IMPOSITION_LABEL_SIZE if label_beside else 0.0),
+                    dimensions.page_border + y + (0.0 if label_beside else IMPOSITION_LABEL_SIZE),
+                    label_beside,
+                )
+            )
+            imposed_page_indices.add(sliver_page_indices[rect_index])
+        placements.sort(key=lambda placement: (placement.page_index[1], placement.page_index[0]))
+        sheets.append(ImpositionSheet(placements))
+
+    page_indices = [
+        page_index for page_index in page_indices if page_index not in imposed_page_indices
+    ]
+    return page_indices, sheets
+
+
+def svg_create_sheet(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    sheet: ImpositionSheet,
+) -> bytes:
+    def format_number(value: float) -> str:
+        return svg_format_number(value, page_template.number_precision)
+
+    sheet_rect = Rect(0, 0, dimensions.page_outer_width, dimensions.page_outer_height)
+    elements = []
+    for placement_index, placement in enumerate(sheet.placements):
+        page_index_x, page_index_y = placement.page_index
+        clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+        clip_path_id = "tonitonichoppi_sheet_clipping_rect_{}".format(placement_index)
+
+        # NOTE: The sliver is clipped in sheet coordinates outside of the group that moves it to its
+        #       place on the sheet, so no renderer has to resolve a clip path under a transform
+        clip_path_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "clipPath")
+        clip_path_node.set("id", clip_path_id)
+        clip_rect_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "rect")
+        clip_rect_node.set("x", format_number(placement.x))
+        clip_rect_node.set("y", format_number(placement.y))
+        clip_rect_node.set("width", format_number(clip_rect.width))
+        clip_rect_node.set("height", format_number(clip_rect.height))
+        clip_path_node.append(clip_rect_node)
+        elements.append(svg_serialize_root_child(clip_path_node))
+        sliver_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
+        sliver_node.set("clip-path", "url(#{})".format(clip_path_id))
+        translation_node = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "g")
+        translation_node.set(
+            "transform",
+            "translate({} {})".format(
+                format_number(placement.x - clip_rect.x), format_number(placement.y - clip_rect.y)
+            ),
+        )
+        translation_node.append(g_xml_backend.create_comment(SVG_PAGE_PLACEHOLDER_ELEMENTS))
+        sliver_node.append(translation_node)
+        start_tag, separator, end_tag = svg_serialize_root_child(sliver_node).partition(
+            "<!--{}-->".format(SVG_PAGE_PLACEHOLDER_ELEMENTS).encode()
+        )
+        assert separator != b""
+        elements.append(start_tag)
+        elements += svg_get_page_elements(
+            page_template, clip_rect, page_template.page_element_indices[placement.page_index]
+        )
+        elements.append(end_tag)
+
+        cut_line = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "rect")
+        cut_line.set("x", format_number(placement.x))
+        cut_line.set("y", format_number(placement.y))
+        cut_line.set("width", format_number(clip_rect.width))
+        cut_line.set("height", format_number(clip_rect.height))
+        cut_line.set("fill", "none")
+        cut_line.set("stroke", "#000")
+        cut_line.set("stroke-width", "0.5")
+        cut_line.set("stroke-dasharray", "4 2")
+        cut_line.set("opacity", "0.3")
+        elements.append(svg_serialize_root_child(cut_line))
+
+        label = g_xml_backend.create_element(SVG_NAMESPACE_PREFIX + "text")
+        if placement.label_beside:
+            label_x = placement.x - 0.5 * IMPOSITION_LABEL_SIZE
+            label_y = placement.y + 0.5 * clip_rect.height
+            label.set(
+                "transform",
+                "rotate(-90 {} {})".format(format_number(label_x), format_number(label_y)),
+            )
+            label.set("text-anchor", "middle")
+        else:
+            label_x = placement.x
+            label_y = placement.y - 0.5 * IMPOSITION_LABEL_SIZE
+            label.set("text-anchor", "start")
+        label.set("x", format_number(label_x))
+        label.set("y", format_number(label_y))
+        label.set("font-family", "sans-serif")
+        label.set("font-size", "10")
+        label.set("dominant-baseline", "middle")
+        label.set("fill", "#000")
+        label.set("opacity", "0.7")
+        label.text = get_page_label(page_index_x, page_index_y)
+        elements.append(svg_serialize_root_child(label))
+
+    # NOTE: The clipping rect of the template spans the whole sheet, every sliver clips on its own
+    return svg_fill_page_template_with_elements(page_template, sheet_rect, sheet_rect, elements)
+
+
+# NOTE: This is mixed into cairosvg's PDFSurface as CairoSvgMultiPagePdfSurface once cairosvg is
+#       imported
+class CairoSvgMultiPagePdfSurfaceMixin:
+    # NOTE: cairosvg creates a new cairo surface for every document it renders. We hand out the
+    #       shared surface of our document writer instead, so that every SVG becomes one page.
+    def _create_surface(self, width: float, height: float):
+        return self.output.begin_page(width, height), width, height
+
+    # NOTE: cairosvg draws the tree while the surface is created, which becomes the first page. This
+    #       draws the same tree again onto a new page, resetting the state the same way cairosvg does
+    #       on creation. Parsed definitions like gradients, patterns and markers are kept.
+    def draw_next_page(self, tree: cairosvg.parser.Tree):
+        self.parent_node = None
+        self.cursor_position = [0, 0]
+        self.cursor_d_position = [0, 0]
+        self.text_path_width = 0
+        self.context_width, self.context_height = None, None
+        self.font_size = cairosvg.helpers.size(self, "12pt")
+        width, height, viewbox = cairosvg.helpers.node_format(self, tree)
+        self.cairo, self.width, self.height = self._create_surface(
+            width * self.device_units_per_user_units, height * self.device_units_per_user_units
+        )
+        self.context = cairocffi.Context(self.cairo)
+        self.context.scale(self.device_units_per_user_units, self.device_units_per_user_units)
+        self.set_context_size(width, height, viewbox, tree)
+        self.context.move_to(0, 0)
+        self.draw(tree)
+
+
+def cairosvg_collect_node_attributes(
+    node: cairosvg.parser.Node, result: list[tuple[cairosvg.parser.Node, dict]]
+):
+    result.append((node, dict(node)))
+    for child in node.children:
+        cairosvg_collect_node_attributes(child, result)
+
+
+class CairoSvgPosterTree:
+    # NOTE: The whole poster is parsed into one cairosvg tree with all elements. A page is then
+    #       selected by only changing the viewport and the clipping rect of the tree, and by handing
+    #       the clipping group just the elements which intersect the page.
+    tree: cairosvg.parser.Tree
+    clipping_group_node: cairosvg.parser.Node
+    clip_rect_node: cairosvg.parser.Node
+    element_nodes: list[cairosvg.parser.Node]
+    head_node_attributes: list[tuple[cairosvg.parser.Node, dict]]
+    element_node_attributes: list[list[tuple[cairosvg.parser.Node, dict]]]
+
+    def __init__(self, page_template: SvgPageTemplate, dimensions: PageChoppingDimensions):
+        import_rendering_dependencies()
+        poster_rect = Rect(0, 0, dimensions.image_width, dimensions.image_height)
+        svg = svg_fill_page_template(
+            page_template, poster_rect, poster_rect, list(range(len(page_template.elements)))
+        )
+        self.tree = cairosvg.parser.Tree(bytestring=svg)
+
+        self.clipping_group_node = None
+        self.clip_rect_node = None
+        for node in self.tree.children:
+            if node.get("clip-path") == "url(#page_clipping_rect)":
+                self.clipping_group_node = node
+            if node.tag == "defs" and self.clip_rect_node == None:
+                for child in node.children:
+                    if child.get("id") == "page_clipping_rect":
+                        self.clip_rect_node = child.children[0]
+        assert self.clipping_group_node != None
+        assert self.clip_rect_node != None
+
+        # NOTE: cairosvg drops elements whose conditional attributes do not match, so the element
+        #       nodes are looked up through the XML elements they were created from
+        element_nodes_by_xml_element = {
+            id(node.element.etree_element): node for node in self.clipping_group_node.children
+        }
+        xml_elements = list(self.clipping_group_node.element.etree_element)
+        assert len(xml_elements) == len(page_template.elements)
+        self.element_nodes = [
+            element_nodes_by_xml_element.get(id(xml_element)) for xml_element in xml_elements
+        ]
+
+        # NOTE: cairosvg consumes some attributes while drawing, for example the position of a use
+        #       element. We keep the original attributes to restore them before every page.
+        self.head_node_attributes = []
+        for node in self.tree.children:
+            if node is not self.clipping_group_node:
+                cairosvg_collect_node_attributes(node, self.head_node_attributes)
+        self.element_node_attributes = []
+        for node in self.element_nodes:
+            node_attributes = []
+            if node != None:
+                cairosvg_collect_node_attributes(node, node_attributes)
+            self.element_node_attributes.append(node_attributes)
+
+    def select_page(
+        self,
+        page_template: SvgPageTemplate,
+        dimensions: PageChoppingDimensions,
+        page_index_x: int,
+        page_index_y: int,
+    ):
+        element_indices = page_template.page_element_indices[(page_index_x, page_index_y)]
+        for element_index in element_indices:
+            for node, attributes in self.element_node_attributes[element_index]:
+                node.clear()
+                node.update(attributes)
+        for node, attributes in self.head_node_attributes:
+            node.clear()
+            node.update(attributes)
+
+        # NOTE: The numbers are formatted like in the page SVGs, so that both draw the same page
+        def format_number(value: float) -> str:
+            return svg_format_number(value, page_template.number_precision)
+
+        clip_rect = dimensions.get_clipping_rect_for_page_index(page_index_x, page_index_y)
+        self.tree["width"] = format_number(dimensions.page_outer_width / FACTOR_MM_TO_PX) + "mm"
+        self.tree["height"] = format_number(dimensions.page_outer_height / FACTOR_MM_TO_PX) + "mm"
+        self.tree["viewBox"] = "{} {} {} {}".format(
+            format_number(clip_rect.x - dimensions.page_border),
+            format_number(clip_rect.y - dimensions.page_border),
+            format_number(dimensions.page_outer_width),
+            format_number(dimensions.page_outer_height),
+        )
+        self.clip_rect_node["x"] = format_number(clip_rect.x)
+        self.clip_rect_node["y"] = format_number(clip_rect.y)
+        self.clip_rect_node["width"] = format_number(clip_rect.width)
+        self.clip_rect_node["height"] = format_number(clip_rect.height)
+        self.clipping_group_node.children = [
+            self.element_nodes[element_index]
+            for element_index in element_indices
+            if self.element_nodes[element_index] != None
+        ]
+
+
+class PdfDocumentWriter:
+    output: io.IOBase
+    cairo_surface: cairocffi.PDFSurface
+    page_count: int
+    image_dpi: float
+    raster_images: dict[str, Image.Image]
+    raster_image_patterns: dict[tuple[str, int, int], cairocffi.SurfacePattern]
+    poster_surface: CairoSvgMultiPagePdfSurface
+
+    def __init__(self, output: io.IOBase, image_dpi: float = None):
+        import_rendering_dependencies()
+        self.output = output
+        self.cairo_surface = None
+        self.page_count = 0
+        self.image_dpi = image_dpi
+        self.raster_images = {}
+        self.raster_image_patterns = {}
+        self.poster_surface = None
+
+    def begin_page(self, width: float, height: float) -> cairocffi.PDFSurface:
+        if self.cairo_surface == None:
+            self.cairo_surface = cairocffi.PDFSurface(self.output, width, height)
+        else:
+            self.cairo_surface.set_size(width, height)
+        return self.cairo_surface
+
+    def add_page(self, svg: bytes):
+        with trace_span("cairosvg_parse"):
+            tree = cairosvg.parser.Tree(bytestring=svg)
+        with trace_span("cairosvg_draw"):
+            CairoSvgMultiPagePdfSurface(tree, self, 96)
+            self.cairo_surface.show_page()
+        self.page_count += 1
+
+    # NOTE: All poster pages of a document are drawn from the same tree by the same cairosvg
+    #       surface, so the tree is only parsed once and its definitions are shared between pages
+    def add_poster_page(
+        self,
+        poster_tree: CairoSvgPosterTree,
+        page_template: SvgPageTemplate,
+        dimensions: PageChoppingDimensions,
+        page_index_x: int,
+        page_index_y: int,
+    ):
+        # NOTE: All blank pages share the same empty page, if there is one
+        if page_template.blank_page != None:
+            if (page_index_x, page_index_y) in page_template.blank_page_indices:
+                self.add_page(page_template.blank_page)
+                return
+        if poster_tree == None:
+            self.add_page(svg_create_page(page_template, dimensions, page_index_x, page_index_y))
+            return
+        with trace_span("select_page"):
+            poster_tree.select_page(page_template, dimensions, page_index_x, page_index_y)
+        with trace_span("cairosvg_draw"):
+            if self.poster_surface == None:
+                self.poster_surface = CairoSvgMultiPagePdfSurface(poster_tree.tree, self, 96)
+            else:
+                self.poster_surface.draw_next_page(poster_tree.tree)
+            self.cairo_surface.show_page()
+        self.page_count += 1
+
+    def finish(self):
+        assert self.page_count > 0
+        with trace_span("finish_pdf"):
+            self.cairo_surface.finish()
+
+
+def pdf_load_raster_image(node: cairosvg.parser.Node, url) -> Image.Image:
+    image_bytes = node.fetch_url(url, "image/*")
+    if len(image_bytes) < 5:
+        return None
+    if (
+        image_bytes.startswith((b"<svg ", b"<?xml", b"<!DOC", b"\x1f\x8b"))
+        or b"<svg" in image_bytes
+    ):
+        return None
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes)))
+    if image.mode == "CMYK":
+        image = image.convert("RGB")
+    image.load()
+    return image
+
+
+def pdf_create_raster_image_pattern(image: Image.Image) -> cairocffi.SurfacePattern:
+    png_file = io.BytesIO()
+    image.save(png_file, "PNG")
+    png_file.seek(0)
+    return cairocffi.SurfacePattern(cairocffi.ImageSurface.create_from_png(png_file))
+
+
+# NOTE: cairosvg decodes an embedded image every time it draws it, which creates a new image object
+#       in the PDF for every page the image appears on. We decode every raster image only once per
+#       document and paint the same cairo surface on all pages instead, which cairo then writes only
+#       once into the PDF. Optionally the images are downsampled to the given print resolution.
+#       This mirrors cairosvg.image.image for raster images.
+def cairosvg_draw_image_shared(surface: cairosvg.surface.Surface, node: cairosvg.parser.Node):
+    pdf_document_writer = surface.output
+    if not isinstance(pdf_document_writer, PdfDocumentWriter):
+        g_cairosvg_draw_image(surface, node)
+        return
+
+    base_url = node.get("{http://www.w3.org/XML/1998/namespace}base")
+    if not base_url and node.url:
+        base_url = os.path.dirname(node.url) + "/"
+    url = cairosvg.url.parse_url(node.get_href(), base_url)
+    image_key = url.geturl()
+    if image_key not in pdf_document_writer.raster_images:
+        pdf_document_writer.raster_images[image_key] = pdf_load_raster_image(node, url)
+    image = pdf_document_writer.raster_images[image_key]
+    if image == None:
+        g_cairosvg_draw_image(surface, node)
+        return
+
+    x = cairosvg.helpers.size(surface, node.get("x"), "x")
+    y = cairosvg.helpers.size(surface, node.get("y"), "y")
+    width = cairosvg.helpers.size(surface, node.get("width"), "x")
+    height = cairosvg.helpers.size(surface, node.get("height"), "y")
+
+    node.image_width, node.image_height = image.size
+    width = width or node.image_width
+    height = height or node.image_height
+    scale_x, scale_y, translate_x, translate_y = cairosvg.helpers.preserve_ratio(
+        surface, node, width, height
+    )
+
+    pattern_width, pattern_height = image.size
+    if pdf_document_writer.image_dpi != None:
+        # NOTE: The PDF surface measures in points (1/72 inch)
+        image_width_pt = math.hypot(
+            *surface.context.user_to_device_distance(scale_x * node.image_width, 0)
+        )
+        image_height_pt = math.hypot(
+            *surface.context.user_to_device_distance(0, scale_y * node.image_height)
+        )
+        pattern_width = min(
+            pattern_width, max(1, math.ceil(image_width_pt / 72 * pdf_document_writer.image_dpi))
+        )
+        pattern_height = min(
+            pattern_height, max(1, math.ceil(image_height_pt / 72 * pdf_document_writer.image_dpi))
+        )
+
+    pattern_key = (image_key, pattern_width, pattern_height)
+    pattern = pdf_document_writer.raster_image_patterns.get(pattern_key)
+    if pattern == None:
+        if (pattern_width, pattern_height) != image.size:
+            pattern = pdf_create_raster_image_pattern(
+                image.resize((pattern_width, pattern_height), Image.LANCZOS)
+            )
+        else:
+            pattern = pdf_create_raster_image_pattern(image)
+        pdf_document_writer.raster_image_patterns[pattern_key] = pattern
+    pattern.set_filter(
+        cairosvg.image.IMAGE_RENDERING.get(node.get("image-rendering"), cairocffi.FILTER_GOOD)
+    )
+
+    if not (
+        translate_x == 0
+        and translate_y == 0
+        and width == scale_x * node.image_width
+        and height == scale_y * node.image_height
+    ):
+        surface.context.rectangle(x, y, width, height)
+        surface.context.clip()
+
+    opacity = float(node.get("opacity", 1))
+    surface.context.save()
+    surface.context.translate(x, y)
+    surface.context.scale(scale_x, scale_y)
+    surface.context.translate(translate_x, translate_y)
+    surface.context.scale(node.image_width / pattern_width, node.image_height / pattern_height)
+    surface.context.set_source(pattern)
+    surface.context.paint_with_alpha(opacity)
+    surface.context.restore()
+
+
+def import_rendering_dependencies():
+    global cairosvg
+    global cairocffi
+    global PdfFileReader
+    global PdfFileWriter
+    global Image
+    global ImageOps
+    global CairoSvgMultiPagePdfSurface
+    global g_cairosvg_draw_image
+    global g_rendering_dependencies_imported
+    with g_rendering_dependencies_lock:
+        if g_rendering_dependencies_imported:
+            return
+
+        # pip install PyPDF2
+        from PyPDF2 import PdfFileReader, PdfFileWriter
+
+        # pip install cairosvg==2.9.1
+        # NOTE: See CAIROSVG_POSTER_TREE_VERSIONS before updating cairosvg
+        import cairosvg
+        import cairosvg.helpers
+        import cairosvg.image
+        import cairosvg.parser
+        import cairosvg.surface
+        import cairosvg.url
+        import cairocffi
+
+        # NOTE: Pillow is installed as a dependency of cairosvg
+        from PIL import Image, ImageOps
+
+        CairoSvgMultiPagePdfSurface = type(
+            "CairoSvgMultiPagePdfSurface",
+            (CairoSvgMultiPagePdfSurfaceMixin, cairosvg.surface.PDFSurface),
+            {},
+        )
+        g_cairosvg_draw_image = cairosvg.surface.TAGS["image"]
+        cairosvg.surface.TAGS["image"] = cairosvg_draw_image_shared
+        g_rendering_dependencies_imported = True
+
+
+def pdf_write_page_range(
+    pdf_reader: PdfFileReader, first_page: int, page_count: int, filepath: str
+):
+    with trace_span("write_page_range", first_page=first_page, page_count=page_count):
+        pdf_writer = PdfFileWriter()
+        for page_index in range(first_page, first_page + page_count):
+            pdf_writer.addPage(pdf_reader.getPage(page_index))
+        with open(filepath, "wb") as pdf_file:
+            pdf_writer.write(pdf_file)
+
+
+# NOTE: The poster tree and CairoSvgMultiPagePdfSurfaceMixin mirror internals of cairosvg, which
+#       can change in any release. They are only used with the versions of cairosvg that
+#       tests/test_poster_tree.py was run against, any other version renders the pages one by one.
+CAIROSVG_POSTER_TREE_VERSIONS = ["2.9.1"]
+
+# NOTE: The poster tree keeps every element of the poster parsed in memory, in every render worker,
+#       while the element store otherwise keeps them on disk. Posters with more serialized elements
+#       than this are rendered page by page instead, which parses shared definitions again for
+#       every page, but only holds the elements of one page in memory.
+POSTER_TREE_MAX_ELEMENT_BYTES = 8 * 1024 * 1024
+
+
+# NOTE: Returns None if the elements are clipped geometrically, as the pages then differ in their
+#       geometry and cannot be drawn from one shared tree, or if the poster is too big to be parsed
+#       as a whole
+def pdf_parse_poster(
+    page_template: SvgPageTemplate, dimensions: PageChoppingDimensions
+) -> CairoSvgPosterTree:
+    if len(page_template.clip_elements) > 0:
+        return None
+    if page_template.elements.get_total_size() > POSTER_TREE_MAX_ELEMENT_BYTES:
+        return None
+    import_rendering_dependencies()
+    if cairosvg.__version__ not in CAIROSVG_POSTER_TREE_VERSIONS:
+        return None
+    with trace_span("cairosvg_parse_poster"):
+        return CairoSvgPosterTree(page_template, dimensions)
+
+
+def pdf_render_pages(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    page_indices: list[tuple[int, int]],
+    image_dpi: float = None,
+    poster_tree: CairoSvgPosterTree = None,
+) -> bytes:
+    if poster_tree == None:
+        poster_tree = pdf_parse_poster(page_template, dimensions)
+    output = io.BytesIO()
+    pdf_document_writer = PdfDocumentWriter(output, image_dpi)
+    for page_index_x, page_index_y in page_indices:
+        page_name = progress_get_page_name(page_index_x, page_index_y)
+        progress_page_started(page_name)
+        output_start = output.tell()
+        with trace_span("page", x=page_index_x, y=page_index_y):
+            pdf_document_writer.add_poster_page(
+                poster_tree, page_template, dimensions, page_index_x, page_index_y
+            )
+        progress_page_finished(page_name, output.tell() - output_start)
+    pdf_document_writer.finish()
+    return output.getvalue()
+
+
+def pdf_render_svg(svg: bytes, image_dpi: float = None) -> bytes:
+    output = io.BytesIO()
+    pdf_document_writer = PdfDocumentWriter(output, image_dpi)
+    pdf_document_writer.add_page(svg)
+    pdf_document_writer.finish()
+    return output.getvalue()
+
+
+def pdf_render_svg_page(page_name: str, svg: bytes, image_dpi: float = None) -> bytes:
+    progress_page_started(page_name)
+    result = pdf_render_svg(svg, image_dpi)
+    progress_page_finished(page_name, len(result))
+    return result
+
+
+def pdf_write_documents(documents: list[bytes], output: io.IOBase):
+    import_rendering_dependencies()
+    progress_stage(PROGRESS_STAGE_WRITE)
+    with trace_span("merge_documents", document_count=len(documents)):
+        pdf_writer = PdfFileWriter()
+        for document in documents:
+            pdf_reader = PdfFileReader(io.BytesIO(document))
+            for page_index in range(pdf_reader.getNumPages()):
+                pdf_writer.addPage(pdf_reader.getPage(page_index))
+        pdf_writer.write(output)
+
+
+# NOTE: Every render worker process receives the page template once when it starts. Afterwards it
+#       only gets sent the indices of the pages it should render.
+g_render_worker_page_template = None
+g_render_worker_dimensions = None
+g_render_worker_image_dpi = None
+g_render_worker_poster_tree = None
+
+
+def render_worker_init(
+    page_template: SvgPageTemplate, dimensions: PageChoppingDimensions, image_dpi: float
+):
+    global g_render_worker_page_template
+    global g_render_worker_dimensions
+    global g_render_worker_image_dpi
+    g_render_worker_page_template = page_template
+    g_render_worker_dimensions = dimensions
+    g_render_worker_image_dpi = image_dpi
+    import_rendering_dependencies()
+
+
+def render_worker_render_pages(page_indices: list[tuple[int, int]]) -> bytes:
+    # NOTE: The poster is parsed once per worker and reused for all of its page batches
+    global g_render_worker_poster_tree
+    if g_render_worker_poster_tree == None:
+        g_render_worker_poster_tree = pdf_parse_poster(
+            g_render_worker_page_template, g_render_worker_dimensions
+        )
+    return pdf_render_pages(
+        g_render_worker_page_template,
+        g_render_worker_dimensions,
+        page_indices,
+        g_render_worker_image_dpi,
+        g_render_worker_poster_tree,
+    )
+
+
+def pdf_render_pages_parallel(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    overview_svg: bytes,
+    page_indices: list[tuple[int, int]],
+    sheet_svgs: list[bytes],
+    job_count: int,
+    image_dpi: float,
+    output: io.IOBase,
+):
+    # NOTE: Smaller batches balance the load better, bigger batches share fonts and images between
+    #       more pages before they get merged
+    batch_size = max(1, math.ceil(len(page_indices) / (4 * job_count)))
+    page_batches = [
+        page_indices[batch_start : batch_start + batch_size]
+        for batch_start in range(0, len(page_indices), batch_size)
+    ]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=job_count,
+        initializer=render_worker_init,
+        initargs=(page_template, dimensions, image_dpi),
+    ) as executor:
+        tracer_settings = tracer_get_worker_settings()
+        progress_worker_queue = progress_get_worker_queue()
+        futures = [
+            executor.submit(
+                tracer_run_in_worker,
+                tracer_settings,
+                progress_run_in_worker,
+                progress_worker_queue,
+                pdf_render_svg_page,
+                "overview",
+                overview_svg,
+                image_dpi,
+            )
+        ]
+        for page_batch in page_batches:
+            futures.append(
+                executor.submit(
+                    tracer_run_in_worker,
+                    tracer_settings,
+                    progress_run_in_worker,
+                    progress_worker_queue,
+                    render_worker_render_pages,
+                    page_batch,
+                )
+            )
+        for sheet_index, sheet_svg in enumerate(sheet_svgs):
+            futures.append(
+                executor.submit(
+                    tracer_run_in_worker,
+                    tracer_settings,
+                    progress_run_in_worker,
+                    progress_worker_queue,
+                    pdf_render_svg_page,
+                    progress_get_sheet_name(sheet_index),
+                    sheet_svg,
+                    image_dpi,
+                )
+            )
+        progress_wait_for_futures(futures)
+        documents = [tracer_unpack_worker_result(future.result()) for future in futures]
+        pdf_write_documents(documents, output)
+
+
+# NOTE: Bump this whenever the rendering changes in a way that is not visible in the page SVG
+PAGE_CACHE_VERSION = 1
+# NOTE: Matches the URLs of attributes like href and of url() in styles that point outside of the
+#       page SVG. Fragments within the page and data URLs are part of the page SVG itself.
+PAGE_CACHE_EXTERNAL_URL_REGEX = re.compile(
+    rb"""(?:href\s*=\s*["']|url\(\s*["']?)(?!#|data:)([^"')]+)"""
+)
+
+
+# NOTE: cairosvg resolves relative URLs of a page SVG against the working directory. Returns None for
+#       URLs that are not local files.
+def page_cache_get_local_filepath(url: bytes) -> str:
+    url_parts = urllib.parse.urlsplit(html.unescape(url.decode("utf-8", "replace")).strip())
+    # NOTE: A single letter scheme is a drive letter on Windows
+    if len(url_parts.scheme) == 1:
+        return url_parts.scheme + ":" + urllib.parse.unquote(url_parts.path)
+    if url_parts.scheme not in ("", "file"):
+        return None
+    return urllib.parse.unquote(url_parts.path)
+
+
+# NOTE: Returns None if the page SVG links to anything that is not a local file
+def page_cache_get_external_files_key(svg: bytes) -> str:
+    result = []
+    for url in sorted(set(PAGE_CACHE_EXTERNAL_URL_REGEX.findall(svg))):
+        filepath = page_cache_get_local_filepath(url)
+        if filepath == None:
+            return None
+        try:
+            stat = os.stat(filepath)
+            result.append("{}:{}:{}".format(filepath, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            result.append("{}:missing".format(filepath))
+    return "\n".join(result)
+
+
+class PageCache:
+    directory: str
+    max_size_bytes: int
+    hit_count: int
+    miss_count: int
+
+    def __init__(self, directory: str, max_size_bytes: int):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.hit_count = 0
+        self.miss_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # NOTE: A page SVG contains everything that affects its rendering: its culled content, the
+    #       clipping rect, the grid and markers and the page size. The only exception are external
+    #       files like linked images, their size and modification time are part of the key. Pages
+    #       linking to anything but local files can not be checked for changes, for them the key
+    #       is None and the page is not cached.
+    def get_key(self, svg: bytes, image_dpi: float) -> str:
+        import_rendering_dependencies()
+        external_files_key = page_cache_get_external_files_key(svg)
+        if external_files_key == None:
+            return None
+        hasher = hashlib.sha256()
+        hasher.update(
+            "{}:{}:{}:".format(PAGE_CACHE_VERSION, cairosvg.__version__, image_dpi).encode()
+        )
+        hasher.update(svg)
+        hasher.update(external_files_key.encode())
+        return hasher.hexdigest()
+
+    def get_filepath(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pdf")
+
+    def load(self, key: str) -> bytes:
+        filepath = self.get_filepath(key)
+        try:
+            with open(filepath, "rb") as pdf_file:
+                result = pdf_file.read()
+            # NOTE: The modification time marks the last use for the LRU eviction
+            os.utime(filepath)
+        except OSError:
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        return result
+
+    def store(self, key: str, pdf: bytes):
+        # NOTE: Write to a temporary file first, so that concurrent processes never read a
+        #       half-written entry
+        filepath = self.get_filepath(key)
+        filepath_temp = "{}.{}.tmp".format(filepath, os.getpid())
+        with open(filepath_temp, "wb") as pdf_file:
+            pdf_file.write(pdf)
+        os.replace(filepath_temp, filepath)
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, filepath in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+            total_size -= size
+
+
+def pdf_render_pages_cached(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    overview_svg: bytes,
+    page_indices: list[tuple[int, int]],
+    sheet_svgs: list[bytes],
+    job_count: int,
+    image_dpi: float,
+    page_cache: PageCache,
+    output: io.IOBase,
+):
+    # NOTE: Pages are cached one by one, so every page is rendered into its own PDF here
+    svgs = (
+        [overview_svg]
+        + [
+            svg_create_page(page_template, dimensions, page_index_x, page_index_y)
+            for page_index_x, page_index_y in page_indices
+        ]
+        + sheet_svgs
+    )
+    keys = [page_cache.get_key(svg, image_dpi) for svg in svgs]
+    # NOTE: Pages that can not be cached get a key of their own, which is never loaded or stored
+    uncached_keys = set()
+    for index, key in enumerate(keys):
+        if key == None:
+            keys[index] = "uncached_{}".format(index)
+            uncached_keys.add(keys[index])
+    page_names = (
+        ["overview"]
+        + [
+            progress_get_page_name(page_index_x, page_index_y)
+            for page_index_x, page_index_y in page_indices
+        ]
+        + [progress_get_sheet_name(sheet_index) for sheet_index in range(len(sheet_svgs))]
+    )
+    page_names_by_key = {}
+    for page_name, key in zip(page_names, keys):
+        page_names_by_key.setdefault(key, []).append(page_name)
+
+    # NOTE: Identical pages like shared blank pages are only loaded and rendered once
+    documents_by_key = {}
+    with trace_span("page_cache_load"):
+        for key in keys:
+            if key in uncached_keys:
+                documents_by_key[key] = None
+            elif key not in documents_by_key:
+                documents_by_key[key] = page_cache.load(key)
+    missing_keys = [key for key, document in documents_by_key.items() if document == None]
+    for key, document in documents_by_key.items():
+        if document != None:
+            for page_name in page_names_by_key[key]:
+                progress_page_started(page_name)
+                progress_page_finished(page_name, len(document))
+    print(
+        "Page cache: {} pages reused, {} pages to render".format(
+            len(documents_by_key) - len(missing_keys), len(missing_keys)
+        )
+    )
+
+    svgs_by_key = dict(zip(keys, svgs))
+    if job_count > 1 and len(missing_keys) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=job_count) as executor:
+            tracer_settings = tracer_get_worker_settings()
+            progress_worker_queue = progress_get_worker_queue()
+            futures = [
+                executor.submit(
+                    tracer_run_in_worker,
+                    tracer_settings,
+                    progress_run_in_worker,
+                    progress_worker_queue,
+                    pdf_render_svg_page,
+                    page_names_by_key[key][0],
+                    svgs_by_key[key],
+                    image_dpi,
+                )
+                for key in missing_keys
+            ]
+            progress_wait_for_futures(futures)
+            rendered_documents = [
+                tracer_unpack_worker_result(future.result()) for future in futures
+            ]
+    else:
+        rendered_documents = [
+            pdf_render_svg_page(page_names_by_key[key][0], svgs_by_key[key], image_dpi)
+            for key in missing_keys
+        ]
+
+    for key, document in zip(missing_keys, rendered_documents):
+        documents_by_key[key] = document
+        if key not in uncached_keys:
+            page_cache.store(key, document)
+        # NOTE: The other pages with the same content are done together with the rendered one
+        for page_name in page_names_by_key[key][1:]:
+            progress_page_started(page_name)
+            progress_page_finished(page_name, len(document))
+
+    documents = [documents_by_key[key] for key in keys]
+    pdf_write_documents(documents, output)
+    with trace_span("page_cache_evict"):
+        page_cache.evict()
+
+
+OUTPUT_FORMAT_PDF = "pdf"
+OUTPUT_FORMAT_PNG = "png"
+OUTPUT_FORMAT_TIFF = "tiff"
+OUTPUT_FORMATS = [OUTPUT_FORMAT_PDF, OUTPUT_FORMAT_PNG, OUTPUT_FORMAT_TIFF]
+
+RASTER_FILE_EXTENSIONS = {OUTPUT_FORMAT_PNG: ".png", OUTPUT_FORMAT_TIFF: ".tif"}
+RASTER_DPI_DEFAULT = 300.0
+
+# NOTE: cairo stores its ARGB32 pixels as native-endian 32-bit words
+RASTER_CAIRO_RAWMODE = "BGRX" if sys.byteorder == "little" else "XRGB"
+RASTER_CAIRO_BYTES_PER_PIXEL = 4
+# NOTE: cairo can not create image surfaces that are wider or higher than this
+RASTER_CAIRO_MAX_SIZE = 32767
+# NOTE: The overview is not printed at scale, so it is rendered with its longer side at this size
+RASTER_OVERVIEW_SIZE = 4096
+
+
+def raster_render_band(
+    svg: bytes, raster_dpi: float, output_width: int = None, output_height: int = None
+) -> cairocffi.ImageSurface:
+    tree = cairosvg.parser.Tree(bytestring=svg)
+    surface = cairosvg.surface.PNGSurface(
+        tree,
+        None,
+        raster_dpi,
+        output_width=output_width,
+        output_height=output_height,
+        background_color="white",
+    )
+    surface.cairo.flush()
+    return surface.cairo
+
+
+# NOTE: Splits the columns of a page row into chunks, whose bands each fit into a cairo image
+#       surface. Returns the (start, end) page column ranges.
+def raster_get_band_column_ranges(
+    dimensions: PageChoppingDimensions, pixels_per_unit: float
+) -> list[tuple[int, int]]:
+    result = []
+    page_index_x_start = 0
+    for page_index_x in range(dimensions.page_count_x):
+        band_rect = svg_get_band_rect(dimensions, 0, page_index_x_start, page_index_x + 1)
+        if math.ceil(band_rect.width * pixels_per_unit) > RASTER_CAIRO_MAX_SIZE:
+            if page_index_x == page_index_x_start:
+                raise InvalidOptionsError(
+                    "A page is too large to be rasterized at this resolution, lower the DPI"
+                )
+            result.append((page_index_x_start, page_index_x))
+            page_index_x_start = page_index_x
+    result.append((page_index_x_start, dimensions.page_count_x))
+    return result
+
+
+def raster_write_overview(
+    overview_svg: bytes,
+    dimensions: PageChoppingDimensions,
+    raster_dpi: float,
+    output_format: str,
+    filepath: str,
+):
+    if dimensions.image_width >= dimensions.image_height:
+        overview_surface = raster_render_band(
+            overview_svg, raster_dpi, output_width=RASTER_OVERVIEW_SIZE
+        )
+    else:
+        overview_surface = raster_render_band(
+            overview_svg, raster_dpi, output_height=RASTER_OVERVIEW_SIZE
+        )
+    width = overview_surface.get_width()
+    height = overview_surface.get_height()
+    raster_encode_tile(
+        memoryview(overview_surface.get_data()),
+        overview_surface.get_stride(),
+        width,
+        height,
+        width,
+        height,
+        0,
+        0,
+        raster_dpi,
+        output_format,
+        filepath,
+    )
+
+
+def raster_encode_tile(
+    band_data: memoryview,
+    band_stride: int,
+    width: int,
+    height: int,
+    tile_width: int,
+    tile_height: int,
+    tile_offset_x: int,
+    tile_offset_y: int,
+    raster_dpi: float,
+    output_format: str,
+    filepath: str,
+):
+    # NOTE: The band data is only read here while decoding the raw pixels for the encoder, no
+    #       copy of the page is made beforehand
+    image = Image.frombuffer(
+        "RGB", (width, height), band_data, "raw", RASTER_CAIRO_RAWMODE, band_stride, 1
+    )
+    if (width, height) != (tile_width, tile_height):
+        tile = Image.new("RGB", (tile_width, tile_height), "white")
+        tile.paste(image, (tile_offset_x, tile_offset_y))
+        image = tile
+    if output_format == OUTPUT_FORMAT_TIFF:
+        image.save(filepath, "TIFF", dpi=(raster_dpi, raster_dpi), compression="tiff_deflate")
+    else:
+        image.save(filepath, "PNG", dpi=(raster_dpi, raster_dpi))
+
+
+def raster_write_pages(
+    page_template: SvgPageTemplate,
+    dimensions: PageChoppingDimensions,
+    overview_svg: bytes,
+    page_indices: list[tuple[int, int]],
+    sheet_svgs: list[bytes],
+    output_format: str,
+    raster_dpi: float,
+    job_count: int,
+    output_dir: str,
+    image_filename: str,
+):
+    # NOTE: Page SVGs are sized as if one image unit was one point, see svg_fill_page_template
+    import_rendering_dependencies()
+    pixels_per_unit = raster_dpi / 72.0
+    tile_width = round(dimensions.page_outer_width * pixels_per_unit)
+    tile_height = round(dimensions.page_outer_height * pixels_per_unit)
+    tile_border = round(dimensions.page_border * pixels_per_unit)
+    file_extension = RASTER_FILE_EXTENSIONS[output_format]
+    if max(tile_width, tile_height) > RASTER_CAIRO_MAX_SIZE:
+        raise InvalidOptionsError(
+            "A page is too large to be rasterized at this resolution, lower the DPI"
+        )
+    band_column_ranges = raster_get_band_column_ranges(dimensions, pixels_per_unit)
+
+    progress_page_started("overview")
+    filepath_overview = os.path.join(output_dir, image_filename + "__overview" + file_extension)
+    with trace_span("overview"):
+        raster_write_overview(
+            overview_svg, dimensions, raster_dpi, output_format, filepath_overview
+        )
+    progress_page_finished("overview", os.path.getsize(filepath_overview))
+
+    # NOTE: The image is rasterized one page row at a time, so that only a single band of the
+    #       poster is held in memory. Rows that are wider than a cairo image surface can be are
+    #       split into several bands. The pages are then cut out of the band as views into its
+    #       pixel buffer and encoded by a thread pool while the band is alive. Pillow releases the
+    #       GIL while encoding.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=job_count) as executor:
+        for page_index_y, (page_index_x_start, page_index_x_end) in itertools.product(
+            range(dimensions.page_count_y), band_column_ranges
+        ):
+            band_page_indices = [
+                page_index
+                for page_index in page_indices
+                if page_index[1] == page_index_y
+                and page_index_x_start <= page_index[0] < page_index_x_end
+            ]
+            if len(band_page_indices) == 0:
+                continue
+
+            for page_index_x, _ in band_page_indices:
+                progress_page_started(progress_get_page_name(page_index_x, page_index_y))
+            with trace_span("band", y=page_index_y, x=page_index_x_start):
+                with trace_span("create_band"):
+                    svg = svg_create_band(
+                        page_template,
+                        dimensions,
+                        page_index_y,
+                        page_index_x_start,
+                        page_index_x_end,
+                    )
+                with trace_span("render_band"):
+                    band_surface = raster_render_band(svg, raster_dpi)
+                band_left = round(
+                    dimensions.get_clipping_rect_for_page_index(page_index_x_start, page_index_y).x
+                    * pixels_per_unit
+                )
+                band_width = band_surface.get_width()
+                band_height = band_surface.get_height()
+                band_stride = band_surface.get_stride()
+                band_data = memoryview(band_surface.get_data())
+
+                futures = []
+                filepaths = []
+                for page_index_x, _ in band_page_indices:
+                    clip_rect = dimensions.get_clipping_rect_for_page_index(
+                        page_index_x, page_index_y
+                    )
+                    # NOTE: The page edges are rounded the same way for neighbouring pages, so
+                    #       that the pages neither overlap nor leave gaps between them
+                    left = min(round(clip_rect.x * pixels_per_unit) - band_left, band_width)
+                    right = min(
+                        round((clip_rect.x + clip_rect.width) * pixels_per_unit) - band_left,
+                        band_width,
+                    )
+                    filepath = os.path.join(
+                        output_dir,
+                        "{}__{}x{}{}".format(
+                            image_filename, page_index_x, page_index_y, file_extension
+                        ),
+                    )
+                    filepaths.append(filepath)
+                    futures.append(
+                        executor.submit(
+                            raster_encode_tile,
+                            band_data[left * RASTER_CAIRO_BYTES_PER_PIXEL :],
+                            band_stride,
+                            right - left,
+                            min(band_height, tile_height),
+                            tile_width,
+                            tile_height,
+                            tile_border,
+                            tile_border,
+                            raster_dpi,
+                            output_format,
+                            filepath,
+                        )
+                    )
+                with trace_span("encode_pages"):
+                    for (page_index_x, _), future, filepath in zip(
+                        band_page_indices, futures, filepaths
+                    ):
+                        future.result()
+                        progress_page_finished(
+                            progress_get_page_name(page_index_x, page_index_y),
+                            os.path.getsize(filepath),
+                        )
+
+    # NOTE: A sheet is already laid out on its own, so it is rendered and encoded as a whole
+    for sheet_index, sheet_svg in enumerate(sheet_svgs):
+        filepath = os.path.join(
+            output_dir, "{}__sheet_{}{}".format(image_filename, sheet_index, file_extension)
+        )
+        progress_page_started(progress_get_sheet_name(sheet_index))
+        with trace_span("sheet", index=sheet_index):
+            sheet_surface = raster_render_band(sheet_svg, raster_dpi)
+            raster_encode_tile(
+                memoryview(sheet_surface.get_data()),
+                sheet_surface.get_stride(),
+                min(sheet_surface.get_width(), tile_width),
+                min(sheet_surface.get_height(), tile_height),
+                tile_width,
+                tile_height,
+                0,
+                0,
+                raster_dpi,
+                output_format,
+                filepath,
+            )
+        progress_page_finished(progress_get_sheet_name(sheet_index), os.path.getsize(filepath))
+
+
+def get_page_indices(
+    dimensions: PageChoppingDimensions, page_template: SvgPageTemplate, blank_pages: str
+) -> list[tuple[int, int]]:
+    page_indices = [
+        (page_index_x, page_index_y)
+        for page_index_y in range(dimensions.page_count_y)
+        for page_index_x in range(dimensions.page_count_x)
+    ]
+    if blank_pages == BLANK_PAGES_SKIP:
+        page_indices = [
+            page_index
+            for page_index in page_indices
+            if page_index not in page_template.blank_page_indices
+        ]
+    return page_indices
+
+
+# NOTE: The chopping functions do not print anything themselves, as they are also used as a library
+#       through chop. Only the command line modes print the dimensions of an image.
+def print_page_chopping_dimensions(
+    dimensions: PageChoppingDimensions, page_template: SvgPageTemplate
+):
+    image_unit = dimensions.image_unit
+    print(
+        "SVG image dimensions: {}{} x {}{} ".format(
+            dimensions.image_width, image_unit, dimensions.image_height, image_unit
+        )
+    )
+    # NOTE: The view box was validated to start at zero and to have the size of the image
+    print(
+        "SVG view box dimensions: {}{} x {}{} {}{} x {}{}".format(
+            0.0,
+            image_unit,
+            0.0,
+            image_unit,
+            dimensions.image_width,
+            image_unit,
+            dimensions.image_height,
+            image_unit,
+        )
+    )
+    print("Resulting page count: {}x{}".format(dimensions.page_count_x, dimensions.page_count_y))
+    print("Last column width: {}{}".format(dimensions.last_column_width, image_unit))
+    print("Last row height: {}{}".format(dimensions.last_row_height, image_unit))
+    if len(page_template.blank_page_indices) > 0:
+        print("Blank pages: {}".format(len(page_template.blank_page_indices)))
+
+
+def pdf_write_overview_and_pages(
+    filepath_overview_and_pages_pdf: str, page_count: int, output_dir: str, image_filename: str
+):
+    import_rendering_dependencies()
+    with open(filepath_overview_and_pages_pdf, "rb") as pdf_file:
+        pdf_reader = PdfFileReader(pdf_file)
+        pdf_write_page_range(
+            pdf_reader, 0, 1, os.path.join(output_dir, image_filename + "__overview.pdf")
+        )
+        pdf_write_page_range(
+            pdf_reader,
+            1,
+            page_count,
+            os.path.join(output_dir, image_filename + "__pages.pdf"),
+        )
+
+
+def process_image(
+    image_filepath: str,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    keep_intermediates: bool = False,
+    job_count: int = 1,
+    output_root: str = "",
+    page_cache: PageCache = None,
+    image_dpi: float = None,
+    blank_pages: str = BLANK_PAGES_KEEP,
+    output_format: str = OUTPUT_FORMAT_PDF,
+    raster_dpi: float = RASTER_DPI_DEFAULT,
+    page_layout: str = PAGE_LAYOUT_FIXED,
+    clip_bleed_mm: float = None,
+    number_precision: int = SVG_NUMBER_PRECISION_DEFAULT,
+    impose_slivers: bool = False,
+    progress_callback: callable = None,
+) -> PageChoppingDimensions:
+    with trace_span("process_image", image=image_filepath), progress_reporting(
+        progress_callback, image_filepath
+    ):
+        print("==============\nProcessing image file: '{}'".format(image_filepath))
+        if page_cache != None and output_format != OUTPUT_FORMAT_PDF:
+            raise InvalidOptionsError("The page cache only supports PDF output")
+        layout = layout_resolve(
+            image_filepath,
+            page_inner_width_mm,
+            page_inner_height_mm,
+            page_border_mm,
+            page_layout,
+            blank_pages,
+            impose_slivers,
+        )
+        if layout != None:
+            layout_print(layout)
+            page_inner_width_mm = layout.page_inner_width_mm
+            page_inner_height_mm = layout.page_inner_height_mm
+            page_border_mm = layout.page_border_mm
+        progress_stage(PROGRESS_STAGE_CREATE_PAGE_TEMPLATE)
+        with trace_span("create_page_template"):
+            dimensions, page_template = svg_create_page_template(
+                image_filepath,
+                page_inner_width_mm,
+                page_inner_height_mm,
+                page_border_mm,
+                enable_debug_color=False,
+                blank_pages=blank_pages,
+                clip_bleed_mm=clip_bleed_mm,
+                number_precision=number_precision,
+            )
+        print_page_chopping_dimensions(dimensions, page_template)
+
+        image_filename = os.path.splitext(os.path.basename(image_filepath))[0]
+        output_dir = os.path.join(output_root, image_filename)
+        intermediate_dir = os.path.join(output_dir, "intermediates")
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.mkdir(output_dir)
+        if keep_intermediates:
+            os.mkdir(intermediate_dir)
+
+        progress_stage(PROGRESS_STAGE_CREATE_OVERVIEW)
+        with trace_span("create_overview"):
+            overview_svg = svg_create_overview(page_template)
+        page_indices = get_page_indices(dimensions, page_template, blank_pages)
+        sheet_svgs = []
+        if impose_slivers:
+            progress_stage(PROGRESS_STAGE_IMPOSE_SLIVER_PAGES)
+            with trace_span("impose_sliver_pages"):
+                page_indices, sheets = impose_sliver_pages(dimensions, page_template, page_indices)
+                sheet_svgs = [
+                    svg_create_sheet(page_template, dimensions, sheet) for sheet in sheets
+                ]
+            print(
+                "Imposed sliver pages: {} onto {} sheets".format(
+                    sum(len(sheet.placements) for sheet in sheets), len(sheets)
+                )
+            )
+
+        # NOTE: Intermediate files are only written for debugging purposes
+        if keep_intermediates:
+            progress_stage(PROGRESS_STAGE_WRITE_INTERMEDIATES)
+            filepath_overview_svg = os.path.join(
+                intermediate_dir, image_filename + "__overview.svg"
+            )
+            with open(filepath_overview_svg, "wb") as svg_file:
+                svg_file.write(overview_svg)
+            for page_index_x, page_index_y in page_indices:
+                filepath_svg = os.path.join(
+                    intermediate_dir,
+                    "{}__{}x{}.svg".format(image_filename, page_index_x, page_index_y),
+                )
+                with open(filepath_svg, "wb") as svg_file:
+                    svg_file.write(
+                        svg_create_page(page_template, dimensions, page_index_x, page_index_y)
+                    )
+            for sheet_index, sheet_svg in enumerate(sheet_svgs):
+                filepath_svg = os.path.join(
+                    intermediate_dir, "{}__sheet_{}.svg".format(image_filename, sheet_index)
+                )
+                with open(filepath_svg, "wb") as svg_file:
+                    svg_file.write(sheet_svg)
+
+        if output_format != OUTPUT_FORMAT_PDF:
+            progress_start_rendering(1 + len(page_indices) + len(sheet_svgs))
+            raster_write_pages(
+                page_template,
+                dimensions,
+                overview_svg,
+                page_indices,
+                sheet_svgs,
+                output_format,
+                raster_dpi,
+                job_count,
+                output_dir,
+                image_filename,
+            )
+            progress_done(output_dir)
+            return dimensions
+
+        # NOTE: The overview and all pages are rendered in order into one multi-page PDF. The other
+        #       deliverables are just page ranges of it. When rendering in parallel every worker
+        #       renders its own multi-page PDFs, which are then merged once in page order.
+        filepath_overview_and_pages_pdf = os.path.join(
+            output_dir, image_filename + "__overview_and_pages.pdf"
+        )
+        progress_start_rendering(1 + len(page_indices) + len(sheet_svgs))
+        with open(filepath_overview_and_pages_pdf, "wb") as pdf_file:
+            if page_cache != None:
+                pdf_render_pages_cached(
+                    page_template,
+                    dimensions,
+                    overview_svg,
+                    page_indices,
+                    sheet_svgs,
+                    job_count,
+                    image_dpi,
+                    page_cache,
+                    pdf_file,
+                )
+            elif job_count > 1:
+                pdf_render_pages_parallel(
+                    page_template,
+                    dimensions,
+                    overview_svg,
+                    page_indices,
+                    sheet_svgs,
+                    job_count,
+                    image_dpi,
+                    pdf_file,
+                )
+            else:
+                # NOTE: cairo writes every page out to the file as soon as it is finished
+                pdf_document_writer = PdfDocumentWriter(pdf_file, image_dpi)
+                progress_page_started("overview")
+                with trace_span("overview"):
+                    pdf_document_writer.add_page(overview_svg)
+                progress_page_finished("overview", pdf_file.tell())
+                poster_tree = pdf_parse_poster(page_template, dimensions)
+                for page_index_x, page_index_y in page_indices:
+                    page_name = progress_get_page_name(page_index_x, page_index_y)
+                    progress_page_started(page_name)
+                    output_start = pdf_file.tell()
+                    with trace_span("page", x=page_index_x, y=page_index_y):
+                        pdf_document_writer.add_poster_page(
+                            poster_tree, page_template, dimensions, page_index_x, page_index_y
+                        )
+                    progress_page_finished(page_name, pdf_file.tell() - output_start)
+                for sheet_index, sheet_svg in enumerate(sheet_svgs):
+                    sheet_name = progress_get_sheet_name(sheet_index)
+                    progress_page_started(sheet_name)
+                    output_start = pdf_file.tell()
+                    with trace_span("sheet", index=sheet_index):
+                        pdf_document_writer.add_page(sheet_svg)
+                    progress_page_finished(sheet_name, pdf_file.tell() - output_start)
+                progress_stage(PROGRESS_STAGE_WRITE)
+                pdf_document_writer.finish()
+
+        pdf_write_overview_and_pages(
+            filepath_overview_and_pages_pdf,
+            len(page_indices) + len(sheet_svgs),
+            output_dir,
+            image_filename,
+        )
+
+        progress_done(output_dir)
+        return dimensions
+
+
+# NOTE: Library interface: Chops an SVG image given as bytes into PDFs in memory. Several images can
+#       be chopped concurrently from different threads, which still share some state:
+#       - The elements of every image are spilled into its own temporary file, see SvgElementStore.
+#       - The XML backend in g_xml_backend is chosen for the whole process.
+#       - A tracer in g_tracer records the spans of all threads, each thread nests its own spans.
+#       - The shared image handler replaces the image tag of cairosvg for the whole process, it
+#         defers to the one of cairosvg for surfaces that do not draw into a PdfDocumentWriter.
+#       All errors are raised as subclasses of ChoppingError.
+class ChopOptions:
+    page_inner_width_mm: float
+    page_inner_height_mm: float
+    page_border_mm: float
+    blank_pages: str
+    image_dpi: float
+    include_overview: bool
+    number_precision: int
+    page_layout: str
+
+    def __init__(
+        self,
+        page_inner_width_mm: float = PAGE_INNER_WIDTH_MM,
+        page_inner_height_mm: float = PAGE_INNER_HEIGHT_MM,
+        page_border_mm: float = PAGE_BORDER_MM,
+        blank_pages: str = BLANK_PAGES_KEEP,
+        image_dpi: float = None,
+        include_overview: bool = True,
+        number_precision: int = SVG_NUMBER_PRECISION_DEFAULT,
+        page_layout: str = PAGE_LAYOUT_FIXED,
+    ):
+        self.page_inner_width_mm = page_inner_width_mm
+        self.page_inner_height_mm = page_inner_height_mm
+        self.page_border_mm = page_border_mm
+        self.blank_pages = blank_pages
+        self.image_dpi = image_dpi
+        self.include_overview = include_overview
+        self.number_precision = number_precision
+        self.page_layout = page_layout
+
+    def validate(self):
+        if not (self.page_inner_width_mm > 0.0 and self.page_inner_height_mm > 0.0):
+            raise InvalidOptionsError("The page size must be positive")
+        if not (self.page_border_mm >= 0.0):
+            raise InvalidOptionsError("The page border must not be negative")
+        if self.blank_pages not in BLANK_PAGES_MODES:
+            raise InvalidOptionsError(
+                "The blank pages mode must be one of: {}".format(", ".join(BLANK_PAGES_MODES))
+            )
+        if self.image_dpi != None and not (self.image_dpi > 0.0):
+            raise InvalidOptionsError("The image DPI must be positive")
+        if not (
+            isinstance(self.number_precision, int)
+            and self.number_precision >= SVG_NUMBER_PRECISION_MIN
+        ):
+            raise InvalidOptionsError(
+                "The number precision must be an integer of at least {}".format(
+                    SVG_NUMBER_PRECISION_MIN
+                )
+            )
+        if self.page_layout not in PAGE_LAYOUTS:
+            raise InvalidOptionsError(
+                "The page layout must be one of: {}".format(", ".join(PAGE_LAYOUTS))
+            )
+
+
+class ChopResult:
+    page_count_x: int
+    page_count_y: int
+    page_indices: list[tuple[int, int]]
+    blank_page_indices: list[tuple[int, int]]
+    overview_pdf: bytes
+    pages_pdf: bytes
+    page_layout: PageLayout
+
+    def __init__(
+        self,
+        page_count_x: int,
+        page_count_y: int,
+        page_indices: list[tuple[int, int]],
+        blank_page_indices: list[tuple[int, int]],
+        overview_pdf: bytes,
+        pages_pdf: bytes,
+        page_layout: PageLayout,
+    ):
+        self.page_count_x = page_count_x
+        self.page_count_y = page_count_y
+        self.page_indices = page_indices
+        self.blank_page_indices = blank_page_indices
+        self.overview_pdf = overview_pdf
+        self.pages_pdf = pages_pdf
+        self.page_layout = page_layout
+
+
+@contextlib.contextmanager
+def chop_raise_render_errors():
+    try:
+        yield
+    except ChoppingError:
+        raise
+    except Exception as error:
+        raise RenderError("{}: {}".format(type(error).__name__, error)) from error
+
+
+# NOTE: The layout is None for the fixed layout
+def chop_create_page_template(
+    svg: bytes, options: ChopOptions
+) -> tuple[PageChoppingDimensions, SvgPageTemplate, list[tuple[int, int]], PageLayout]:
+    options.validate()
+    page_inner_width_mm = options.page_inner_width_mm
+    page_inner_height_mm = options.page_inner_height_mm
+    page_border_mm = options.page_border_mm
+    try:
+        layout = layout_resolve(
+            io.BytesIO(svg),
+            page_inner_width_mm,
+            page_inner_height_mm,
+            page_border_mm,
+            options.page_layout,
+            options.blank_pages,
+            False,
+        )
+        if layout != None:
+            page_inner_width_mm = layout.page_inner_width_mm
+            page_inner_height_mm = layout.page_inner_height_mm
+            page_border_mm = layout.page_border_mm
+        dimensions, page_template = svg_create_page_template(
+            io.BytesIO(svg),
+            page_inner_width_mm,
+            page_inner_height_mm,
+            page_border_mm,
+            enable_debug_color=False,
+            blank_pages=options.blank_pages,
+            number_precision=options.number_precision,
+        )
+    except ElementTree.ParseError as error:
+        raise InvalidSvgError("Input file is not a valid XML document: {}".format(error)) from error
+    except ValueError as error:
+        raise InvalidSvgError("Input image has an invalid attribute: {}".format(error)) from error
+    page_indices = get_page_indices(dimensions, page_template, options.blank_pages)
+    return dimensions, page_template, page_indices, layout
+
+
+def chop(svg: bytes, options: ChopOptions = None) -> ChopResult:
+    if options == None:
+        options = ChopOptions()
+    dimensions, page_template, page_indices, layout = chop_create_page_template(svg, options)
+    with chop_raise_render_errors():
+        overview_pdf = None
+        if options.include_overview:
+            overview_pdf = pdf_render_svg(svg_create_overview(page_template), options.image_dpi)
+        pages_pdf = None
+        if len(page_indices) > 0:
+            pages_pdf = pdf_render_pages(page_template, dimensions, page_indices, options.image_dpi)
+    return ChopResult(
+        dimensions.page_count_x,
+        dimensions.page_count_y,
+        page_indices,
+        sorted(page_template.blank_page_indices),
+        overview_pdf,
+        pages_pdf,
+        layout,
+    )
+
+
+# NOTE: Yields every page as its own PDF as soon as it is rendered, the poster is only parsed once
+def chop_pages(svg: bytes, options: ChopOptions = None):
+    if options == None:
+        options = ChopOptions()
+    dimensions, page_template, page_indices, _ = chop_create_page_template(svg, options)
+    with chop_raise_render_errors():
+        poster_tree = pdf_parse_poster(page_template, dimensions)
+        for page_index_x, page_index_y in page_indices:
+            output = io.BytesIO()
+            pdf_document_writer = PdfDocumentWriter(output, options.image_dpi)
+            pdf_document_writer.add_poster_page(
+                poster_tree, page_template, dimensions, page_index_x, page_index_y
+            )
+            pdf_document_writer.finish()
+            yield (page_index_x, page_index_y), output.getvalue()
+
+
+def batch_collect_image_filepaths(input_patterns: list[str]) -> list[str]:
+    result = []
+    seen_image_filepaths = set()
+    for input_pattern in input_patterns:
+        if os.path.isdir(input_pattern):
+            input_pattern = os.path.join(input_pattern, "*.svg")
+        for image_filepath in sorted(glob.glob(input_pattern, recursive=True)):
+            absolute_image_filepath = os.path.normcase(os.path.abspath(image_filepath))
+            if (
+                os.path.isfile(image_filepath)
+                and absolute_image_filepath not in seen_image_filepaths
+            ):
+                seen_image_filepaths.add(absolute_image_filepath)
+                result.append(image_filepath)
+    return result
+
+
+# NOTE: The output directories mirror the directories of the images relative to their common
+#       directory, so that images with the same name in different directories do not overwrite each
+#       other. Images that are all in one directory get their output directories right in the
+#       output root.
+def batch_get_image_output_roots(image_filepaths: list[str], output_root: str) -> list[str]:
+    image_dirs = [
+        os.path.dirname(os.path.abspath(image_filepath)) for image_filepath in image_filepaths
+    ]
+    try:
+        common_dir = os.path.commonpath(image_dirs)
+    except ValueError:
+        # NOTE: The images are on different drives on Windows
+        common_dir = None
+    result = []
+    for image_dir in image_dirs:
+        if common_dir == None:
+            drive, path = os.path.splitdrive(image_dir)
+            relative_dir = os.path.join(drive.strip(":\\/"), path.lstrip("\\/"))
+        else:
+            relative_dir = os.path.relpath(image_dir, common_dir)
+        if relative_dir == os.curdir:
+            result.append(output_root)
+        else:
+            result.append(os.path.join(output_root, relative_dir))
+    return result
+
+
+def batch_process_image(
+    image_filepath: str,
+    output_root: str,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    keep_intermediates: bool,
+    page_cache: PageCache,
+    image_dpi: float,
+    blank_pages: str,
+    output_format: str,
+    raster_dpi: float,
+    page_layout: str,
+    clip_bleed_mm: float,
+    number_precision: int,
+    impose_slivers: bool,
+    progress: bool,
+) -> dict:
+    start_time = time.perf_counter()
+    result = {"input": image_filepath}
+    progress_callback = None
+    if progress:
+        progress_callback = progress_create_json_printer(sys.stdout)
+    try:
+        os.makedirs(output_root, exist_ok=True)
+        # NOTE: stdout is reserved for the machine-readable results and progress events
+        with contextlib.redirect_stdout(sys.stderr):
+            dimensions = process_image(
+                image_filepath,
+                page_inner_width_mm,
+                page_inner_height_mm,
+                page_border_mm,
+                keep_intermediates=keep_intermediates,
+                output_root=output_root,
+                page_cache=page_cache,
+                image_dpi=image_dpi,
+                blank_pages=blank_pages,
+                output_format=output_format,
+                raster_dpi=raster_dpi,
+                page_layout=page_layout,
+                clip_bleed_mm=clip_bleed_mm,
+                number_precision=number_precision,
+                impose_slivers=impose_slivers,
+                progress_callback=progress_callback,
+            )
+        result["status"] = "ok"
+        result["output_dir"] = os.path.join(
+            output_root, os.path.splitext(os.path.basename(image_filepath))[0]
+        )
+        result["page_count_x"] = dimensions.page_count_x
+        result["page_count_y"] = dimensions.page_count_y
+    except Exception as error:
+        result["status"] = "error"
+        result["error_type"] = type(error).__name__
+        result["error"] = str(error)
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+# NOTE: Exit codes of the batch mode
+BATCH_EXIT_SUCCESS = 0
+BATCH_EXIT_SOME_IMAGES_FAILED = 1
+BATCH_EXIT_NO_IMAGES = 2
+
+
+def batch_main(
+    input_patterns: list[str],
+    output_root: str,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    keep_intermediates: bool,
+    job_count: int,
+    page_cache: PageCache,
+    image_dpi: float,
+    blank_pages: str,
+    output_format: str,
+    raster_dpi: float,
+    page_layout: str,
+    clip_bleed_mm: float,
+    number_precision: int,
+    impose_slivers: bool,
+    progress: bool,
+) -> int:
+    image_filepaths = batch_collect_image_filepaths(input_patterns)
+    if len(image_filepaths) == 0:
+        print(json.dumps({"status": "error", "error": "No SVG images found"}), flush=True)
+        return BATCH_EXIT_NO_IMAGES
+    image_output_roots = batch_get_image_output_roots(image_filepaths, output_root)
+
+    failed_count = 0
+
+    def report_results(futures):
+        nonlocal failed_count
+        for future in futures:
+            result = tracer_unpack_worker_result(future.result())
+            if result["status"] != "ok":
+                failed_count += 1
+            print(json.dumps(result), flush=True)
+
+    # NOTE: We only keep a bounded number of images queued up for the workers, so that the results
+    #       get reported while the batch is still running and huge batches do not pile up futures
+    max_pending_count = 2 * job_count
+    pending = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=job_count) as executor:
+        for image_filepath, image_output_root in zip(image_filepaths, image_output_roots):
+            if len(pending) >= max_pending_count:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                report_results(done)
+            pending.add(
+                executor.submit(
+                    tracer_run_in_worker,
+                    tracer_get_worker_settings(),
+                    batch_process_image,
+                    image_filepath,
+                    image_output_root,
+                    page_inner_width_mm,
+                    page_inner_height_mm,
+                    page_border_mm,
+                    keep_intermediates,
+                    page_cache,
+                    image_dpi,
+                    blank_pages,
+                    output_format,
+                    raster_dpi,
+                    page_layout,
+                    clip_bleed_mm,
+                    number_precision,
+                    impose_slivers,
+                    progress,
+                )
+            )
+        done, pending = concurrent.futures.wait(pending)
+        report_results(done)
+
+    if failed_count > 0:
+        return BATCH_EXIT_SOME_IMAGES_FAILED
+    return BATCH_EXIT_SUCCESS
+
+
+# NOTE: Rough factors to estimate the size of the rendered PDFs from the size of the page SVGs. cairo
+#       compresses the drawing operations, but every page also carries its own resources. These are
+#       unmeasured placeholders, they have not been fitted to any rendered PDFs yet. benchmark.py
+#       prints the fitted factors at the end of a run with rendering enabled, they should be
+#       replaced by its output.
+PLAN_PDF_BYTES_PER_SVG_BYTE = 0.5
+PLAN_PDF_BYTES_PER_PAGE = 2048
+
+
+def plan_image(
+    image_filepath: str,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    blank_pages: str,
+    page_layout: str,
+    number_precision: int,
+    impose_slivers: bool,
+) -> dict:
+    layout = layout_resolve(
+        image_filepath,
+        page_inner_width_mm,
+        page_inner_height_mm,
+        page_border_mm,
+        page_layout,
+        blank_pages,
+        impose_slivers,
+    )
+    if layout != None:
+        page_inner_width_mm = layout.page_inner_width_mm
+        page_inner_height_mm = layout.page_inner_height_mm
+        page_border_mm = layout.page_border_mm
+    dimensions, page_template = svg_create_page_template(
+        image_filepath,
+        page_inner_width_mm,
+        page_inner_height_mm,
+        page_border_mm,
+        enable_debug_color=False,
+        blank_pages=blank_pages,
+        number_precision=number_precision,
+    )
+    print_page_chopping_dimensions(dimensions, page_template)
+    page_indices = get_page_indices(dimensions, page_template, blank_pages)
+    sheets = []
+    if impose_slivers:
+        page_indices, sheets = impose_sliver_pages(dimensions, page_template, page_indices)
+
+    # NOTE: The sizes of the page SVGs are summed up from the template without creating them
+    page_template_bytes = sum(map(len, page_template.parts))
+    pages_svg_bytes = 0
+    for page_index in page_indices:
+        if page_template.blank_page != None and page_index in page_template.blank_page_indices:
+            pages_svg_bytes += len(page_template.blank_page)
+            continue
+        pages_svg_bytes += page_template_bytes
+        for element_index in page_template.page_element_indices[page_index]:
+            pages_svg_bytes += page_template.elements.get_size(element_index)
+    for sheet in sheets:
+        pages_svg_bytes += len(svg_create_sheet(page_template, dimensions, sheet))
+    overview_svg_bytes = svg_get_overview_size(page_template)
+
+    unit_to_mm = 1.0 / FACTOR_MM_TO_PX if dimensions.image_unit == "px" else 1.0
+    result = {
+        "input": image_filepath,
+        "status": "ok",
+        "image_width": dimensions.image_width,
+        "image_height": dimensions.image_height,
+        "image_unit": dimensions.image_unit,
+        "page_inner_width_mm": page_inner_width_mm,
+        "page_inner_height_mm": page_inner_height_mm,
+        "page_border_mm": page_border_mm,
+        "page_count_x": dimensions.page_count_x,
+        "page_count_y": dimensions.page_count_y,
+        "page_count": len(page_indices) + len(sheets),
+        "blank_page_count": len(page_template.blank_page_indices),
+        "sheet_count": len(sheets),
+        "imposed_page_count": sum(len(sheet.placements) for sheet in sheets),
+        "last_column_width_mm": round(dimensions.last_column_width * unit_to_mm, 3),
+        "last_row_height_mm": round(dimensions.last_row_height * unit_to_mm, 3),
+        "estimated_overview_pdf_bytes": round(
+            overview_svg_bytes * PLAN_PDF_BYTES_PER_SVG_BYTE + PLAN_PDF_BYTES_PER_PAGE
+        ),
+        "estimated_pages_pdf_bytes": round(
+            pages_svg_bytes * PLAN_PDF_BYTES_PER_SVG_BYTE
+            + (len(page_indices) + len(sheets)) * PLAN_PDF_BYTES_PER_PAGE
+        ),
+    }
+    if layout != None:
+        result["paper"] = layout.paper
+        result["orientation"] = layout.orientation
+        # NOTE: Only a hint, the chopping functions do not print a rotated last strip yet
+        result["rotated_last_strip"] = layout.rotated_last_strip
+        result["rotated_last_strip_page_count"] = layout.rotated_last_strip_page_count
+    return result
+
+
+def plan_main(
+    input_patterns: list[str],
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    blank_pages: str,
+    page_layout: str,
+    number_precision: int,
+    impose_slivers: bool,
+) -> int:
+    if len(input_patterns) > 0:
+        image_filepaths = batch_collect_image_filepaths(input_patterns)
+    else:
+        image_filepaths = [each for each in os.listdir("./") if each.endswith(".svg")]
+    if len(image_filepaths) == 0:
+        print(json.dumps({"status": "error", "error": "No SVG images found"}), flush=True)
+        return BATCH_EXIT_NO_IMAGES
+
+    failed_count = 0
+    for image_filepath in image_filepaths:
+        try:
+            # NOTE: stdout is reserved for the machine-readable results
+            with contextlib.redirect_stdout(sys.stderr):
+                result = plan_image(
+                    image_filepath,
+                    page_inner_width_mm,
+                    page_inner_height_mm,
+                    page_border_mm,
+                    blank_pages,
+                    page_layout,
+                    number_precision,
+                    impose_slivers,
+                )
+        except Exception as error:
+            failed_count += 1
+            result = {
+                "input": image_filepath,
+                "status": "error",
+                "error_type": type(error).__name__,
+                "error": str(error),
+            }
+        print(json.dumps(result), flush=True)
+
+    if failed_count > 0:
+        return BATCH_EXIT_SOME_IMAGES_FAILED
+    return BATCH_EXIT_SUCCESS
+
+
+class WatchedImage:
+    image_filepath: str
+    output_dir: str
+    dimensions: PageChoppingDimensions
+    page_template: SvgPageTemplate
+    element_keys: list[bytes]
+    overview_key: bytes
+    overview_document: bytes
+    page_keys: dict[tuple[int, int], bytes]
+    page_documents: dict[tuple[int, int], bytes]
+    sheet_documents: dict[bytes, bytes]
+
+    def __init__(self, image_filepath: str, output_root: str):
+        self.image_filepath = image_filepath
+        self.output_dir = os.path.join(
+            output_root, os.path.splitext(os.path.basename(image_filepath))[0]
+        )
+        self.dimensions = None
+        self.page_template = None
+        self.element_keys = []
+        self.overview_key = None
+        self.overview_document = None
+        self.page_keys = {}
+        self.page_documents = {}
+        self.sheet_documents = {}
+
+
+def watch_get_page_key(
+    template_key: bytes,
+    element_keys: list[bytes],
+    page_template: SvgPageTemplate,
+    page_index_x: int,
+    page_index_y: int,
+) -> bytes:
+    hasher = hashlib.sha256(template_key)
+    hasher.update("{}x{}".format(page_index_x, page_index_y).encode())
+    for element_index in page_template.page_element_indices[(page_index_x, page_index_y)]:
+        hasher.update(element_keys[element_index])
+    return hasher.digest()
+
+
+def watch_update_image(
+    watched_image: WatchedImage,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    image_dpi: float,
+    blank_pages: str,
+    page_layout: str,
+    clip_bleed_mm: float,
+    number_precision: int,
+    impose_slivers: bool,
+):
+    start_time = time.perf_counter()
+    print("==============\nProcessing image file: '{}'".format(watched_image.image_filepath))
+    layout = layout_resolve(
+        watched_image.image_filepath,
+        page_inner_width_mm,
+        page_inner_height_mm,
+        page_border_mm,
+        page_layout,
+        blank_pages,
+        impose_slivers,
+    )
+    if layout != None:
+        layout_print(layout)
+        page_inner_width_mm = layout.page_inner_width_mm
+        page_inner_height_mm = layout.page_inner_height_mm
+        page_border_mm = layout.page_border_mm
+    dimensions, page_template = svg_create_page_template(
+        watched_image.image_filepath,
+        page_inner_width_mm,
+        page_inner_height_mm,
+        page_border_mm,
+        enable_debug_color=False,
+        blank_pages=blank_pages,
+        clip_bleed_mm=clip_bleed_mm,
+        number_precision=number_precision,
+    )
+    print_page_chopping_dimensions(dimensions, page_template)
+
+    # NOTE: Pages are compared by the top-level elements that intersect them. Everything else a
+    #       page depends on is part of the template parts and the dimensions.
+    element_keys = [hashlib.sha256(element).digest() for element in page_template.elements]
+    template_key = hashlib.sha256(
+        b"".join(page_template.parts) + repr(sorted(vars(dimensions).items())).encode()
+    ).digest()
+    previous_element_keys = set(watched_image.element_keys)
+    changed_element_count = sum(
+        1 for element_key in element_keys if element_key not in previous_element_keys
+    )
+
+    page_indices = get_page_indices(dimensions, page_template, blank_pages)
+    sheets = []
+    if impose_slivers:
+        page_indices, sheets = impose_sliver_pages(dimensions, page_template, page_indices)
+    page_keys = {}
+    page_documents = {}
+    rendered_page_count = 0
+    for page_index_x, page_index_y in page_indices:
+        page_index = (page_index_x, page_index_y)
+        page_key = watch_get_page_key(
+            template_key, element_keys, page_template, page_index_x, page_index_y
+        )
+        page_keys[page_index] = page_key
+        if watched_image.page_keys.get(page_index) == page_key:
+            page_documents[page_index] = watched_image.page_documents[page_index]
+        else:
+            svg = svg_create_page(page_template, dimensions, page_index_x, page_index_y)
+            page_documents[page_index] = pdf_render_svg(svg, image_dpi)
+            rendered_page_count += 1
+
+    # NOTE: Sheets are compared by their whole SVG, they are few and small
+    sheet_keys = []
+    sheet_documents = {}
+    for sheet in sheets:
+        svg = svg_create_sheet(page_template, dimensions, sheet)
+        sheet_key = hashlib.sha256(svg).digest()
+        sheet_keys.append(sheet_key)
+        if sheet_key in watched_image.sheet_documents:
+            sheet_documents[sheet_key] = watched_image.sheet_documents[sheet_key]
+        elif sheet_key not in sheet_documents:
+            sheet_documents[sheet_key] = pdf_render_svg(svg, image_dpi)
+            rendered_page_count += 1
+
+    overview_svg = svg_create_overview(page_template)
+    overview_key = hashlib.sha256(overview_svg).digest()
+    if overview_key != watched_image.overview_key:
+        watched_image.overview_document = pdf_render_svg(overview_svg, image_dpi)
+
+    watched_image.dimensions = dimensions
+    watched_image.page_template = page_template
+    watched_image.element_keys = element_keys
+    watched_image.overview_key = overview_key
+    watched_image.page_keys = page_keys
+    watched_image.page_documents = page_documents
+    watched_image.sheet_documents = sheet_documents
+
+    image_filename = os.path.splitext(os.path.basename(watched_image.image_filepath))[0]
+    os.makedirs(watched_image.output_dir, exist_ok=True)
+    filepath_overview_and_pages_pdf = os.path.join(
+        watched_image.output_dir, image_filename + "__overview_and_pages.pdf"
+    )
+    with open(filepath_overview_and_pages_pdf, "wb") as pdf_file:
+        pdf_write_documents(
+            [watched_image.overview_document]
+            + [page_documents[page_index] for page_index in page_indices]
+            + [sheet_documents[sheet_key] for sheet_key in sheet_keys],
+            pdf_file,
+        )
+    pdf_write_overview_and_pages(
+        filepath_overview_and_pages_pdf,
+        len(page_indices) + len(sheet_keys),
+        watched_image.output_dir,
+        image_filename,
+    )
+    print(
+        "Changed elements: {} of {}, rendered pages: {} of {}, took {:.2f}s".format(
+            changed_element_count,
+            len(element_keys),
+            rendered_page_count,
+            len(page_indices) + len(sheet_keys),
+            time.perf_counter() - start_time,
+        )
+    )
+
+
+def watch_main(
+    input_patterns: list[str],
+    output_root: str,
+    page_inner_width_mm: float,
+    page_inner_height_mm: float,
+    page_border_mm: float,
+    image_dpi: float,
+    blank_pages: str,
+    poll_interval: float,
+    page_layout: str,
+    clip_bleed_mm: float,
+    number_precision: int,
+    impose_slivers: bool,
+):
+    # NOTE: The images are polled, as the standard library offers no portable file notifications.
+    #       An image is only processed once its size and modification time stayed the same for one
+    #       poll interval, so that we do not read it while the editor is still writing it.
+    watched_images = {}
+    processed_modifications = {}
+    seen_modifications = {}
+    print("Watching for changes, press Ctrl+C to stop")
+    while True:
+        if len(input_patterns) > 0:
+            image_filepaths = batch_collect_image_filepaths(input_patterns)
+        else:
+            image_filepaths = [each for each in os.listdir("./") if each.endswith(".svg")]
+
+        for image_filepath in image_filepaths:
+            try:
+                stat = os.stat(image_filepath)
+            except OSError:
+                continue
+            modification = (stat.st_mtime_ns, stat.st_size)
+            previous_modification = seen_modifications.get(image_filepath)
+            seen_modifications[image_filepath] = modification
+            if modification != previous_modification:
+                continue
+            if processed_modifications.get(image_filepath) == modification:
+                continue
+            processed_modifications[image_filepath] = modification
+
+            if image_filepath not in watched_images:
+                watched_images[image_filepath] = WatchedImage(image_filepath, output_root)
+            try:
+                watch_update_image(
+                    watched_images[image_filepath],
+                    page_inner_width_mm,
+                    page_inner_height_mm,
+                    page_border_mm,
+                    image_dpi,
+                    blank_pages,
+                    page_layout,
+                    clip_bleed_mm,
+                    number_precision,
+                    impose_slivers,
+                )
+            except Exception as error:
+                # NOTE: A broken intermediate state of the image must not end the session
+                print("Error processing '{}': {}".format(image_filepath, error), file=sys.stderr)
+        time.sleep(poll_interval)
+
+
+# NOTE: Chopping service: A long-lived local HTTP server that queues uploaded SVG images as jobs
+#       and renders them on a pool of worker processes, which are started once and then stay warm.
+#       The workers stream the PDF back in chunks as the pages complete.
+#
+#       POST /jobs            SVG image as request body, options as query parameters
+#       GET  /jobs/<id>       job status
+#       GET  /jobs/<id>/pdf   merged PDF of the overview and all pages, streamed while rendering
+#       GET  /metrics         queue depth, throughput and latencies
+SERVICE_JOB_QUEUED = "queued"
+SERVICE_JOB_RUNNING = "running"
+SERVICE_JOB_DONE = "done"
+SERVICE_JOB_FAILED = "failed"
+
+SERVICE_EVENT_ACCEPTED = "accepted"
+SERVICE_EVENT_STARTED = "started"
+SERVICE_EVENT_CHUNK = "chunk"
+SERVICE_EVENT_PAGE = "page"
+SERVICE_EVENT_DONE = "done"
+SERVICE_EVENT_FAILED = "failed"
+
+SERVICE_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+SERVICE_MAX_FINISHED_JOBS = 100
+SERVICE_LATENCY_WINDOW_JOBS = 200
+SERVICE_THROUGHPUT_WINDOW_SECONDS = 60.0
+SERVICE_WORKER_CHECK_INTERVAL_SECONDS = 1.0
+# NOTE: A PDF download gives up if its job has not sent anything for this long
+SERVICE_STALL_TIMEOUT_SECONDS = 600.0
+# NOTE: The PDF of a finished job is kept until it was downloaded once, but at most for the time to
+#       live and only as long as all kept PDFs fit into the budget
+SERVICE_FINISHED_PDF_TTL_SECONDS = 3600.0
+SERVICE_FINISHED_PDF_BUDGET_BYTES = 1024 * 1024 * 1024
+
+
+class ServiceJob:
+    job_id: str
+    options: ChopOptions
+    status: str
+    error: str
+    submit_time: float
+    start_time: float
+    finish_time: float
+    page_count: int
+    pages_done: int
+    chunks: list[bytes]
+    byte_count: int
+    is_pdf_released: bool
+    worker_pid: int
+    last_event_time: float
+
+    def __init__(self, job_id: str, options: ChopOptions):
+        self.job_id = job_id
+        self.options = options
+        self.status = SERVICE_JOB_QUEUED
+        self.error = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.finish_time = None
+        self.page_count = None
+        self.pages_done = 0
+        self.chunks = []
+        self.byte_count = 0
+        self.is_pdf_released = False
+        self.worker_pid = None
+        self.last_event_time = self.submit_time
+
+    def is_finished(self) -> bool:
+        return self.status in (SERVICE_JOB_DONE, SERVICE_JOB_FAILED)
+
+    def get_status(self) -> dict:
+        result = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "page_count": self.page_count,
+            "pages_done": self.pages_done,
+            "bytes": self.byte_count,
+        }
+        if self.error != None:
+            result["error"] = self.error
+        if self.start_time != None:
+            result["queue_seconds"] = round(self.start_time - self.submit_time, 3)
+        if self.finish_time != None:
+            result["seconds"] = round(self.finish_time - self.submit_time, 3)
+        if self.is_pdf_released:
+            result["pdf_released"] = True
+        return result
+
+    def release_pdf(self):
+        self.chunks = []
+        self.is_pdf_released = True
+
+
+class ServicePdfStream:
+    # NOTE: cairo writes the PDF as the pages are finished, we pass on what it wrote so far after
+    #       every page
+    job_id: str
+    event_queue: multiprocessing.Queue
+    buffer: list[bytes]
+
+    def __init__(self, job_id: str, event_queue: multiprocessing.Queue):
+        self.job_id = job_id
+        self.event_queue = event_queue
+        self.buffer = []
+
+    def write(self, data: bytes) -> int:
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def send(self):
+        if len(self.buffer) > 0:
+            self.event_queue.put((self.job_id, SERVICE_EVENT_CHUNK, b"".join(self.buffer)))
+            self.buffer = []
+
+
+def service_render_job(
+    job_id: str, svg: bytes, options: ChopOptions, event_queue: multiprocessing.Queue
+):
+    dimensions, page_template, page_indices, _ = chop_create_page_template(svg, options)
+    event_queue.put((job_id, SERVICE_EVENT_STARTED, len(page_indices)))
+
+    pdf_stream = ServicePdfStream(job_id, event_queue)
+    pdf_document_writer = PdfDocumentWriter(pdf_stream, options.image_dpi)
+    if options.include_overview:
+        pdf_document_writer.add_page(svg_create_overview(page_template))
+    poster_tree = pdf_parse_poster(page_template, dimensions)
+    for page_index_x, page_index_y in page_indices:
+        pdf_document_writer.add_poster_page(
+            poster_tree, page_template, dimensions, page_index_x, page_index_y
+        )
+        pdf_stream.send()
+        event_queue.put((job_id, SERVICE_EVENT_PAGE, None))
+    pdf_document_writer.finish()
+    pdf_stream.send()
+
+
+def service_worker_main(job_queue: multiprocessing.Queue, event_queue: multiprocessing.Queue):
+    # NOTE: The workers import the renderer before the first job arrives
+    import_rendering_dependencies()
+    while True:
+        job = job_queue.get()
+        if job == None:
+            return
+        job_id, svg, options = job
+        # NOTE: Tells the service which worker runs the job, so that it can fail the job if the
+        #       worker dies
+        event_queue.put((job_id, SERVICE_EVENT_ACCEPTED, os.getpid()))
+        try:
+            # NOTE: The progress output of the chopping functions is only of interest in the log
+            with contextlib.redirect_stdout(sys.stderr):
+                service_render_job(job_id, svg, options, event_queue)
+            event_queue.put((job_id, SERVICE_EVENT_DONE, None))
+        except Exception as error:
+            event_queue.put(
+                (job_id, SERVICE_EVENT_FAILED, "{}: {}".format(type(error).__name__, error))
+            )
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    if len(values) == 0:
+        return None
+    sorted_values = sorted(values)
+    rank = max(0, math.ceil(percentile / 100.0 * len(sorted_values)) - 1)
+    return round(sorted_values[rank], 3)
+
+
+class ChoppingService:
+    default_options: ChopOptions
+    jobs: dict[str, ServiceJob]
+    condition: threading.Condition
+    process_context: multiprocessing.context.BaseContext
+    job_queue: multiprocessing.Queue
+    event_queue: multiprocessing.Queue
+    workers: list[multiprocessing.Process]
+    is_stopping: bool
+    next_job_number: int
+    start_time: float
+    latencies: list[float]
+    page_times: collections.deque[float]
+    pages_done_total: int
+    jobs_done_total: int
+    jobs_failed_total: int
+    workers_restarted_total: int
+
+    def __init__(self, default_options: ChopOptions, worker_count: int):
+        self.default_options = default_options
+        self.jobs = {}
+        self.condition = threading.Condition()
+        # NOTE: The workers are spawned instead of forked, so that a dead worker can safely be
+        #       replaced while the threads of the server are running
+        self.process_context = multiprocessing.get_context("spawn")
+        self.job_queue = self.process_context.Queue()
+        self.event_queue = self.process_context.Queue()
+        self.is_stopping = False
+        self.next_job_number = 1
+        self.start_time = time.time()
+        self.latencies = []
+        self.page_times = collections.deque()
+        self.pages_done_total = 0
+        self.jobs_done_total = 0
+        self.jobs_failed_total = 0
+        self.workers_restarted_total = 0
+
+        self.workers = [self.start_worker() for _ in range(worker_count)]
+        threading.Thread(target=self.dispatch_events, daemon=True).start()
+
+    def start_worker(self) -> multiprocessing.Process:
+        worker = self.process_context.Process(
+            target=service_worker_main, args=(self.job_queue, self.event_queue), daemon=True
+        )
+        worker.start()
+        return worker
+
+    def stop(self):
+        with self.condition:
+            self.is_stopping = True
+        for _ in self.workers:
+            self.job_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5.0)
+
+    def submit(self, svg: bytes, options: ChopOptions) -> ServiceJob:
+        with self.condition:
+            job = ServiceJob("{:08d}".format(self.next_job_number), options)
+            self.next_job_number += 1
+            self.jobs[job.job_id] = job
+            self.forget_finished_jobs()
+        self.job_queue.put((job.job_id, svg, options))
+        return job
+
+    def forget_finished_jobs(self):
+        finished_jobs = [job for job in self.jobs.values() if job.is_finished()]
+        for job in finished_jobs[: max(0, len(finished_jobs) - SERVICE_MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+    def get_job(self, job_id: str) -> ServiceJob:
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def dispatch_events(self):
+        while True:
+            try:
+                event = self.event_queue.get(timeout=SERVICE_WORKER_CHECK_INTERVAL_SECONDS)
+            except queue.Empty:
+                event = None
+            with self.condition:
+                if event != None:
+                    self.handle_event(*event)
+                self.check_workers()
+                self.release_finished_pdfs()
+                self.condition.notify_all()
+
+    def handle_event(self, job_id: str, event: str, payload):
+        job = self.jobs.get(job_id)
+        if job == None or job.is_finished():
+            return
+        now = time.time()
+        job.last_event_time = now
+        if event == SERVICE_EVENT_ACCEPTED:
+            job.worker_pid = payload
+        elif event == SERVICE_EVENT_STARTED:
+            job.status = SERVICE_JOB_RUNNING
+            job.start_time = now
+            job.page_count = payload
+        elif event == SERVICE_EVENT_CHUNK:
+            job.chunks.append(payload)
+            job.byte_count += len(payload)
+        elif event == SERVICE_EVENT_PAGE:
+            job.pages_done += 1
+            self.pages_done_total += 1
+            self.page_times.append(now)
+            self.prune_page_times(now)
+        elif event == SERVICE_EVENT_DONE:
+            job.status = SERVICE_JOB_DONE
+            job.finish_time = now
+            self.jobs_done_total += 1
+            self.latencies.append(now - job.submit_time)
+            self.latencies = self.latencies[-SERVICE_LATENCY_WINDOW_JOBS:]
+        elif event == SERVICE_EVENT_FAILED:
+            self.fail_job(job, payload)
+
+    def fail_job(self, job: ServiceJob, error: str):
+        job.status = SERVICE_JOB_FAILED
+        job.finish_time = time.time()
+        job.error = error
+        self.jobs_failed_total += 1
+
+    # NOTE: A worker that crashed or was killed never reports the end of its job. Its job is failed
+    #       and the worker is replaced. The events it sent before it died are handled first.
+    def check_workers(self):
+        if self.is_stopping:
+            return
+        for worker_index, worker in enumerate(self.workers):
+            if worker.is_alive():
+                continue
+            while True:
+                try:
+                    self.handle_event(*self.event_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for job in self.jobs.values():
+                if job.worker_pid == worker.pid and not job.is_finished():
+                    self.fail_job(
+                        job, "The worker process died with exit code {}".format(worker.exitcode)
+                    )
+            self.workers[worker_index] = self.start_worker()
+            self.workers_restarted_total += 1
+
+    def release_finished_pdfs(self):
+        now = time.time()
+        finished_jobs = sorted(
+            (job for job in self.jobs.values() if job.is_finished() and not job.is_pdf_released),
+            key=lambda job: job.finish_time,
+        )
+        kept_bytes = sum(job.byte_count for job in finished_jobs)
+        for job in finished_jobs:
+            if (
+                now - job.finish_time > SERVICE_FINISHED_PDF_TTL_SECONDS
+                or kept_bytes > SERVICE_FINISHED_PDF_BUDGET_BYTES
+            ):
+                kept_bytes -= job.byte_count
+                job.release_pdf()
+
+    def prune_page_times(self, now: float):
+        window_start = now - SERVICE_THROUGHPUT_WINDOW_SECONDS
+        while len(self.page_times) > 0 and self.page_times[0] < window_start:
+            self.page_times.popleft()
+
+    # NOTE: Yields the chunks of the PDF of a job as they arrive. Returns early if the job failed,
+    #       which can be told apart by its status, or if the job stalled.
+    def iterate_pdf_chunks(self, job: ServiceJob):
+        chunk_index = 0
+        while True:
+            with self.condition:
+                while chunk_index == len(job.chunks) and not job.is_finished():
+                    if time.time() - job.last_event_time > SERVICE_STALL_TIMEOUT_SECONDS:
+                        return
+                    self.condition.wait(timeout=SERVICE_WORKER_CHECK_INTERVAL_SECONDS)
+                chunks = job.chunks[chunk_index:]
+                is_finished = job.is_finished()
+            for chunk in chunks:
+                yield chunk
+            chunk_index += len(chunks)
+            if is_finished and chunk_index == len(job.chunks):
+                return
+
+    def get_metrics(self) -> dict:
+        with self.condition:
+            now = time.time()
+            self.prune_page_times(now)
+            window_seconds = min(SERVICE_THROUGHPUT_WINDOW_SECONDS, now - self.start_time)
+            status_counts = {
+                status: 0
+                for status in [
+                    SERVICE_JOB_QUEUED,
+                    SERVICE_JOB_RUNNING,
+                    SERVICE_JOB_DONE,
+                    SERVICE_JOB_FAILED,
+                ]
+            }
+            for job in self.jobs.values():
+                status_counts[job.status] += 1
+            latencies = list(self.latencies)
+            return {
+                "workers": len(self.workers),
+                "workers_alive": sum(1 for worker in self.workers if worker.is_alive()),
+                "workers_restarted_total": self.workers_restarted_total,
+                "uptime_seconds": round(now - self.start_time, 3),
+                "queue_depth": status_counts[SERVICE_JOB_QUEUED],
+                "jobs_running": status_counts[SERVICE_JOB_RUNNING],
+                "jobs_done_total": self.jobs_done_total,
+                "jobs_failed_total": self.jobs_failed_total,
+                "pages_done_total": self.pages_done_total,
+                "pages_per_second": round(len(self.page_times) / max(window_seconds, 1.0), 3),
+                "latency_p50_seconds": get_percentile(latencies, 50.0),
+                "latency_p95_seconds": get_percentile(latencies, 95.0),
+            }
+
+
+class ServiceRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ToniToniChoppi"
+
+    def send_json(self, status_code: int, value: dict):
+        body = json.dumps(value).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse_job_options(self, query: dict[str, list[str]]) -> ChopOptions:
+        default_options = self.server.service.default_options
+
+        def get_float(name: str, default_value: float) -> float:
+            if name not in query:
+                return default_value
+            try:
+                value = float(query[name][0])
+            except ValueError:
+                value = math.nan
+            if not math.isfinite(value):
+                raise InvalidOptionsError("Parameter '{}' must be a number".format(name))
+            return value
+
+        options = ChopOptions(
+            get_float("page_width_mm", default_options.page_inner_width_mm),
+            get_float("page_height_mm", default_options.page_inner_height_mm),
+            get_float("border_mm", default_options.page_border_mm),
+            query.get("blank_pages", [default_options.blank_pages])[0],
+            get_float("image_dpi", default_options.image_dpi),
+            query.get("overview", ["1"])[0] not in ("0", "false", "no"),
+            default_options.number_precision,
+            query.get("layout", [default_options.page_layout])[0],
+        )
+        options.validate()
+        return options
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            options = self.parse_job_options(urllib.parse.parse_qs(url.query))
+        except InvalidOptionsError as error:
+            self.send_json(400, {"error": str(error)})
+            return
+        try:
+            content_length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            self.send_json(400, {"error": "Invalid Content-Length"})
+            return
+        if content_length <= 0:
+            self.send_json(411, {"error": "The SVG image must be sent as request body"})
+            return
+        if content_length > SERVICE_MAX_UPLOAD_BYTES:
+            self.send_json(413, {"error": "The SVG image is too large"})
+            return
+        svg = self.rfile.read(content_length)
+
+        job = self.server.service.submit(svg, options)
+        self.send_json(202, job.get_status())
+
+    def do_GET(self):
+        service = self.server.service
+        path_parts = [part for part in urllib.parse.urlsplit(self.path).path.split("/") if part]
+        if path_parts == ["metrics"]:
+            self.send_json(200, service.get_metrics())
+            return
+        if len(path_parts) < 2 or len(path_parts) > 3 or path_parts[0] != "jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        job = service.get_job(path_parts[1])
+        if job == None:
+            self.send_json(404, {"error": "Unknown job"})
+            return
+        if len(path_parts) == 2:
+            with service.condition:
+                self.send_json(200, job.get_status())
+            return
+        if path_parts[2] != "pdf":
+            self.send_json(404, {"error": "Not found"})
+            return
+        with service.condition:
+            if job.is_pdf_released:
+                self.send_json(410, job.get_status())
+                return
+
+        # NOTE: The status line has to be sent before the first chunk, so we hold it back until
+        #       either the first chunk arrived or the job failed without writing anything
+        chunks = service.iterate_pdf_chunks(job)
+        first_chunk = next(chunks, None)
+        if first_chunk == None:
+            with service.condition:
+                self.send_json(500 if job.is_finished() else 504, job.get_status())
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in itertools.chain([first_chunk], chunks):
+            self.wfile.write("{:x}\r\n".format(len(chunk)).encode() + chunk + b"\r\n")
+            self.wfile.flush()
+        if job.status != SERVICE_JOB_DONE:
+            # NOTE: Closing without the final chunk tells the client that the PDF is incomplete
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+        # NOTE: A delivered PDF is not kept around, the client has to store it
+        with service.condition:
+            job.release_pdf()
+
+
+def service_main(
+    host: str,
+    port: int,
+    worker_count: int,
+    default_options: ChopOptions,
+):
+    service = ChoppingService(default_options, worker_count)
+    server = http.server.ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    print(
+        "Serving on http://{}:{} with {} workers, press Ctrl+C to stop".format(
+            host, server.server_address[1], worker_count
+        ),
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="ToniToniChoppi",
+        description="Chops SVG images into printable pages. Without --batch all SVG images in the "
+        "current directory are processed.",
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="SVG images, directories or glob patterns to process in batch mode",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="run headless: process the given inputs without any dialogs and print one JSON "
+        "result per image to stdout. Exits with 0 on success, 1 if any image failed and 2 if no "
+        "image was found.",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="only validate the given inputs, or all SVG images in the current directory, and print "
+        "one JSON line per image with the page grid, the size of the last column and row and the "
+        "roughly estimated size of the PDFs. Nothing is rendered. Exits like --batch.",
+    )
+    parser.add_argument(
+        "--output-root",
+        default=".",
+        help="directory in which the output directories of the images are created in batch mode. "
+        "Images from different directories keep their relative directories below it.",
+    )
+    parser.add_argument(
+        "--keep-intermediates",
+        action="store_true",
+        help="write the SVG of every single page into an 'intermediates' directory",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="render the pages in N parallel processes (0 uses one process per CPU core). In "
+        "batch mode N images are processed in parallel instead.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse the rendered PDFs of unchanged pages from previous runs by storing them in "
+        "this directory. Only supported with PDF output.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=1024.0,
+        metavar="MB",
+        help="maximum size of the page cache, the least recently used pages are evicted first",
+    )
+    parser.add_argument(
+        "--image-dpi",
+        type=float,
+        metavar="DPI",
+        help="downsample embedded raster images to this print resolution",
+    )
+    parser.add_argument(
+        "--blank-pages",
+        choices=BLANK_PAGES_MODES,
+        default=BLANK_PAGES_KEEP,
+        help="what to do with pages that only show the grid and markers: keep them, skip them and "
+        "label them as blank on the overview or print one shared empty page in their place",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=PAGE_LAYOUTS,
+        default=PAGE_LAYOUT_FIXED,
+        help="page layout: 'fixed' prints on the default A4 portrait pages, 'auto' picks the paper "
+        "(A4 or US-Letter), orientation and border that print the fewest pages for each image "
+        "before rendering it, counting skipped blank pages and imposed sliver pages",
+    )
+    parser.add_argument(
+        "--clip-geometry",
+        action="store_true",
+        help="cut paths, polylines, polygons and rects that span several pages down to the part "
+        "that lies on each page, so that big shapes are not stored and drawn in full on every page",
+    )
+    parser.add_argument(
+        "--clip-bleed",
+        type=float,
+        default=CLIP_BLEED_MM_DEFAULT,
+        metavar="MM",
+        help="how much of the clipped geometry is kept beyond the edge of each page",
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        default=SVG_NUMBER_PRECISION_DEFAULT,
+        metavar="DIGITS",
+        help="number of decimals of the coordinates written into the page SVGs, at least {}".format(
+            SVG_NUMBER_PRECISION_MIN
+        ),
+    )
+    parser.add_argument(
+        "--impose-slivers",
+        action="store_true",
+        help="pack the narrow pages of the last column and the short pages of the last row onto "
+        "shared sheets, each with a cut line and its page label, so that fewer sheets are printed",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=OUTPUT_FORMAT_PDF,
+        help="write the overview and the pages as PDFs or as one raster image each",
+    )
+    parser.add_argument(
+        "--raster-dpi",
+        type=float,
+        default=RASTER_DPI_DEFAULT,
+        metavar="DPI",
+        help="print resolution of the raster pages",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and update the output of an image whenever it changes on disk, only "
+        "re-rendering the pages whose content changed. Watches the given inputs or all SVG images "
+        "in the current directory.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=0.25,
+        metavar="SECONDS",
+        help="how often the watched images are checked for changes",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        metavar="PORT",
+        help="run a local HTTP service on PORT that chops uploaded SVG images on --jobs warm "
+        "worker processes. POST the image to /jobs (query parameters page_width_mm, "
+        "page_height_mm, border_mm, blank_pages, image_dpi, overview and layout), then poll /jobs/<id> or "
+        "stream the PDF from /jobs/<id>/pdf. Metrics are served at /metrics.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address the service listens on",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="print progress events with the current stage, every started and finished page, the "
+        "pages per second, the approximate bytes written so far and the estimated remaining time "
+        "as one JSON object per line to stdout. All other output goes to stderr.",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="measure the wall time and CPU time of every stage and page and the peak memory of the "
+        "process at their end, write them as a Chrome trace (chrome://tracing, ui.perfetto.dev) "
+        "to FILE and print a summary",
+    )
+    parser.add_argument(
+        "--trace-malloc",
+        action="store_true",
+        help="additionally trace the peak Python heap usage of every stage with tracemalloc, "
+        "which slows down the run considerably",
+    )
+    args = parser.parse_args()
+    if args.watch and args.output_format != OUTPUT_FORMAT_PDF:
+        parser.error("--watch only supports PDF output")
+    # NOTE: Watch mode renders the changed pages one by one and keeps its own page cache in memory
+    if args.watch and (args.jobs != 1 or args.cache_dir != None):
+        parser.error("--watch does not support --jobs or --cache-dir")
+    if args.cache_dir != None and args.output_format != OUTPUT_FORMAT_PDF:
+        parser.error("--cache-dir only supports PDF output")
+    if args.clip_bleed < 0.0:
+        parser.error("--clip-bleed must not be negative")
+    if args.precision < SVG_NUMBER_PRECISION_MIN:
+        parser.error("--precision must be at least {}".format(SVG_NUMBER_PRECISION_MIN))
+    if args.progress and (args.plan or args.serve != None or args.watch):
+        parser.error("--progress is not supported with --plan, --serve or --watch")
+    job_count = args.jobs if args.jobs > 0 else os.cpu_count()
+    clip_bleed_mm = args.clip_bleed if args.clip_geometry else None
+
+    if args.trace != None or args.trace_malloc:
+        global g_tracer
+        g_tracer = Tracer(enable_tracemalloc=args.trace_malloc)
+        # NOTE: Both the GUI and the batch mode leave through sys.exit
+        atexit.register(tracer_finish, args.trace)
+    page_cache = None
+    if args.cache_dir != None:
+        page_cache = PageCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+
+    if args.plan:
+        sys.exit(
+            plan_main(
+                args.inputs,
+                PAGE_INNER_WIDTH_MM,
+                PAGE_INNER_HEIGHT_MM,
+                PAGE_BORDER_MM,
+                args.blank_pages,
+                args.layout,
+                args.precision,
+                args.impose_slivers,
+            )
+        )
+
+    if args.serve != None:
+        service_main(
+            args.host,
+            args.serve,
+            job_count,
+            ChopOptions(
+                PAGE_INNER_WIDTH_MM,
+                PAGE_INNER_HEIGHT_MM,
+                PAGE_BORDER_MM,
+                args.blank_pages,
+                args.image_dpi,
+                True,
+                args.precision,
+                args.layout,
+            ),
+        )
+        sys.exit()
+
+    if args.watch:
+        try:
+            watch_main(
+                args.inputs,
+                args.output_root,
+                PAGE_INNER_WIDTH_MM,
+                PAGE_INNER_HEIGHT_MM,
+                PAGE_BORDER_MM,
+                args.image_dpi,
+                args.blank_pages,
+                args.watch_interval,
+                args.layout,
+                clip_bleed_mm,
+                args.precision,
+                args.impose_slivers,
+            )
+        except KeyboardInterrupt:
+            sys.exit()
+
+    if args.batch:
+        sys.exit(
+            batch_main(
+                args.inputs,
+                args.output_root,
+                PAGE_INNER_WIDTH_MM,
+                PAGE_INNER_HEIGHT_MM,
+                PAGE_BORDER_MM,
+                args.keep_intermediates,
+                job_count,
+                page_cache,
+                args.image_dpi,
+                args.blank_pages,
+                args.output_format,
+                args.raster_dpi,
+                args.layout,
+                clip_bleed_mm,
+                args.precision,
+                args.impose_slivers,
+                args.progress,
+            )
+        )
+
+    image_filepaths = [each for each in os.listdir("./") if each.endswith(".svg")]
+    if len(image_filepaths) == 0:
+        exit_error(
+            "Directory does not contain any SVG images. Please put at least one SVG image in the directory beside ToniToniChoppi.exe"
+        )
+
+    progress_callback = None
+    if args.progress:
+        progress_callback = progress_create_json_printer(sys.stdout)
     for image_filepath in image_filepaths:
-        process_image(image_filepath, PAGE_INNER_WIDTH_MM, PAGE_INNER_HEIGHT_MM, PAGE_BORDER_MM)
+        try:
+            # NOTE: stdout is reserved for the progress events
+            with (
+                contextlib.redirect_stdout(sys.stderr)
+                if args.progress
+                else contextlib.nullcontext()
+            ):
+                process_image(
+                    image_filepath,
+                    PAGE_INNER_WIDTH_MM,
+                    PAGE_INNER_HEIGHT_MM,
+                    PAGE_BORDER_MM,
+                    keep_intermediates=args.keep_intermediates,
+                    job_count=job_count,
+                    page_cache=page_cache,
+                    image_dpi=args.image_dpi,
+                    blank_pages=args.blank_pages,
+                    output_format=args.output_format,
+                    raster_dpi=args.raster_dpi,
+                    page_layout=args.layout,
+                    clip_bleed_mm=clip_bleed_mm,
+                    number_precision=args.precision,
+                    impose_slivers=args.impose_slivers,
+                    progress_callback=progress_callback,
+                )
+        except ChoppingError as error:
+            exit_error(str(error), image_filepath)
 
     exit_success()
 
 
-main()
+if __name__ == "__main__":
+    # NOTE: Needed for the render worker processes of the frozen Windows executable
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,36 @@
+import os
+
+import main
+
+
+def create_images(root, relative_filepaths: list[str]):
+    for relative_filepath in relative_filepaths:
+        filepath = root / relative_filepath
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_text("<svg />")
+
+
+def test_collect_image_filepaths_skips_duplicates(tmp_path):
+    create_images(tmp_path, ["a/poster.svg", "a/map.svg", "a/notes.txt"])
+    image_dir = str(tmp_path / "a")
+    assert main.batch_collect_image_filepaths(
+        [image_dir, os.path.join(image_dir, "poster.svg"), os.path.join(image_dir, ".", "*.svg")]
+    ) == [os.path.join(image_dir, "map.svg"), os.path.join(image_dir, "poster.svg")]
+
+
+def test_output_roots_of_images_in_one_directory_are_the_output_root(tmp_path):
+    image_filepaths = [str(tmp_path / "a" / "poster.svg"), str(tmp_path / "a" / "map.svg")]
+    assert main.batch_get_image_output_roots(image_filepaths, "out") == ["out", "out"]
+
+
+def test_output_roots_mirror_the_image_directories(tmp_path):
+    image_filepaths = [
+        str(tmp_path / "a" / "poster.svg"),
+        str(tmp_path / "b" / "poster.svg"),
+        str(tmp_path / "b" / "c" / "poster.svg"),
+    ]
+    assert main.batch_get_image_output_roots(image_filepaths, "out") == [
+        os.path.join("out", "a"),
+        os.path.join("out", "b"),
+        os.path.join("out", "b", "c"),
+    ]
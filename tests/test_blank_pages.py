@@ -0,0 +1,75 @@
+import io
+
+import pytest
+
+import main
+
+
+def create_page_template(svg: str, **kwargs) -> tuple:
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="300mm" height="100mm" '
+        'viewBox="0 0 300 100">{}</svg>'.format(svg)
+    )
+    return main.svg_create_page_template(io.BytesIO(svg.encode()), 100, 100, 10, **kwargs)
+
+
+def test_find_blank_pages_ignores_grid_and_marker_elements():
+    page_element_indices = {(0, 0): [0, 3], (1, 0): [2, 3], (2, 0): []}
+    assert main.svg_find_blank_pages(page_element_indices, 2) == {(1, 0), (2, 0)}
+
+
+def test_blank_pages_are_kept_by_default():
+    dimensions, page_template = create_page_template('<rect width="50" height="50" />')
+    assert page_template.blank_page_indices == set()
+    assert main.get_page_indices(dimensions, page_template, main.ChopOptions().blank_pages) == [
+        (0, 0),
+        (1, 0),
+        (2, 0),
+    ]
+
+
+def test_skipped_blank_pages_are_left_out():
+    dimensions, page_template = create_page_template(
+        '<rect x="10" y="10" width="50" height="50" />', blank_pages=main.BLANK_PAGES_SKIP
+    )
+    assert page_template.blank_page_indices == {(1, 0), (2, 0)}
+    assert page_template.blank_page == None
+    assert main.get_page_indices(dimensions, page_template, main.BLANK_PAGES_SKIP) == [(0, 0)]
+
+
+def test_shared_blank_page_replaces_blank_pages():
+    dimensions, page_template = create_page_template(
+        '<rect x="110" y="10" width="50" height="50" />', blank_pages=main.BLANK_PAGES_SHARED
+    )
+    assert page_template.blank_page_indices == {(0, 0), (2, 0)}
+    assert page_template.blank_page != None
+    assert len(main.get_page_indices(dimensions, page_template, main.BLANK_PAGES_SHARED)) == 3
+
+
+@pytest.mark.parametrize(
+    "svg",
+    [
+        # NOTE: Elements in front of the clipping group are drawn on every page
+        '<rect id="shape" width="50" height="50" /><use href="#shape" x="200" />',
+        '<rect width="300" height="100" />',
+    ],
+)
+def test_no_page_is_blank_if_content_is_everywhere(svg):
+    _, page_template = create_page_template(svg, blank_pages=main.BLANK_PAGES_SKIP)
+    assert page_template.blank_page_indices == set()
+
+
+def test_blank_pages_need_culling():
+    _, page_template = create_page_template(
+        '<rect width="50" height="50" />', blank_pages=main.BLANK_PAGES_SKIP, enable_culling=False
+    )
+    assert page_template.blank_page_indices == set()
+
+
+# NOTE: chop is used as a library, so only the command line modes may print
+def test_page_template_and_page_indices_print_nothing(capsys):
+    dimensions, page_template = create_page_template(
+        '<rect width="50" height="50" />', blank_pages=main.BLANK_PAGES_SKIP
+    )
+    main.get_page_indices(dimensions, page_template, main.BLANK_PAGES_SKIP)
+    assert capsys.readouterr().out == ""
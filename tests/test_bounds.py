@@ -0,0 +1,149 @@
+import pytest
+
+import main
+
+
+def compute_bounds(svg: str, stylesheet: str = "", reference_counts: dict = None) -> tuple:
+    svg_root_node = main.g_xml_backend.fromstring(
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:xlink="http://www.w3.org/1999/xlink">{}</svg>'.format(svg).encode()
+    )
+    context = main.SvgBoundsContext(
+        {} if reference_counts == None else reference_counts, stylesheet
+    )
+    for svg_node in svg_root_node:
+        context.add_referenced_nodes(svg_node)
+    return main.svg_compute_element_bounds(svg_root_node[-1], context)
+
+
+def assert_bounds_equal(bounds: tuple, expected: tuple):
+    assert bounds == pytest.approx(expected)
+
+
+def test_rect_bounds_include_the_stroke_and_miter_joins():
+    assert_bounds_equal(
+        compute_bounds('<rect x="10" y="20" width="30" height="40" stroke-width="2" />'),
+        (6.0, 16.0, 44.0, 64.0),
+    )
+
+
+def test_bounds_follow_the_transforms_of_all_ancestors():
+    assert_bounds_equal(
+        compute_bounds(
+            '<g transform="translate(100 0)"><g style="stroke-width: 0">'
+            '<rect width="10" height="10" transform="scale(2)" /></g></g>'
+        ),
+        (100.0, 0.0, 120.0, 20.0),
+    )
+
+
+def test_path_bounds_resolve_relative_commands():
+    assert_bounds_equal(
+        compute_bounds('<path d="M10 10 l5 5 h10 v-20 z" stroke-width="0" />'),
+        (10.0, -5.0, 25.0, 15.0),
+    )
+
+
+def test_use_bounds_are_the_bounds_of_the_referenced_node():
+    assert_bounds_equal(
+        compute_bounds(
+            '<defs><circle id="dot" cx="5" cy="5" r="5" stroke-width="0" /></defs>'
+            '<use xlink:href="#dot" x="50" y="10" />',
+            reference_counts={"dot": 1},
+        ),
+        (50.0, 10.0, 60.0, 20.0),
+    )
+
+
+def test_non_rendering_elements_are_empty():
+    assert compute_bounds('<defs><rect width="10" height="10" /></defs>') == main.BOUNDS_EMPTY
+
+
+@pytest.mark.parametrize(
+    "svg, stylesheet, reference_counts",
+    [
+        ('<rect width="10" height="10" filter="url(#blur)" />', "", None),
+        ('<path d="M0 0 L10 10" style="marker-end: url(#arrow)" />', "", None),
+        ('<rect width="10" height="10" />', "rect { filter: url(#blur) }", None),
+        ('<use href="#missing" />', "", None),
+        ('<rect width="10" height="10" transform="wobble(2)" />', "", None),
+        ('<path d="M0 0 X10 10" />', "", None),
+        ('<rect width="10" height="10" x="5%" />', "", None),
+        # NOTE: Referenced from outside of the element, so it must be kept on every page
+        ('<rect id="shape" width="10" height="10" />', "", {"shape": 1}),
+    ],
+)
+def test_unknown_bounds_keep_the_element_on_every_page(svg, stylesheet, reference_counts):
+    assert compute_bounds(svg, stylesheet, reference_counts) == main.BOUNDS_UNKNOWN
+
+
+def test_stylesheet_stroke_widens_the_bounds():
+    assert_bounds_equal(
+        compute_bounds(
+            '<rect width="10" height="10" stroke-width="0" />',
+            "rect { stroke-width: 2; stroke-miterlimit: 1 }",
+        ),
+        (-4.0, -4.0, 14.0, 14.0),
+    )
+
+
+def test_stylesheet_stroke_width_is_converted_from_its_unit():
+    # NOTE: 2mm are 7.559 user units at the 96 DPI of cairosvg, not 2
+    assert_bounds_equal(
+        compute_bounds(
+            '<rect width="10" height="10" stroke-width="0" />',
+            ".s { stroke-width: 2mm; stroke-miterlimit: 1 }",
+        ),
+        (-15.1181, -15.1181, 25.1181, 25.1181),
+    )
+
+
+def test_style_transform_moves_the_bounds():
+    assert_bounds_equal(
+        compute_bounds(
+            '<rect width="10" height="10" stroke-width="0" '
+            'style="transform: translate(300px, 0) rotate(90deg)" transform="translate(5 0)" />'
+        ),
+        (290.0, 0.0, 300.0, 10.0),
+    )
+
+
+@pytest.mark.parametrize(
+    "svg, stylesheet",
+    [
+        ('<rect width="10" height="10" />', "rect { transform: translate(300px, 0) }"),
+        ('<rect width="10" height="10" />', ".s { stroke-width: 2em }"),
+        ('<rect width="10" height="10" style="transform: translate(10mm, 0)" />', ""),
+        ('<rect width="10" height="10" style="transform: scale(2); transform-origin: 50%" />', ""),
+        ('<text x="10" y="10">A<tspan style="transform: scale(2)">B</tspan></text>', ""),
+    ],
+)
+def test_transforms_we_can_not_resolve_leave_the_bounds_unknown(svg, stylesheet):
+    assert compute_bounds(svg, stylesheet) == main.BOUNDS_UNKNOWN
+
+
+def test_parse_transform_rotates_around_the_given_center():
+    a, b, c, d, e, f = main.svg_parse_transform("rotate(90 10 0)")
+    assert (a * 20.0 + c * 0.0 + e, b * 20.0 + d * 0.0 + f) == pytest.approx((10.0, 10.0))
+
+
+def test_page_element_index_culls_elements_outside_of_a_page():
+    dimensions = main.PageChoppingDimensions(300.0, 200.0, "mm", 100.0, 100.0, 10.0)
+    page_element_indices = main.svg_build_page_element_index(
+        [
+            (10.0, 10.0, 20.0, 20.0),
+            (90.0, 90.0, 110.0, 110.0),
+            main.BOUNDS_EMPTY,
+            main.BOUNDS_UNKNOWN,
+            (-50.0, 150.0, 500.0, 250.0),
+        ],
+        dimensions,
+    )
+    assert page_element_indices == {
+        (0, 0): [0, 1, 3],
+        (1, 0): [1, 3],
+        (2, 0): [3],
+        (0, 1): [1, 3, 4],
+        (1, 1): [1, 3, 4],
+        (2, 1): [3, 4],
+    }
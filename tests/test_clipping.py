@@ -0,0 +1,207 @@
+import math
+from xml.etree import ElementTree
+
+import pytest
+
+import main
+
+
+def create_node(svg: str) -> ElementTree.Element:
+    return main.g_xml_backend.fromstring(
+        '<svg xmlns="http://www.w3.org/2000/svg">{}</svg>'.format(svg).encode()
+    )[0]
+
+
+def create_clip_element(svg: str, stylesheet: str = "") -> main.SvgClipElement:
+    return main.svg_create_clip_element(
+        create_node(svg), main.SvgBoundsContext({}, stylesheet), 0.01
+    )
+
+
+def clip(svg: str, clip_rect: main.Rect, bleed: float = 0.0) -> ElementTree.Element:
+    clip_element = create_clip_element(svg)
+    assert clip_element != None
+    return ElementTree.fromstring(main.svg_clip_element(clip_element, clip_rect, bleed, 3))
+
+
+def test_parse_subpaths_lines_and_closepath():
+    assert main.svg_path_parse_subpaths("M0 0 L10 0 L10 10 Z M20 20 l5 0 v5") == [
+        ((0.0, 0.0), [((10.0, 0.0),), ((10.0, 10.0),)], True),
+        ((20.0, 20.0), [((25.0, 20.0),), ((25.0, 25.0),)], False),
+    ]
+
+
+def test_parse_subpaths_continues_at_start_after_closepath():
+    assert main.svg_path_parse_subpaths("M5 5 H10 Z l0 10") == [
+        ((5.0, 5.0), [((10.0, 5.0),)], True),
+        ((5.0, 5.0), [((5.0, 15.0),)], False),
+    ]
+
+
+def test_parse_subpaths_reflects_smooth_cubic_control_point():
+    assert main.svg_path_parse_subpaths("M0 0 C0 10 10 10 10 0 S20 -10 20 0") == [
+        (
+            (0.0, 0.0),
+            [
+                ((0.0, 10.0), (10.0, 10.0), (10.0, 0.0)),
+                ((10.0, -10.0), (20.0, -10.0), (20.0, 0.0)),
+            ],
+            False,
+        )
+    ]
+
+
+def test_parse_subpaths_reflects_smooth_quadratic_control_point():
+    assert main.svg_path_parse_subpaths("M0 0 Q5 10 10 0 t10 0") == [
+        ((0.0, 0.0), [((5.0, 10.0), (10.0, 0.0)), ((15.0, -10.0), (20.0, 0.0))], False)
+    ]
+
+
+def test_parse_subpaths_smooth_curve_without_previous_curve_starts_at_current_point():
+    assert main.svg_path_parse_subpaths("M0 0 L10 0 S20 10 30 0") == [
+        ((0.0, 0.0), [((10.0, 0.0),), ((10.0, 0.0), (20.0, 10.0), (30.0, 0.0))], False)
+    ]
+
+
+def test_parse_subpaths_rejects_arcs():
+    with pytest.raises(ValueError):
+        main.svg_path_parse_subpaths("M0 0 A5 5 0 0 1 10 0")
+
+
+def test_flatten_curve_stays_within_tolerance():
+    start = (0.0, 0.0)
+    segment = ((0.0, 100.0), (100.0, 100.0), (100.0, 0.0))
+    tolerance = 0.1
+    lines = main.clip_flatten_curve(start, segment, tolerance)
+    assert len(lines) > 1
+    assert lines[-1] == ((100.0, 0.0),)
+
+    points = [start] + [line[0] for line in lines]
+
+    def get_distance_to_line(point: tuple, line_start: tuple, line_end: tuple) -> float:
+        delta_x = line_end[0] - line_start[0]
+        delta_y = line_end[1] - line_start[1]
+        t = ((point[0] - line_start[0]) * delta_x + (point[1] - line_start[1]) * delta_y) / (
+            delta_x**2 + delta_y**2
+        )
+        t = min(max(t, 0.0), 1.0)
+        return math.hypot(
+            point[0] - line_start[0] - t * delta_x, point[1] - line_start[1] - t * delta_y
+        )
+
+    for index in range(1001):
+        t = index / 1000.0
+        curve_point = (
+            3.0 * t**2 * (1.0 - t) * 100.0 + t**3 * 100.0,
+            3.0 * t * (1.0 - t) ** 2 * 100.0 + 3.0 * t**2 * (1.0 - t) * 100.0,
+        )
+        distance = min(
+            get_distance_to_line(curve_point, points[point_index], points[point_index + 1])
+            for point_index in range(len(points) - 1)
+        )
+        assert distance <= tolerance
+
+
+def test_half_plane_cuts_along_bound():
+    start, segments = main.clip_half_plane(
+        (-10.0, -10.0),
+        [((10.0, -10.0),), ((10.0, 10.0),), ((-10.0, 10.0),), ((-10.0, -10.0),)],
+        0,
+        0.0,
+        1.0,
+    )
+    assert start == (0.0, -10.0)
+    assert segments == [((10.0, -10.0),), ((10.0, 10.0),), ((0.0, 10.0),)]
+
+
+def test_half_plane_drops_subpath_outside():
+    start, segments = main.clip_half_plane((-10.0, 0.0), [((-5.0, 5.0),)], 0, 0.0, 1.0)
+    assert start == None
+    assert segments == []
+
+
+def test_clip_rect_is_cut_to_page_plus_stroke_margin():
+    # NOTE: The margin is half the default stroke width times the default miter limit
+    result = clip(
+        '<rect x="0" y="0" width="1000" height="10" fill="red" />', main.Rect(100, 0, 100, 10)
+    )
+    assert result.attrib == {"x": "98", "y": "0", "width": "104", "height": "10", "fill": "red"}
+
+
+def test_clip_rect_keeps_bleed():
+    result = clip(
+        '<rect x="0" y="0" width="1000" height="10" stroke-width="0" />',
+        main.Rect(100, 0, 100, 10),
+        bleed=5.0,
+    )
+    assert (result.get("x"), result.get("width")) == ("95", "110")
+
+
+def test_clip_rect_outside_of_page_becomes_empty():
+    result = clip('<rect x="0" y="0" width="1000" height="10" />', main.Rect(0, 500, 100, 100))
+    assert (result.get("width"), result.get("height")) == ("0", "0")
+
+
+def test_clip_open_stroked_subpath():
+    result = clip(
+        '<path d="M0 5 L1000 5" fill="none" stroke="#000" stroke-width="0" />',
+        main.Rect(100, 0, 100, 10),
+    )
+    assert result.get("d") == "M100 5L200 5"
+
+
+def test_clip_closed_path_keeps_curves_inside_and_flattens_crossing_ones():
+    result = clip(
+        '<path d="M0 0 L1000 0 L1000 10 C600 20 140 20 150 10 Z" stroke-width="0" />',
+        main.Rect(100, 0, 100, 30),
+    )
+    path_data = result.get("d")
+    assert path_data.startswith("M100 0L200 0")
+    assert "C" not in path_data
+    assert path_data.endswith("Z")
+
+
+def test_clip_polygon():
+    result = clip(
+        '<polygon points="0,0 1000,0 1000,10 0,10" stroke-width="0" />',
+        main.Rect(100, 0, 100, 10),
+    )
+    assert result.get("points") == "100,0 200,0 200,10 100,10"
+
+
+def test_clip_honors_scaling_transform():
+    result = clip(
+        '<rect x="0" y="0" width="500" height="5" transform="scale(2)" stroke-width="0" />',
+        main.Rect(100, 0, 100, 10),
+    )
+    assert (result.get("x"), result.get("width")) == ("50", "50")
+
+
+def test_clip_is_refused_for_open_filled_and_stroked_subpath():
+    assert create_clip_element('<path d="M0 0 L1000 0 L1000 10" stroke="#000" />') == None
+
+
+def test_clip_is_refused_for_rounded_rects_arcs_and_rotations():
+    assert create_clip_element('<rect width="1000" height="10" rx="2" />') == None
+    assert create_clip_element('<path d="M0 0 A5 5 0 0 1 1000 0 Z" />') == None
+    assert create_clip_element('<rect width="1000" height="10" transform="rotate(10)" />') == None
+
+
+@pytest.mark.parametrize(
+    "svg",
+    [
+        '<rect width="1000" height="10" fill="url(#gradient)" />',
+        '<rect width="1000" height="10" style="stroke: url(#pattern)" />',
+        '<rect width="1000" height="10" mask="url(#mask)" />',
+        '<rect width="1000" height="10" clip-path="url(#clip)" />',
+        '<rect width="1000" height="10" filter="url(#blur)" />',
+    ],
+)
+def test_clip_is_refused_for_bounding_box_references(svg):
+    assert create_clip_element(svg) == None
+
+
+def test_clip_is_refused_for_stylesheet_paint_servers():
+    svg = '<rect class="shape" width="1000" height="10" />'
+    assert create_clip_element(svg) != None
+    assert create_clip_element(svg, ".shape { fill: url(#gradient) }") == None
@@ -0,0 +1,53 @@
+import gc
+import io
+import os
+import pickle
+
+import main
+
+
+def test_elements_are_read_back_by_index():
+    store = main.SvgElementStore()
+    elements = [b"<rect />", b"", b"<path d='M0 0' />"]
+    for element in elements:
+        store.append(element)
+    assert len(store) == 3
+    assert store[2] == elements[2]
+    assert store[0] == elements[0]
+    assert list(store) == elements
+    assert store.get_size(2) == len(elements[2])
+    assert store.get_total_size() == sum(len(element) for element in elements)
+
+
+def test_unpickled_store_reads_the_same_file():
+    store = main.SvgElementStore()
+    store.append(b"<rect />")
+    copied_store = pickle.loads(pickle.dumps(store))
+    assert copied_store.filepath == store.filepath
+    assert list(copied_store) == [b"<rect />"]
+
+
+def test_file_is_removed_with_the_store():
+    store = main.SvgElementStore()
+    store.append(b"<rect />")
+    filepath = store.filepath
+    assert os.path.exists(filepath)
+    del store
+    gc.collect()
+    assert not os.path.exists(filepath)
+
+
+def test_big_posters_are_not_parsed_as_a_whole(monkeypatch):
+    dimensions, page_template = main.svg_create_page_template(
+        io.BytesIO(
+            b'<svg xmlns="http://www.w3.org/2000/svg" width="200mm" height="100mm" '
+            b'viewBox="0 0 200 100"><rect width="150" height="50" /></svg>'
+        ),
+        100,
+        100,
+        10,
+    )
+    monkeypatch.setattr(
+        main, "POSTER_TREE_MAX_ELEMENT_BYTES", page_template.elements.get_total_size() - 1
+    )
+    assert main.pdf_parse_poster(page_template, dimensions) == None
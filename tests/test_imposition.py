@@ -0,0 +1,48 @@
+import random
+
+import main
+
+
+def test_pack_rects_fills_shelves_from_the_highest_rect():
+    sizes = [(30.0, 10.0), (40.0, 20.0), (50.0, 10.0)]
+    assert main.impose_pack_rects(sizes, 100.0, 50.0, 5.0) == [
+        [(1, 0.0, 0.0), (2, 45.0, 0.0), (0, 0.0, 25.0)]
+    ]
+
+
+def test_pack_rects_starts_a_new_sheet_when_no_shelf_fits():
+    sizes = [(60.0, 40.0), (60.0, 40.0), (30.0, 5.0)]
+    assert main.impose_pack_rects(sizes, 100.0, 50.0, 5.0) == [
+        [(0, 0.0, 0.0), (2, 65.0, 0.0)],
+        [(1, 0.0, 0.0)],
+    ]
+
+
+def test_pack_rects_without_rects():
+    assert main.impose_pack_rects([], 100.0, 50.0, 5.0) == []
+
+
+def test_packed_rects_stay_inside_the_sheet_and_do_not_overlap():
+    rng = random.Random(0)
+    sizes = [(rng.uniform(1.0, 100.0), rng.uniform(1.0, 50.0)) for _ in range(200)]
+    gap = 5.0
+    sheets = main.impose_pack_rects(sizes, 100.0, 50.0, gap)
+    assert sorted(rect_index for sheet in sheets for rect_index, _, _ in sheet) == list(
+        range(len(sizes))
+    )
+    for sheet in sheets:
+        rects = []
+        for rect_index, x, y in sheet:
+            width, height = sizes[rect_index]
+            assert x >= 0.0 and y >= 0.0
+            assert x + width <= 100.0 + main.IMPOSITION_EPSILON
+            assert y + height <= 50.0 + main.IMPOSITION_EPSILON
+            rects.append((x, y, x + width, y + height))
+        for index, (min_x, min_y, max_x, max_y) in enumerate(rects):
+            for other_min_x, other_min_y, other_max_x, other_max_y in rects[index + 1 :]:
+                assert (
+                    max_x + gap <= other_min_x + main.IMPOSITION_EPSILON
+                    or other_max_x + gap <= min_x + main.IMPOSITION_EPSILON
+                    or max_y + gap <= other_min_y + main.IMPOSITION_EPSILON
+                    or other_max_y + gap <= min_y + main.IMPOSITION_EPSILON
+                )
@@ -0,0 +1,123 @@
+import io
+
+import pytest
+
+import main
+
+
+def create_image(image_width_mm: float, image_height_mm: float, svg: str) -> bytes:
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="{0}mm" height="{1}mm" '
+        'viewBox="0 0 {0} {1}">{2}</svg>'.format(image_width_mm, image_height_mm, svg)
+    ).encode()
+
+
+def resolve_layout(svg: bytes, blank_pages: str, impose_slivers: bool) -> main.PageLayout:
+    return main.layout_resolve(
+        io.BytesIO(svg),
+        main.PAGE_INNER_WIDTH_MM,
+        main.PAGE_INNER_HEIGHT_MM,
+        main.PAGE_BORDER_MM,
+        main.PAGE_LAYOUT_AUTO,
+        blank_pages,
+        impose_slivers,
+    )
+
+
+def test_evaluate_counts_the_page_grid():
+    layout = main.PageLayout("a4", main.LAYOUT_ORIENTATION_PORTRAIT, 180.0, 250.0, 0.0)
+    main.layout_evaluate(layout, 400.0, 250.0)
+    assert (layout.page_count_x, layout.page_count_y, layout.page_count) == (3, 1, 3)
+    assert layout.printed_page_count == 3
+
+
+def test_evaluate_reports_a_rotated_last_strip(capsys):
+    layout = main.PageLayout("a4", main.LAYOUT_ORIENTATION_PORTRAIT, 180.0, 250.0, 0.0)
+    main.layout_evaluate(layout, 500.0, 260.0)
+    assert (layout.page_count_x, layout.page_count_y, layout.page_count) == (3, 2, 6)
+    # NOTE: The last row is 10mm high and fits on two landscape pages instead of three
+    assert (layout.rotated_last_strip, layout.rotated_last_strip_page_count) == (
+        main.LAYOUT_STRIP_ROW,
+        5,
+    )
+    assert layout.printed_page_count == 6
+    main.layout_print(layout)
+    assert "last row in landscape would need 5 instead of 6 pages" in capsys.readouterr().out
+
+
+def test_evaluate_without_a_better_rotated_last_strip():
+    layout = main.PageLayout("a4", main.LAYOUT_ORIENTATION_PORTRAIT, 180.0, 250.0, 0.0)
+    main.layout_evaluate(layout, 400.0, 250.0)
+    assert (layout.rotated_last_strip, layout.rotated_last_strip_page_count) == (None, 3)
+
+
+def test_find_best_prefers_the_larger_border_on_the_same_page_count():
+    layout = main.layout_find_best(100.0, 100.0, "mm", None, main.BLANK_PAGES_KEEP, False)
+    assert (layout.paper, layout.orientation, layout.page_border_mm) == (
+        "a4",
+        main.LAYOUT_ORIENTATION_PORTRAIT,
+        max(main.LAYOUT_PAGE_BORDERS_MM),
+    )
+    assert layout.printed_page_count == 1
+
+
+def test_fixed_layout_is_not_resolved():
+    svg = create_image(500.0, 200.0, "")
+    assert (
+        main.layout_resolve(
+            io.BytesIO(svg),
+            100.0,
+            100.0,
+            10.0,
+            main.PAGE_LAYOUT_FIXED,
+            main.BLANK_PAGES_KEEP,
+            False,
+        )
+        == None
+    )
+
+
+def test_skipped_blank_pages_change_the_chosen_layout():
+    svg = create_image(500.0, 200.0, '<rect width="50" height="50" />')
+    layout = resolve_layout(svg, main.BLANK_PAGES_KEEP, False)
+    assert (layout.paper, layout.page_border_mm, layout.printed_page_count) == ("letter", 7.0, 3)
+
+    # NOTE: Only the page with the rect is printed, so every layout prints a single page
+    layout = resolve_layout(svg, main.BLANK_PAGES_SKIP, False)
+    assert (layout.paper, layout.page_border_mm, layout.printed_page_count) == (
+        "a4",
+        max(main.LAYOUT_PAGE_BORDERS_MM),
+        1,
+    )
+    assert layout.page_count == 4
+
+
+def test_printed_page_count_includes_imposed_sheets():
+    svg = create_image(500.0, 240.0, '<rect width="500" height="240" />')
+    _, page_template = main.svg_create_page_template(io.BytesIO(svg), 100.0, 100.0, 10.0)
+    layout = main.PageLayout("a4", main.LAYOUT_ORIENTATION_PORTRAIT, 166.0, 236.0, 7.0)
+    main.layout_evaluate(layout, 500.0, 240.0)
+    assert layout.page_count == 8
+
+    def count_printed_pages(impose_slivers: bool) -> int:
+        return main.layout_count_printed_pages(
+            layout, 500.0, 240.0, "mm", page_template, main.BLANK_PAGES_KEEP, impose_slivers
+        )
+
+    # NOTE: The last column is 2mm wide and the last row 4mm high, their four slivers share a sheet
+    assert count_printed_pages(False) == 8
+    assert count_printed_pages(True) == 5
+
+
+def test_chop_options_reject_unknown_layouts():
+    with pytest.raises(main.InvalidOptionsError):
+        main.ChopOptions(page_layout="tiled").validate()
+
+
+def test_chop_uses_the_chosen_layout():
+    svg = create_image(500.0, 200.0, '<rect width="50" height="50" />')
+    options = main.ChopOptions(blank_pages=main.BLANK_PAGES_SKIP, page_layout=main.PAGE_LAYOUT_AUTO)
+    dimensions, _, page_indices, layout = main.chop_create_page_template(svg, options)
+    assert layout.page_border_mm == max(main.LAYOUT_PAGE_BORDERS_MM)
+    assert (dimensions.page_count_x, dimensions.page_count_y) == (4, 1)
+    assert page_indices == [(0, 0)]
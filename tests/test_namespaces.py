@@ -0,0 +1,40 @@
+import io
+
+import main
+
+
+def create_page_template(svg: str) -> tuple:
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'xmlns:foo="urn:foo" width="200mm" height="100mm" viewBox="0 0 200 100">{}</svg>'.format(
+            svg
+        )
+    )
+    return main.svg_create_page_template(io.BytesIO(svg.encode()), 100, 100, 10)
+
+
+def test_elements_do_not_repeat_the_root_namespaces():
+    _, page_template = create_page_template(
+        '<rect id="shape" width="50" height="50" /><g><use xlink:href="#shape" x="20" /></g>'
+        '<rect foo:bar="1" x="120" width="50" height="50" />'
+    )
+    elements = list(page_template.elements)
+    assert all(b"xmlns=" not in element for element in elements)
+    assert all(b"xmlns:xlink=" not in element for element in elements)
+    assert b'href="#shape"' in elements[1]
+    # NOTE: Other namespaces are only declared by the elements that use them
+    assert b'="urn:foo"' not in elements[0]
+    assert b'="urn:foo"' in elements[2]
+
+
+def test_pages_declare_the_xlink_namespace_once():
+    dimensions, page_template = create_page_template(
+        '<rect id="shape" width="50" height="50" /><g><use xlink:href="#shape" x="20" /></g>'
+    )
+    page_svg = main.svg_create_page(page_template, dimensions, 0, 0)
+    assert page_svg.count(b"xmlns:xlink=") == 1
+    page_node = main.g_xml_backend.fromstring(page_svg)
+    assert any(node.get(main.XLINK_HREF_ATTRIBUTE) == "#shape" for node in page_node.iter())
+    overview_svg = main.svg_create_overview(page_template)
+    assert overview_svg.count(b"xmlns:xlink=") == 1
+    main.g_xml_backend.fromstring(overview_svg)
@@ -0,0 +1,30 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize(
+    "value, number_precision, expected",
+    [
+        (1.0, 4, "1"),
+        (1.5, 4, "1.5"),
+        (0.123456, 4, "0.1235"),
+        (2.00004, 4, "2"),
+        (-0.00001, 4, "0"),
+        (-1.25, 2, "-1.25"),
+        (100.0, 2, "100"),
+        (1e-05, 6, "0.00001"),
+    ],
+)
+def test_format_number(value, number_precision, expected):
+    assert main.svg_format_number(value, number_precision) == expected
+
+
+@pytest.mark.parametrize("number_precision", [-1, 0, main.SVG_NUMBER_PRECISION_MIN - 1, 2.5])
+def test_chop_options_reject_imprecise_page_geometry(number_precision):
+    with pytest.raises(main.InvalidOptionsError):
+        main.ChopOptions(number_precision=number_precision).validate()
+
+
+def test_chop_options_accept_the_minimum_precision():
+    main.ChopOptions(number_precision=main.SVG_NUMBER_PRECISION_MIN).validate()
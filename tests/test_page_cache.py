@@ -0,0 +1,61 @@
+import os
+
+import main
+
+
+def store_entries(page_cache: main.PageCache, keys: list[str], size: int, first_time: int):
+    # NOTE: The entries are stored one second apart, the oldest first
+    for index, key in enumerate(keys):
+        page_cache.store(key, b"x" * size)
+        os.utime(page_cache.get_filepath(key), (first_time + index, first_time + index))
+
+
+def get_cached_keys(page_cache: main.PageCache) -> list[str]:
+    return sorted(filename[: -len(".pdf")] for filename in os.listdir(page_cache.directory))
+
+
+def test_evict_removes_the_least_recently_used_entries(tmp_path):
+    page_cache = main.PageCache(str(tmp_path), 250)
+    store_entries(page_cache, ["a", "b", "c"], 100, 1000000)
+    # NOTE: Loading marks the oldest entry as used, so the second oldest is evicted instead
+    assert page_cache.load("a") == b"x" * 100
+    page_cache.evict()
+    assert get_cached_keys(page_cache) == ["a", "c"]
+    assert page_cache.load("b") == None
+    assert (page_cache.hit_count, page_cache.miss_count) == (1, 1)
+
+
+def test_evict_keeps_the_cache_within_its_size(tmp_path):
+    page_cache = main.PageCache(str(tmp_path), 300)
+    store_entries(page_cache, ["a", "b", "c"], 100, 1000000)
+    page_cache.evict()
+    assert get_cached_keys(page_cache) == ["a", "b", "c"]
+
+    store_entries(page_cache, ["d", "e"], 100, 2000000)
+    page_cache.evict()
+    assert get_cached_keys(page_cache) == ["c", "d", "e"]
+
+    page_cache.max_size_bytes = 0
+    page_cache.evict()
+    assert get_cached_keys(page_cache) == []
+
+
+def test_external_files_key_follows_linked_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "photo.png").write_bytes(b"png")
+    svg = b'<svg><image xlink:href="photo.png" /><rect style="fill: url(#gradient)" /></svg>'
+    key = main.page_cache_get_external_files_key(svg)
+    assert "photo.png:3:" in key
+    (tmp_path / "photo.png").write_bytes(b"other png")
+    assert main.page_cache_get_external_files_key(svg) != key
+    (tmp_path / "photo.png").unlink()
+    assert main.page_cache_get_external_files_key(svg) == "photo.png:missing"
+
+
+def test_external_files_key_of_self_contained_and_remote_pages():
+    assert (
+        main.page_cache_get_external_files_key(b'<image href="data:image/png;base64,AA" />') == ""
+    )
+    assert main.page_cache_get_external_files_key(b'<use href="#shape" />') == ""
+    # NOTE: Remote files can not be checked for changes, so the page is not cached
+    assert main.page_cache_get_external_files_key(b'<image href="https://a.b/c.png" />') == None
@@ -0,0 +1,64 @@
+import json
+
+import main
+
+
+def create_image(tmp_path, filename: str, svg: str) -> str:
+    filepath = tmp_path / filename
+    filepath.write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg" width="300mm" height="100mm" '
+        'viewBox="0 0 300 100">{}</svg>'.format(svg)
+    )
+    return str(filepath)
+
+
+def run_plan_main(capsys, image_filepaths: list[str], blank_pages: str) -> tuple[int, list[dict]]:
+    exit_code = main.plan_main(
+        image_filepaths,
+        100.0,
+        100.0,
+        10.0,
+        blank_pages,
+        main.PAGE_LAYOUT_FIXED,
+        main.SVG_NUMBER_PRECISION_DEFAULT,
+        False,
+    )
+    lines = capsys.readouterr().out.splitlines()
+    return exit_code, [json.loads(line) for line in lines]
+
+
+def test_plan_counts_the_printed_pages(capsys, tmp_path):
+    image_filepath = create_image(tmp_path, "poster.svg", '<rect width="50" height="50" />')
+    exit_code, results = run_plan_main(capsys, [image_filepath], main.BLANK_PAGES_SKIP)
+    assert exit_code == main.BATCH_EXIT_SUCCESS
+    assert len(results) == 1
+    result = results[0]
+    assert result["status"] == "ok"
+    assert (result["page_count_x"], result["page_count_y"]) == (3, 1)
+    assert result["page_count"] == 1
+    assert result["blank_page_count"] == 2
+    assert result["estimated_pages_pdf_bytes"] > main.PLAN_PDF_BYTES_PER_PAGE
+    assert "paper" not in result
+
+
+def test_plan_reports_every_failed_image(capsys, tmp_path, monkeypatch):
+    image_filepaths = [
+        create_image(tmp_path, "a.svg", '<rect width="50" height="50" />'),
+        create_image(tmp_path, "b.svg", '<rect width="50" height="50" />'),
+    ]
+    (tmp_path / "c.svg").write_text("<svg")
+    image_filepaths.append(str(tmp_path / "c.svg"))
+    plan_image = main.plan_image
+
+    # NOTE: Any error fails only its own image, not just the chopping errors
+    def plan_image_failing_on_b(image_filepath: str, *args) -> dict:
+        if image_filepath.endswith("b.svg"):
+            raise RuntimeError("broken")
+        return plan_image(image_filepath, *args)
+
+    monkeypatch.setattr(main, "plan_image", plan_image_failing_on_b)
+    exit_code, results = run_plan_main(capsys, image_filepaths, main.BLANK_PAGES_KEEP)
+    assert exit_code == main.BATCH_EXIT_SOME_IMAGES_FAILED
+    assert [result["status"] for result in results] == ["ok", "error", "error"]
+    assert results[1]["error_type"] == "RuntimeError"
+    assert results[2]["error_type"] == "ParseError"
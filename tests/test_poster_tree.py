@@ -0,0 +1,75 @@
+import math
+import os
+
+import pytest
+
+import main
+
+try:
+    main.import_rendering_dependencies()
+except OSError:
+    pytest.skip("cairo is not installed", allow_module_level=True)
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "testfiles")
+
+
+# NOTE: Draws every page into its own image surface instead of a PDF, so that the pages drawn from
+#       the poster tree can be compared pixel by pixel with the pages drawn from their own SVG
+class ImagePageWriter(main.PdfDocumentWriter):
+    page_surfaces: list
+
+    def __init__(self):
+        super().__init__(None)
+        self.page_surfaces = []
+
+    def begin_page(self, width: float, height: float) -> main.cairocffi.ImageSurface:
+        self.cairo_surface = main.cairocffi.ImageSurface(
+            main.cairocffi.FORMAT_ARGB32, math.ceil(width), math.ceil(height)
+        )
+        self.page_surfaces.append(self.cairo_surface)
+        return self.cairo_surface
+
+
+def draw_pages(
+    page_template: main.SvgPageTemplate,
+    dimensions: main.PageChoppingDimensions,
+    poster_tree: main.CairoSvgPosterTree,
+) -> list[bytes]:
+    writer = ImagePageWriter()
+    for page_index_y in range(dimensions.page_count_y):
+        for page_index_x in range(dimensions.page_count_x):
+            writer.add_poster_page(
+                poster_tree, page_template, dimensions, page_index_x, page_index_y
+            )
+    result = []
+    for surface in writer.page_surfaces:
+        surface.flush()
+        result.append(bytes(surface.get_data()))
+    return result
+
+
+@pytest.mark.parametrize(
+    "image_source",
+    [
+        os.path.join(TESTFILES_DIR, "test-illustrator.svg"),
+        os.path.join(TESTFILES_DIR, "a3_test.svg"),
+    ],
+)
+def test_poster_tree_draws_the_same_pages_as_the_page_svgs(image_source):
+    dimensions, page_template = main.svg_create_page_template(image_source, 100.0, 100.0, 10.0)
+    poster_tree = main.CairoSvgPosterTree(page_template, dimensions)
+    poster_pages = draw_pages(page_template, dimensions, poster_tree)
+    separate_pages = draw_pages(page_template, dimensions, None)
+    assert len(poster_pages) == dimensions.page_count_x * dimensions.page_count_y
+    for page_index, (poster_page, separate_page) in enumerate(zip(poster_pages, separate_pages)):
+        assert poster_page == separate_page, "page {} differs".format(page_index)
+
+
+def test_poster_tree_is_only_used_with_checked_cairosvg_versions(monkeypatch):
+    dimensions, page_template = main.svg_create_page_template(
+        os.path.join(TESTFILES_DIR, "test-illustrator.svg"), 100.0, 100.0, 10.0
+    )
+    monkeypatch.setattr(main, "CAIROSVG_POSTER_TREE_VERSIONS", [main.cairosvg.__version__])
+    assert main.pdf_parse_poster(page_template, dimensions) != None
+    monkeypatch.setattr(main, "CAIROSVG_POSTER_TREE_VERSIONS", [])
+    assert main.pdf_parse_poster(page_template, dimensions) == None
@@ -0,0 +1,70 @@
+import queue
+import threading
+
+import pytest
+
+import main
+
+
+def test_reporter_is_only_seen_by_its_own_thread():
+    events = []
+    other_thread_events = []
+    reporting = threading.Event()
+    other_thread_done = threading.Event()
+
+    def process_other_image():
+        reporting.wait()
+        with main.progress_reporting(other_thread_events.append, "other.svg"):
+            main.progress_stage(main.PROGRESS_STAGE_CREATE_PAGE_TEMPLATE)
+        # NOTE: Outside of its own reporting the thread must not reach the reporter of the first
+        main.progress_page_started("0x0")
+        other_thread_done.set()
+
+    thread = threading.Thread(target=process_other_image)
+    thread.start()
+    with main.progress_reporting(events.append, "image.svg"):
+        reporting.set()
+        other_thread_done.wait()
+        main.progress_start_rendering(1)
+        main.progress_page_started("1x0")
+        main.progress_page_finished("1x0", 100)
+    thread.join()
+
+    assert [event["image"] for event in events] == ["image.svg"] * 3
+    assert [event["event"] for event in events] == [
+        main.PROGRESS_EVENT_STAGE,
+        main.PROGRESS_EVENT_PAGE_STARTED,
+        main.PROGRESS_EVENT_PAGE_FINISHED,
+    ]
+    assert events[-1]["pages_done"] == 1
+    assert events[-1]["bytes_written"] == 100
+    # NOTE: cairo buffers its output, so only the running total is reported, never a page size
+    assert "page_bytes" not in events[-1]
+    assert [event["image"] for event in other_thread_events] == ["other.svg"]
+
+
+def test_reporter_is_restored_after_reporting():
+    events = []
+    with main.progress_reporting(events.append, "image.svg"):
+        with pytest.raises(ValueError):
+            with main.progress_reporting(lambda event: None, "inner.svg"):
+                raise ValueError("broken")
+        main.progress_stage(main.PROGRESS_STAGE_WRITE)
+    main.progress_stage(main.PROGRESS_STAGE_WRITE)
+    assert [(event["image"], event["event"]) for event in events] == [
+        ("image.svg", main.PROGRESS_EVENT_STAGE)
+    ]
+
+
+def test_worker_events_are_forwarded_to_the_reporter():
+    events = []
+    worker_queue = queue.Queue()
+    main.progress_run_in_worker(worker_queue, main.progress_page_finished, "2x1", 10)
+    with main.progress_reporting(events.append, "image.svg"):
+        reporter = main.g_progress_reporter.get()
+        reporter.worker_queue = worker_queue
+        reporter.poll_worker_queue()
+        reporter.worker_queue = None
+    assert [(event["event"], event["page"]) for event in events] == [
+        (main.PROGRESS_EVENT_PAGE_FINISHED, "2x1")
+    ]
@@ -0,0 +1,46 @@
+import pytest
+
+import main
+
+
+def create_dimensions(image_width: float, image_height: float) -> main.PageChoppingDimensions:
+    return main.PageChoppingDimensions(image_width, image_height, "mm", 100.0, 100.0, 10.0)
+
+
+def get_band_rect(
+    dimensions: main.PageChoppingDimensions,
+    page_index_y: int,
+    page_index_x_start: int,
+    page_index_x_end: int,
+) -> tuple:
+    rect = main.svg_get_band_rect(dimensions, page_index_y, page_index_x_start, page_index_x_end)
+    return (rect.x, rect.y, rect.width, rect.height)
+
+
+def test_band_rect_spans_the_page_columns():
+    dimensions = create_dimensions(250.0, 150.0)
+    assert get_band_rect(dimensions, 1, 0, 3) == (0.0, 100.0, 250.0, 50.0)
+    assert get_band_rect(dimensions, 0, 1, 3) == (100.0, 0.0, 150.0, 100.0)
+
+
+def test_band_column_ranges_keep_narrow_rows_in_one_band():
+    dimensions = create_dimensions(250.0, 150.0)
+    assert main.raster_get_band_column_ranges(dimensions, 1.0) == [(0, 3)]
+
+
+def test_band_column_ranges_split_rows_wider_than_cairo_surfaces():
+    dimensions = create_dimensions(250.0, 150.0)
+    pixels_per_unit = main.RASTER_CAIRO_MAX_SIZE / 220.0
+    assert main.raster_get_band_column_ranges(dimensions, pixels_per_unit) == [(0, 2), (2, 3)]
+    pixels_per_unit = main.RASTER_CAIRO_MAX_SIZE / 120.0
+    assert main.raster_get_band_column_ranges(dimensions, pixels_per_unit) == [
+        (0, 1),
+        (1, 2),
+        (2, 3),
+    ]
+
+
+def test_band_column_ranges_refuse_pages_wider_than_cairo_surfaces():
+    dimensions = create_dimensions(250.0, 150.0)
+    with pytest.raises(main.InvalidOptionsError):
+        main.raster_get_band_column_ranges(dimensions, main.RASTER_CAIRO_MAX_SIZE / 90.0)
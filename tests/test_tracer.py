@@ -0,0 +1,37 @@
+import threading
+import tracemalloc
+
+import main
+
+
+def test_spans_of_different_threads_do_not_share_a_stack():
+    was_tracing = tracemalloc.is_tracing()
+    tracer = main.Tracer(enable_tracemalloc=True)
+    outer_span_opened = threading.Event()
+    inner_span_closed = threading.Event()
+
+    # NOTE: The span of the other thread is opened after and closed before the outer span
+    def trace_other_thread():
+        outer_span_opened.wait()
+        with tracer.span("other", {}):
+            buffer = bytearray(4 * 1024 * 1024)
+            del buffer
+        inner_span_closed.set()
+
+    thread = threading.Thread(target=trace_other_thread)
+    thread.start()
+    with tracer.span("outer", {}):
+        with tracer.span("nested", {}):
+            outer_span_opened.set()
+            inner_span_closed.wait()
+    thread.join()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    events = {event["name"]: event for event in tracer.events}
+    assert set(events) == {"outer", "nested", "other"}
+    assert events["other"]["tid"] != events["outer"]["tid"]
+    # NOTE: The peak of the other thread happened while the outer spans were open
+    for name in ["outer", "nested", "other"]:
+        assert events[name]["args"]["peak_traced_mb"] >= 4.0
+    assert all(len(stack) == 0 for stack in tracer.open_span_peaks_traced_by_thread)